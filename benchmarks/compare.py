@@ -0,0 +1,53 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+import json
+import sys
+
+
+def compare(baseline: dict, current: dict, threshold: float):
+    """
+    Compares two benchmark results
+    :param baseline: metrics of the reference run
+    :param current: metrics of the run to check
+    :param threshold: relative change considered a regression, e.g. 0.1 for 10%
+    :return: list of (name, baseline value, current value, relative change, is regression)
+    """
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        old, new = baseline[name]['value'], current[name]['value']
+        change = (new - old) / old if old else 0.0
+        worse = -change if current[name].get('higher_is_better', False) else change
+        rows.append((name, old, new, change, worse > threshold))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Flags regressions between two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    arguments = parser.parse_args()
+
+    with open(arguments.baseline, 'rt') as fd:
+        baseline_metrics = json.load(fd)['metrics']
+    with open(arguments.current, 'rt') as fd:
+        current_metrics = json.load(fd)['metrics']
+
+    regressions = 0
+    for name, old, new, change, regression in compare(baseline_metrics, current_metrics, arguments.threshold):
+        regressions += regression
+        print("{:<55} {:>12.4f} {:>12.4f} {:>+8.1%} {}".format(name, old, new, change,
+                                                            "REGRESSION" if regression else ""))
+    sys.exit(1 if regressions > 0 else 0)
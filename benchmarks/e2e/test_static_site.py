@@ -0,0 +1,33 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+
+import pytest
+
+from po.po_dropdown import PODropDown
+from po.po_landing import POLanding
+
+# Set by benchmarks.run to the URL of the local static server
+base_url = os.environ.get("BENCHMARK_BASE_URL", "http://127.0.0.1:8000/")
+
+
+@pytest.mark.parametrize("iteration", range(int(os.environ.get("BENCHMARK_E2E_TESTS", "20"))))
+def test_dropdown(driver, iteration):
+    landing = POLanding(driver, base_url)
+    landing.go_to_section("dropdown.html")
+
+    dropdown = PODropDown(driver)
+    dropdown.select_by_index(1 + iteration % 2)
+
+    assert (dropdown.get_text() == "Option {}".format(1 + iteration % 2))
@@ -0,0 +1,179 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+import json
+import os
+import os.path
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from selenium.webdriver.common.by import By
+
+from config.configuration import env
+from po.po_dropdown import PODropDown
+from po.po_landing import POLanding
+from benchmarks.static_server import StaticServer
+from testrunner.factory.webdriver_config_registry import WebDriverConfigRegistry
+from testrunner.factory.webdriver_factory import WebDriverFactory
+from testrunner.util.process_supervisor import ProcessSupervisor
+
+e2e_tests_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "e2e")
+
+
+def timed(action, repetitions: int):
+    """
+    :return: list with the duration in seconds of every execution of action
+    """
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def metric(value: float, unit: str = "s", higher_is_better: bool = False):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def bench_config_resolution(browser: str, repetitions: int):
+    directory = env.get("webdriver_config_dir")
+
+    def resolve():
+        WebDriverConfigRegistry.load(WebDriverConfigRegistry.find(directory, browser))
+
+    WebDriverConfigRegistry.clear()
+    cold = timed(resolve, 1)[0]
+    warm = statistics.median(timed(resolve, repetitions))
+    return {'config_resolution.{}.cold'.format(browser): metric(cold),
+            'config_resolution.{}.warm'.format(browser): metric(warm)}
+
+
+def bench_driver_startup(browser: str, repetitions: int):
+    # The first instance of the process pays binary resolution, configuration parsing and factory import
+    timings = []
+    for _ in range(repetitions + 1):
+        start = time.perf_counter()
+        driver = WebDriverFactory.create_instance(browser, exact_match=True)
+        timings.append(time.perf_counter() - start)
+        driver.quit()
+    return {'driver_startup.{}.cold'.format(browser): metric(timings[0]),
+            'driver_startup.{}.warm'.format(browser): metric(statistics.median(timings[1:]))}
+
+
+def bench_commands(driver, url: str, repetitions: int):
+    driver.get(url)
+    commands = {
+        'title': lambda: driver.title,
+        'find_element': lambda: driver.find_element(By.TAG_NAME, "h1"),
+        'find_elements': lambda: driver.find_elements(By.XPATH, "//ul/li/a"),
+        'execute_script': lambda: driver.execute_script("return 1;"),
+        'get_attribute': lambda: driver.find_element(By.TAG_NAME, "a").get_attribute("href"),
+    }
+    return {'command.{}'.format(name): metric(statistics.median(timed(command, repetitions)))
+            for name, command in commands.items()}
+
+
+def bench_page_objects(driver, url: str, repetitions: int):
+    def landing():
+        POLanding(driver, url).sectionLinks
+
+    def dropdown():
+        PODropDown(driver, url + "dropdown.html").get_text()
+
+    return {'page_object.POLanding': metric(statistics.median(timed(landing, repetitions))),
+            'page_object.PODropDown': metric(statistics.median(timed(dropdown, repetitions)))}
+
+
+def bench_throughput(browser: str, url: str, workers: int, tests: int):
+    bench_env = dict(os.environ, BENCHMARK_BASE_URL=url, BENCHMARK_E2E_TESTS=str(tests),
+                     TESTRUNNER_CONFIG_DEFAULT_BROWSER=browser)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--workers", str(workers), "-q", e2e_tests_path], env=bench_env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+    return {'throughput.{}.workers_{}'.format(browser, workers): metric(tests * 60 / elapsed, "tests/min", True)}
+
+
+def bench_browser_contexts(browser: str, url: str, workers: int, tests: int):
+    # Same suite with a browser per worker and with workers sharing browsers through isolated contexts
+    results = {}
+    for variant, contexts in (("isolated", False), ("shared", True)):
+        bench_env = dict(os.environ, BENCHMARK_BASE_URL=url, BENCHMARK_E2E_TESTS=str(tests),
+                         TESTRUNNER_CONFIG_DEFAULT_BROWSER=browser,
+                         TESTRUNNER_CONFIG_BROWSER_CONTEXTS=json.dumps({'enabled': contexts,
+                                                                        'share_between_workers': True,
+                                                                        'contexts_per_browser': workers}))
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "main.py", "--workers", str(workers), "-q", e2e_tests_path],
+                                   env=bench_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        peak = [0]
+
+        def sample():
+            while process.poll() is None:
+                peak[0] = max(peak[0], ProcessSupervisor.tree_memory(process.pid))
+                time.sleep(0.2)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        process.wait()
+        elapsed = time.perf_counter() - start
+        sampler.join()
+        name = 'browser_contexts.{}.workers_{}.{}'.format(browser, workers, variant)
+        results[name + '.throughput'] = metric(tests * 60 / elapsed, "tests/min", True)
+        results[name + '.peak_memory'] = metric(peak[0] / 1024 / 1024, "MB")
+    return results
+
+
+def run(browsers: list, repetitions: int, workers: list, tests: int):
+    results = {}
+    with StaticServer() as server:
+        for browser in browsers:
+            results.update(bench_config_resolution(browser, repetitions))
+            results.update(bench_driver_startup(browser, repetitions))
+
+            driver = WebDriverFactory.create_instance(browser, exact_match=True)
+            try:
+                results.update(bench_commands(driver, server.url, repetitions))
+                results.update(bench_page_objects(driver, server.url, repetitions))
+            finally:
+                driver.quit()
+
+            for worker_count in workers:
+                results.update(bench_throughput(browser, server.url, worker_count, tests))
+                if worker_count > 1:
+                    results.update(bench_browser_contexts(browser, server.url, worker_count, tests))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the driver factory and page object benchmarks")
+    parser.add_argument("--browsers", nargs="+", default=["chromedriver"],
+                        help="webdriver configurations to benchmark, by name")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--tests", type=int, default=20, help="number of end to end tests per throughput run")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "latest.json"))
+    arguments = parser.parse_args()
+
+    metrics = run(arguments.browsers, arguments.repetitions, arguments.workers, arguments.tests)
+    for name, value in sorted(metrics.items()):
+        print("{:<55} {:>12.4f} {}".format(name, value['value'], value['unit']))
+
+    os.makedirs(os.path.dirname(arguments.output) or ".", exist_ok=True)
+    with open(arguments.output, 'wt') as fd:
+        json.dump({'timestamp': time.time(), 'metrics': metrics}, fd, indent=2, sort_keys=True)
@@ -0,0 +1,80 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+import json
+import statistics
+import time
+
+from testrunner.factory.webdriver_factory import WebDriverFactory
+from testrunner.factory.webdriver_config_registry import WebDriverConfigRegistry
+from testrunner.factory.webdriver_profiles import WebDriverProfiles
+
+
+def measure_startup(driver_config: dict, repetitions: int):
+    """
+    Launches and quits a driver several times
+    :return: list of launch times in seconds
+    """
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        driver = WebDriverFactory.create_instance_from_configuration(driver_config)
+        timings.append(time.perf_counter() - start)
+        driver.quit()
+    return timings
+
+
+def profile_variants(driver_config: dict, profile_name: str):
+    """
+    Splits a profile in its individual settings: yields the configuration without profile, the configuration with
+    every single setting of the profile applied alone, and the configuration with the full profile
+    """
+    base = dict(driver_config)
+    base.pop('profile', None)
+    yield "baseline", base
+
+    defaults = WebDriverProfiles.profiles()[profile_name][driver_config['driver']['type']]
+    for section, values in defaults.items():
+        for key, value in values.items():
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    yield "{}.{}.{}".format(section, key, sub_key), \
+                        WebDriverProfiles.merge(base, {section: {key: {sub_key: sub_value}}})
+            else:
+                yield "{}.{}".format(section, key), WebDriverProfiles.merge(base, {section: {key: value}})
+
+    yield "profile:" + profile_name, WebDriverProfiles.apply(dict(base, profile=profile_name))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measures the startup time saved by every setting of a profile")
+    parser.add_argument("config_file", help="webdriver configuration file, e.g. config/webdrivers/chromedriver.yaml")
+    parser.add_argument("--profile", default="fast")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--output", default=None, help="JSON file to store the results")
+    arguments = parser.parse_args()
+
+    configuration = WebDriverConfigRegistry.load(arguments.config_file)
+    results = []
+    baseline = None
+    for name, variant in profile_variants(configuration, arguments.profile):
+        timings = measure_startup(variant, arguments.repetitions)
+        median = statistics.median(timings)
+        baseline = median if baseline is None else baseline
+        results.append({'setting': name, 'median_s': median, 'saved_s': baseline - median, 'timings_s': timings})
+        print("{:<60} {:>8.3f}s  saved {:>7.3f}s".format(name, median, baseline - median))
+
+    if arguments.output is not None:
+        with open(arguments.output, 'wt') as fd:
+            json.dump(results, fd, indent=2)
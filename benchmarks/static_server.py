@@ -0,0 +1,52 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import functools
+import os.path
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+site_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "site")
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class StaticServer:
+    """
+    Serves benchmarks/site on a local port, as application under test for the benchmarks
+    """
+
+    def __init__(self, directory: str = site_dir, port: int = 0):
+        self.__server = ThreadingHTTPServer(("127.0.0.1", port), functools.partial(QuietHandler, directory=directory))
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="benchmark-server", daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/".format(self.__server.server_address[1])
+
+    def start(self):
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -11,30 +11,126 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import copy
+import json
+import logging
+import os
 import os.path
+import threading
+
 import yaml
 
+# testrunner.util.log_setup reads this configuration to build the runner logger, so it cannot be used here
+logger = logging.getLogger(__name__)
+
 config_dir = "config"
 config_file = "config.yaml"
-dev_config_file = "config_dev.yaml"
-prod_config_file = "config_prod.yaml"
+environment_config_file = "config_{}.yaml"
+
+# Environment variables read by Config. Any top-level key can also be overridden with TESTRUNNER_CONFIG_<KEY>, whose
+# value is parsed as YAML and merged into the key, e.g. TESTRUNNER_CONFIG_LOG_DEFAULT_LEVEL=20. Other TESTRUNNER_*
+# variables, like TESTRUNNER_WORKER_ID, are used internally by the runner and are not configuration keys
+env_var_prefix = "TESTRUNNER_"
+env_var_override_prefix = env_var_prefix + "CONFIG_"
+env_var_environment = env_var_prefix + "ENVIRONMENT"
+env_var_snapshot = env_var_prefix + "CONFIG_SNAPSHOT"
 
 path = os.path.join(config_dir, config_file)
 
+
 def read_yaml(cfg_path):
     with open(cfg_path, 'rt') as fd:
         try:
             dictionary = yaml.safe_load(fd.read())
             return dictionary
-        except Exception as e:
-            print("Unable to load configuration file", path)
+        except yaml.YAMLError as e:
+            logger.exception("Unable to load configuration file {}".format(cfg_path))
             raise e
 
 
-env = read_yaml(path)
-additional_config_path = os.path.join(config_dir, dev_config_file) if env['environment'] == 'dev' else os.path.join(
-    config_dir, prod_config_file)
-additional_config = read_yaml(additional_config_path)
+def merge(base: dict, override: dict):
+    """
+    Deep merges two configuration dictionaries
+    :return: new dictionary with the values of base, replaced by those in override
+    """
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+class Config:
+    """
+    Lazily loaded, memoized runner configuration. Nothing is read until the first key is accessed; then config.yaml
+    is loaded, followed by config_<environment>.yaml for every environment listed in 'environment' (a name or a
+    list of names, applied in order) and finally TESTRUNNER_CONFIG_<KEY> environment variables. Every layer is deep
+    merged into the previous ones, so it only needs the keys it changes.
+    Worker processes receive the loaded configuration through TESTRUNNER_CONFIG_SNAPSHOT and skip YAML parsing.
+    """
+
+    def __init__(self, cfg_path: str = path):
+        self.__path = cfg_path
+        self.__values = None
+        self.__lock = threading.Lock()
+
+    def __load__(self):
+        if self.__values is not None:
+            return self.__values
+        with self.__lock:
+            if self.__values is None:
+                if env_var_snapshot in os.environ:
+                    self.__values = json.loads(os.environ[env_var_snapshot])
+                else:
+                    self.__values = self.__read__()
+        return self.__values
+
+    def __read__(self):
+        values = read_yaml(self.__path) or {}
+
+        environments = os.environ.get(env_var_environment, values.get('environment'))
+        if isinstance(environments, str):
+            environments = [name.strip() for name in environments.split(",") if name.strip() != ""]
+        for environment in environments or []:
+            layer_path = os.path.join(os.path.dirname(self.__path), environment_config_file.format(environment))
+            if os.path.isfile(layer_path):
+                values = merge(values, read_yaml(layer_path) or {})
+        if environments:
+            # The last layer names the logger and any other environment dependent setting
+            values['environment'] = environments[-1]
+
+        overrides = {key[len(env_var_override_prefix):].lower(): yaml.safe_load(value)
+                     for key, value in os.environ.items()
+                     if key.startswith(env_var_override_prefix) and key != env_var_snapshot}
+        return merge(values, overrides)
+
+    def get(self, key, default=None):
+        return self.__load__().get(key, default)
+
+    def __getitem__(self, key):
+        return self.__load__()[key]
+
+    def __contains__(self, key):
+        return key in self.__load__()
+
+    def __setitem__(self, key, value):
+        self.__load__()[key] = value
+
+    def keys(self):
+        return self.__load__().keys()
+
+    def snapshot(self):
+        """
+        Serializes the loaded configuration, so child processes can be started with it in TESTRUNNER_CONFIG_SNAPSHOT
+        :return: JSON string with every configuration value
+        """
+        return json.dumps(self.__load__())
+
+    def reload(self):
+        with self.__lock:
+            self.__values = None
+
 
-for key in additional_config:
-    env[key] = additional_config[key]
+env = Config()
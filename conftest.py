@@ -0,0 +1,25 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+pytest_plugins = [
+    "testrunner.runner.pytest_plugin",
+    "testrunner.runner.instrumentation_plugin",
+    "testrunner.runner.fixtures",
+    "testrunner.runner.impact_plugin",
+    "testrunner.runner.artifacts_plugin",
+    "testrunner.runner.visual_plugin",
+    "testrunner.runner.retry_plugin",
+]
+
+# Benchmarks are only collected when their path is given explicitly, see benchmarks/run.py
+collect_ignore = ["benchmarks"]
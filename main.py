@@ -11,7 +11,19 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import argparse
+import sys
+
 import pytest
 
 if __name__ == '__main__':
-    pytest.console_main()
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--workers", type=int, default=1)
+    arguments, pytest_args = parser.parse_known_args()
+
+    if arguments.workers > 1:
+        from testrunner.runner.parallel_runner import ParallelRunner
+        sys.exit(ParallelRunner(arguments.workers, pytest_args).run())
+    else:
+        sys.argv = [sys.argv[0]] + pytest_args
+        pytest.console_main()
@@ -12,16 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.support.select import Select
 
+from testrunner.base.locator import Locator
 from testrunner.base.page_object import PageObject
 
 
 class PODropDown(PageObject):
-    def __init__(self, driver: WebDriver, url: str = None):
-        super().__init__(driver, url)
-        self.dropdown = Select(driver.find_element(By.ID, 'dropdown'))
+    dropdown = Locator(By.ID, 'dropdown', wrap=Select)
 
     def select_by_value(self, value: str):
         self.dropdown.select_by_value(value)
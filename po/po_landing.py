@@ -12,16 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webdriver import WebDriver
+from testrunner.base.locator import Locator
 from testrunner.base.page_object import PageObject
 
 
 class POLanding(PageObject):
-    def __init__(self, driver: WebDriver, url: str = None):
-        super().__init__(driver, url)
-        self.sectionLinks = driver.find_elements(By.XPATH, '//ul/li/a')
+    sectionLinks = Locator(By.XPATH, '//ul/li/a', multiple=True)
 
     def go_to_section(self, link: str):
-        results = list(filter(lambda item: item.get_attribute("text") == link or item.get_attribute("href").endswith(link), self.sectionLinks))
+        records = self.get_properties(self.sectionLinks, "text", "href")
+        results = list(filter(lambda item: item["text"] == link or (item["href"] or "").endswith(link), records))
         if len(results) > 0:
-            self.driver.get(results[0].get_attribute('href'))
+            self.driver.get(results[0]["href"])
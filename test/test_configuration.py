@@ -0,0 +1,83 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+
+import pytest
+
+from config import configuration
+from config.configuration import Config
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    for key in ("TESTRUNNER_ENVIRONMENT", "TESTRUNNER_CONFIG_SNAPSHOT", "TESTRUNNER_CONFIG_WAITS",
+                "TESTRUNNER_CONFIG_DEFAULT_BROWSER", "TESTRUNNER_WORKER_ID"):
+        monkeypatch.delenv(key, raising=False)
+    (tmp_path / "config.yaml").write_text("environment: dev\ndefault_browser: chrome\n"
+                                          "waits:\n  default_timeout: 10\n  poll_max: 0.5\n")
+    (tmp_path / "config_dev.yaml").write_text("waits:\n  default_timeout: 20\n")
+    (tmp_path / "config_ci.yaml").write_text("default_browser: firefox\n")
+    return str(tmp_path / "config.yaml")
+
+
+def test_environment_layers_are_deep_merged(config_path):
+    config = Config(config_path)
+    assert (config['waits'] == {'default_timeout': 20, 'poll_max': 0.5})
+    assert (config['default_browser'] == "chrome")
+    assert (config['environment'] == "dev")
+
+
+def test_environments_are_applied_in_order(config_path, monkeypatch):
+    monkeypatch.setenv("TESTRUNNER_ENVIRONMENT", "dev, ci")
+    config = Config(config_path)
+    assert (config['default_browser'] == "firefox")
+    assert (config['waits']['default_timeout'] == 20)
+    assert (config['environment'] == "ci")
+
+
+def test_environment_variables_override_keys(config_path, monkeypatch):
+    monkeypatch.setenv("TESTRUNNER_CONFIG_WAITS", "{poll_max: 1}")
+    monkeypatch.setenv("TESTRUNNER_CONFIG_DEFAULT_BROWSER", "edge")
+    monkeypatch.setenv("TESTRUNNER_WORKER_ID", "3")
+    config = Config(config_path)
+    assert (config['waits'] == {'default_timeout': 20, 'poll_max': 1})
+    assert (config['default_browser'] == "edge")
+    assert ("worker_id" not in config and "snapshot" not in config)
+
+
+def test_configuration_is_loaded_lazily_once(config_path, monkeypatch):
+    reads = []
+    read_yaml = configuration.read_yaml
+    monkeypatch.setattr(configuration, "read_yaml", lambda path: reads.append(path) or read_yaml(path))
+    config = Config(config_path)
+    assert (reads == [])
+    config.get("waits")
+    config.get("default_browser")
+    assert (len(reads) == 2)
+
+    config.reload()
+    config.get("waits")
+    assert (len(reads) == 4)
+
+
+def test_snapshot_round_trip(config_path, monkeypatch):
+    original = Config(config_path)
+    original['runtime'] = {'value': [1, 2]}
+    snapshot = original.snapshot()
+
+    monkeypatch.setenv("TESTRUNNER_CONFIG_SNAPSHOT", snapshot)
+    monkeypatch.setattr(configuration, "read_yaml", lambda path: pytest.fail("snapshot must skip YAML parsing"))
+    restored = Config(config_path)
+    assert (dict((key, restored[key]) for key in restored.keys()) == json.loads(snapshot))
+    assert (restored['runtime'] == {'value': [1, 2]})
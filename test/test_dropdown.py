@@ -11,17 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import pytest
-
 from po.po_dropdown import PODropDown
 from po.po_landing import POLanding
-from testrunner.factory.webdriver_factory import WebDriverFactory
-
-
-@pytest.fixture
-def driver():
-    driver = WebDriverFactory.create_instance("chrome")
-    return driver
 
 
 def test_dropdown(driver):
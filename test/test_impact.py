@@ -0,0 +1,89 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+from testrunner.runner.impact import TestImpactIndex
+
+
+@pytest.fixture
+def project(tmp_path):
+    files = {
+        "conftest.py": "pytest_plugins = ['pkg.plugin']\n",
+        "pkg/__init__.py": "",
+        "pkg/core.py": "import json\n",
+        "pkg/plugin.py": "",
+        "pkg/pages/__init__.py": "",
+        "pkg/pages/login.py": "from .. import core\nfrom ..core import loads\n",
+        "tests/test_login.py": "from pkg.pages.login import core\n",
+        "tests/test_other.py": "import os\n",
+    }
+    for path, content in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    return TestImpactIndex(str(tmp_path), str(tmp_path / ".cache" / "impact.json"))
+
+
+def test_imports_are_parsed_from_the_source(project):
+    digest, imports = project.__parse_imports__("pkg/pages/login.py")
+    assert (imports == ["pkg/__init__.py", "pkg/core.py"])
+    assert (len(digest) == 40)
+
+    assert (project.__parse_imports__("tests/test_login.py")[1] ==
+            ["pkg/__init__.py", "pkg/pages/__init__.py", "pkg/pages/login.py"])
+    # Standard library modules are not project files
+    assert (project.__parse_imports__("tests/test_other.py")[1] == [])
+
+
+def test_conftest_plugins_are_imports(project):
+    assert (project.__parse_imports__("conftest.py")[1] == ["pkg/__init__.py", "pkg/plugin.py"])
+
+
+def test_static_dependencies_are_transitive(project):
+    assert (project.static_dependencies("tests/test_login.py") ==
+            {"tests/test_login.py", "pkg/__init__.py", "pkg/pages/__init__.py", "pkg/pages/login.py", "pkg/core.py"})
+
+
+def test_only_affected_tests_are_selected(project):
+    tests = ["tests/test_login.py::test_login", "tests/test_other.py::test_other"]
+    assert (project.select(tests, {"pkg/core.py"}) == ["tests/test_login.py::test_login"])
+    assert (project.select(tests, {"tests/test_other.py"}) == ["tests/test_other.py::test_other"])
+    assert (project.select(tests, {"README.md"}) == [])
+    # conftest.py files are loaded for every test
+    assert (project.select(tests, {"pkg/plugin.py"}) == tests)
+
+
+def test_runtime_dependencies_select_tests(project):
+    tests = ["tests/test_login.py::test_login", "tests/test_other.py::test_other"]
+    project.record_runtime("tests/test_other.py::test_other", {"pkg/core.py"})
+    assert (project.select(tests, {"pkg/core.py"}) == tests)
+
+
+def test_run_all_patterns_and_unknown_test_files_select_tests(project):
+    tests = ["tests/test_login.py::test_login", "tests/test_missing.py::test_missing"]
+    assert (project.select(tests, {"conftest.py"}) == tests)
+    assert (project.select(tests, {"README.md"}) == ["tests/test_missing.py::test_missing"])
+
+
+def test_index_round_trip_and_worker_merge(project, tmp_path):
+    project.static_dependencies("tests/test_login.py")
+    project.record_runtime("tests/test_login.py::test_login", {"pkg/core.py"})
+    project.save(str(tmp_path / "worker-1.impact.json"))
+    assert (not (tmp_path / ".cache" / "impact.json").exists())
+
+    merged = TestImpactIndex(project.root_dir, project.index_file)
+    merged.merge(str(tmp_path / "worker-1.impact.json"))
+    merged.save()
+    reloaded = TestImpactIndex(project.root_dir, project.index_file)
+    assert (reloaded.runtime == {"tests/test_login.py::test_login": ["pkg/core.py"]})
+    assert ("pkg/pages/login.py" in reloaded.files)
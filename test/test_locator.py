@@ -0,0 +1,137 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+from selenium.webdriver.common.by import By
+
+from testrunner.base.locator import LocatedElement, Locator
+
+
+class StandInElement:
+    def __init__(self, text: str):
+        self.text_value = text
+        self.stale = False
+
+    @property
+    def text(self):
+        if self.stale:
+            raise StaleElementReferenceException("stale element")
+        return self.text_value
+
+    def click(self):
+        if self.stale:
+            raise StaleElementReferenceException("stale element")
+        return "clicked " + self.text_value
+
+
+class StandInDriver:
+    def __init__(self, *texts):
+        self.lookups = 0
+        self.render(*texts)
+
+    def render(self, *texts):
+        # Every render replaces the DOM: the elements found before become stale
+        for element in getattr(self, "elements", []):
+            element.stale = True
+        self.elements = [StandInElement(text) for text in texts]
+
+    def find_element(self, by, value):
+        self.lookups += 1
+        if len(self.elements) == 0:
+            raise NoSuchElementException(value)
+        return self.elements[0]
+
+    def find_elements(self, by, value):
+        self.lookups += 1
+        return list(self.elements)
+
+
+class StandInPage:
+    item = Locator(By.CSS_SELECTOR, "li")
+    items = Locator(By.CSS_SELECTOR, "li", multiple=True)
+    label = Locator(By.CSS_SELECTOR, "li", wrap=lambda element: "label:" + element.text)
+
+    def __init__(self, driver):
+        self.driver = driver
+
+
+def test_stale_element_is_resolved_again_once():
+    resolved = [StandInElement("old"), StandInElement("new")]
+    element = LocatedElement(lambda: resolved.pop(0))
+    assert (element.text == "old")
+
+    element.wrapped_object.stale = True
+    assert (element.text == "new")
+    assert (element.click() == "clicked new")
+    assert (resolved == [])
+
+
+def test_special_names_do_not_resolve_the_element():
+    element = LocatedElement(lambda: pytest.fail("the element must not be resolved"))
+    with pytest.raises(AttributeError):
+        element.__deepcopy__
+
+
+def test_element_is_looked_up_once_per_page_object():
+    driver = StandInDriver("first")
+    page = StandInPage(driver)
+    assert (page.item is page.item)
+    assert (page.item.text == "first")
+    assert (driver.lookups == 1)
+
+    driver.render("second")
+    assert (page.item.text == "second")
+    assert (driver.lookups == 2)
+    assert (StandInPage(driver).item.text == "second")
+
+
+def test_wrapped_element_is_cached():
+    driver = StandInDriver("first")
+    page = StandInPage(driver)
+    assert (page.label.wrapped_object == "label:first")
+    assert (page.label.upper() == "LABEL:FIRST")
+    assert (driver.lookups == 1)
+
+
+def test_invalidate_drops_the_cached_element():
+    driver = StandInDriver("first")
+    page = StandInPage(driver)
+    page.item.text
+    StandInPage.item.invalidate(page)
+    driver.elements[0].text_value = "changed"
+    assert (page.item.text == "changed")
+    assert (driver.lookups == 2)
+
+
+def test_stale_element_of_a_list_invalidates_the_list():
+    driver = StandInDriver("a", "b", "c")
+    page = StandInPage(driver)
+    items = page.items
+    assert ([item.text for item in items] == ["a", "b", "c"])
+    assert (page.items is items)
+
+    driver.render("x", "y", "z", "w")
+    assert (items[1].text == "y")
+    assert (page.items is not items)
+    assert ([item.text for item in page.items] == ["x", "y", "z", "w"])
+
+
+def test_stale_element_of_a_list_which_is_gone_fails_clearly():
+    driver = StandInDriver("a", "b", "c")
+    items = StandInPage(driver).items
+    items[2].text
+
+    driver.render("x")
+    with pytest.raises(NoSuchElementException, match="Element 2 of css selector 'li' is gone"):
+        items[2].text
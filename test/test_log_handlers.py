@@ -0,0 +1,90 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import queue
+import sys
+
+import pytest
+
+from testrunner.util import log_handlers
+from testrunner.util.log_handlers import RateLimitFilter, TracebackQueueHandler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(log_handlers.time, "monotonic", lambda: now[0])
+    return now
+
+
+def record(msg="driver %s did not answer", args=("chrome",), level=logging.WARNING, name="dev"):
+    return logging.makeLogRecord({'name': name, 'levelno': level, 'msg': msg, 'args': args})
+
+
+def test_repeated_messages_are_suppressed_per_interval(clock):
+    rate_limit = RateLimitFilter(interval=10, max_repeats=2)
+    assert ([rate_limit.filter(record(args=(index,))) for index in range(5)] == [True, True, False, False, False])
+
+    clock[0] += 10
+    resumed = record()
+    assert (rate_limit.filter(resumed))
+    assert (resumed.getMessage() == "driver chrome did not answer (suppressed 3 similar messages)")
+    following = record()
+    assert (rate_limit.filter(following))
+    assert (following.getMessage() == "driver chrome did not answer")
+
+
+def test_messages_are_limited_by_logger_level_and_template(clock):
+    rate_limit = RateLimitFilter(interval=10, max_repeats=1)
+    assert (rate_limit.filter(record()))
+    assert (not rate_limit.filter(record()))
+    assert (rate_limit.filter(record(level=logging.ERROR)))
+    assert (rate_limit.filter(record(name="other")))
+    assert (rate_limit.filter(record(msg="another template %s")))
+
+
+def test_record_is_counted_once_across_handlers(clock):
+    rate_limit = RateLimitFilter(interval=10, max_repeats=1)
+    first = record()
+    assert (rate_limit.filter(first) and rate_limit.filter(first))
+    second = record()
+    assert (not rate_limit.filter(second) and not rate_limit.filter(second))
+
+
+def test_filter_applies_to_a_logger(clock):
+    captured = []
+    handler = logging.Handler()
+    handler.emit = captured.append
+    handler.addFilter(RateLimitFilter(interval=10, max_repeats=3))
+    logger = logging.getLogger("test_rate_limit_filter")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for _ in range(10):
+            logger.warning("element %s is stale", "#login")
+    finally:
+        logger.removeHandler(handler)
+    assert (len(captured) == 3)
+
+
+def test_queued_records_keep_their_traceback():
+    handler = TracebackQueueHandler(queue.SimpleQueue())
+    try:
+        raise ValueError("broken page")
+    except ValueError:
+        handler.handle(logging.makeLogRecord({'msg': "error in %s", 'args': ("login",), 'exc_info': sys.exc_info()}))
+    queued = handler.queue.get_nowait()
+    assert (queued.getMessage() == "error in login")
+    assert (queued.exc_info is None)
+    assert ("ValueError: broken page" in logging.Formatter().format(queued))
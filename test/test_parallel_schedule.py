@@ -0,0 +1,47 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from testrunner.runner.parallel_runner import ParallelRunner
+
+
+def load(buckets, durations, default=0.0):
+    return [sum(durations.get(node_id, default) for node_id in bucket) for bucket in buckets]
+
+
+def test_slowest_tests_go_to_the_least_loaded_worker():
+    durations = {'a': 7, 'b': 5, 'c': 4, 'd': 3, 'e': 3, 'f': 2}
+    buckets = ParallelRunner.schedule(sorted(durations), durations, 3)
+
+    assert (sorted(node_id for bucket in buckets for node_id in bucket) == sorted(durations))
+    # LPT: a | b, e | c, d, f  ->  7, 8, 9
+    assert (sorted(load(buckets, durations)) == [7, 8, 9])
+    assert (buckets[0][0] == 'a')
+
+
+def test_unknown_tests_are_estimated_with_the_mean_duration():
+    durations = {'slow': 9.0, 'fast': 1.0}
+    buckets = ParallelRunner.schedule(['new', 'slow', 'fast', 'newer'], durations, 2)
+
+    # Unknown tests weigh the mean, 5s each: slow, fast | new, newer
+    assert (load(buckets, durations, 5.0) == [10.0, 10.0])
+    assert (sorted(buckets) == [['new', 'newer'], ['slow', 'fast']])
+
+
+def test_without_history_tests_are_spread_evenly():
+    buckets = ParallelRunner.schedule(["t{}".format(index) for index in range(7)], {}, 3)
+    assert (sorted(len(bucket) for bucket in buckets) == [2, 2, 3])
+
+
+def test_idle_workers_are_dropped():
+    buckets = ParallelRunner.schedule(['a', 'b'], {'a': 1.0, 'b': 2.0}, 4)
+    assert (sorted(buckets) == [['a'], ['b']])
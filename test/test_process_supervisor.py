@@ -0,0 +1,110 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from testrunner.util.process_supervisor import ProcessSupervisor
+
+
+class StandInDriver:
+    def __init__(self, process=None):
+        self.service = type("Service", (), {'process': process})()
+
+
+@pytest.fixture
+def supervisor(monkeypatch, tmp_path):
+    settings = {'enabled': True, 'max_drivers': 2, 'min_free_memory_mb': 0, 'max_load_per_cpu': 0,
+                'admission_timeout': 0.3, 'sample_interval': 0.02, 'state_dir': str(tmp_path)}
+    monkeypatch.setattr(ProcessSupervisor, "settings", staticmethod(lambda: settings))
+    monkeypatch.setattr(ProcessSupervisor, "install", staticmethod(lambda: None))
+    monkeypatch.setattr(ProcessSupervisor, "__available_memory__", staticmethod(lambda: None))
+    monkeypatch.setattr(ProcessSupervisor, "__reserved__", 0)
+    monkeypatch.setattr(ProcessSupervisor, "__drivers__", {})
+    processes = []
+    yield settings, processes
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def launch(processes):
+    processes.append(subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"]))
+    return StandInDriver(processes[-1])
+
+
+def test_admissions_are_reserved_until_register_or_withdraw(supervisor):
+    _, processes = supervisor
+    ProcessSupervisor.admit()
+    ProcessSupervisor.admit()
+    assert (ProcessSupervisor.__reserved__ == 2)
+    with pytest.raises(Exception, match="0 drivers running, 2 starting"):
+        ProcessSupervisor.admit()
+
+    ProcessSupervisor.withdraw()
+    driver = launch(processes)
+    ProcessSupervisor.register(driver)
+    assert (ProcessSupervisor.__reserved__ == 0)
+    assert (list(ProcessSupervisor.metrics().keys()) == [driver.service.process.pid])
+
+    # One driver running and one starting
+    ProcessSupervisor.admit()
+    with pytest.raises(Exception, match="1 drivers running, 1 starting"):
+        ProcessSupervisor.admit()
+
+
+def test_withdraw_never_goes_below_zero(supervisor):
+    ProcessSupervisor.withdraw()
+    assert (ProcessSupervisor.__reserved__ == 0)
+    ProcessSupervisor.register(StandInDriver())
+    assert (ProcessSupervisor.__reserved__ == 0)
+
+
+def test_drivers_without_a_local_process_release_their_reservation(supervisor):
+    ProcessSupervisor.admit()
+    ProcessSupervisor.register(StandInDriver())
+    assert (ProcessSupervisor.__reserved__ == 0)
+    assert (ProcessSupervisor.metrics() == {})
+
+
+def test_admission_waits_for_an_unregistered_driver(supervisor):
+    settings, processes = supervisor
+    settings['admission_timeout'] = 5
+    drivers = []
+    for _ in range(2):
+        ProcessSupervisor.admit()
+        drivers.append(launch(processes))
+        ProcessSupervisor.register(drivers[-1])
+
+    def quit_first():
+        time.sleep(0.2)
+        ProcessSupervisor.unregister(drivers[0])
+    threading.Thread(target=quit_first).start()
+
+    start = time.monotonic()
+    ProcessSupervisor.admit()
+    assert (time.monotonic() - start >= 0.15)
+    assert (ProcessSupervisor.__reserved__ == 1)
+    assert (list(ProcessSupervisor.metrics().keys()) == [drivers[1].service.process.pid])
+
+
+def test_disabled_supervisor_does_not_count(supervisor):
+    settings, _ = supervisor
+    settings['enabled'] = False
+    for _ in range(5):
+        ProcessSupervisor.admit()
+    assert (ProcessSupervisor.__reserved__ == 0)
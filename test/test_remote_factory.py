@@ -0,0 +1,128 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from testrunner.factory.webdriver_factory import WebDriverFactory
+
+
+class StandInGridHandler(BaseHTTPRequestHandler):
+    """
+    Minimal Selenium Grid 4 stand-in: reports its slots in /status and creates and deletes fake sessions
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def __reply__(self, status: int, value):
+        body = json.dumps({'value': value}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        grid = self.server
+        if self.path.endswith("/status"):
+            slots = [{'session': session} for session in grid.sessions] + \
+                    [{'session': None}] * (grid.slots - len(grid.sessions))
+            self.__reply__(200, {'ready': True, 'nodes': [{'availability': "UP", 'slots': slots}]})
+        else:
+            self.__reply__(200, None)
+
+    def do_POST(self):
+        grid = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/session"):
+            if grid.failing or len(grid.sessions) >= grid.slots:
+                self.__reply__(500, {'error': "session not created", 'message': "stand-in grid refused session"})
+                return
+            session_id = uuid.uuid4().hex
+            grid.sessions.append(session_id)
+            self.__reply__(200, {'sessionId': session_id, 'capabilities': {
+                'browserName': "chrome", 'timeouts': {'implicit': 0, 'pageLoad': 300000, 'script': 30000}}})
+        else:
+            self.__reply__(200, None)
+
+    def do_DELETE(self):
+        grid = self.server
+        session_id = self.path.rstrip("/").split("/")[-1]
+        if session_id in grid.sessions:
+            grid.sessions.remove(session_id)
+        self.__reply__(200, None)
+
+
+def start_grid(slots: int, failing: bool = False):
+    grid = ThreadingHTTPServer(("127.0.0.1", 0), StandInGridHandler)
+    grid.slots = slots
+    grid.failing = failing
+    grid.sessions = []
+    grid.url = "http://127.0.0.1:{}/wd/hub".format(grid.server_address[1])
+    threading.Thread(target=grid.serve_forever, daemon=True).start()
+    return grid
+
+
+def remote_configuration(*grids):
+    return {'driver': {'type': "RemoteDriver", 'browser': "chrome", 'retries': 3,
+                       'endpoints': [{'url': grid.url, 'max_sessions': grid.slots} for grid in grids]},
+            'extended_options': {'implicit_timeout': 0}}
+
+
+@pytest.fixture
+def grids():
+    started = []
+    yield lambda slots, failing=False: started.append(start_grid(slots, failing)) or started[-1]
+    for grid in started:
+        grid.shutdown()
+        grid.server_close()
+
+
+def test_sessions_are_balanced_by_free_slots(grids):
+    big, small = grids(2), grids(1)
+    drivers = [WebDriverFactory.create_instance_from_configuration(remote_configuration(big, small)) for _ in range(3)]
+
+    assert (len(big.sessions) == 2)
+    assert (len(small.sessions) == 1)
+    assert (drivers[0].command_executor is drivers[1].command_executor or
+            drivers[0].command_executor is drivers[2].command_executor)
+
+    for driver in drivers:
+        driver.quit()
+    assert (big.sessions == [] and small.sessions == [])
+
+
+def test_session_creation_is_retried_on_another_node(grids):
+    broken, healthy = grids(4, failing=True), grids(1)
+    driver = WebDriverFactory.create_instance_from_configuration(remote_configuration(broken, healthy))
+
+    assert (len(healthy.sessions) == 1)
+    driver.quit()
+
+
+def test_quitting_one_session_keeps_the_shared_pool_open(grids):
+    grid = grids(2)
+    first, second = [WebDriverFactory.create_instance_from_configuration(remote_configuration(grid)) for _ in range(2)]
+    assert (first.command_executor is second.command_executor)
+
+    first.quit()
+    assert (len(second.command_executor._conn.pools) == 1)
+    second.get("about:blank")
+
+    second.quit()
+    assert (grid.sessions == [])
@@ -0,0 +1,102 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+
+from config.configuration import env
+
+pytest_plugins = ["pytester"]
+
+# Loaded now, while the working directory is still the project root and not the directory of pytester
+stats_file = env.get("retry")["stats_file"]
+
+
+def run(pytester, *args):
+    return pytester.runpytest("-p", "testrunner.runner.retry_plugin", "-p", "no:cacheprovider", *args)
+
+
+def test_flaky_test_passes_on_retry(pytester):
+    pytester.makepyfile(test_flaky="""
+        import pytest
+
+        attempts = []
+
+        @pytest.mark.flaky(retries=2)
+        def test_eventually_passes():
+            attempts.append(1)
+            assert len(attempts) == 2
+    """)
+    result = run(pytester)
+
+    assert (result.parseoutcomes() == {'passed': 1, 'rerun': 1})
+    with open(pytester.path / stats_file, 'rt') as fd:
+        entry = json.load(fd)["test_flaky.py::test_eventually_passes"]
+    assert (entry['runs'] == 1 and entry['flaky'] == 1 and entry['retries'] == 1)
+
+
+def test_every_failure_of_a_retried_attempt_is_reported(pytester):
+    pytester.makepyfile(test_teardown="""
+        import pytest
+
+        attempts = []
+
+        @pytest.fixture
+        def resource():
+            yield
+            if len(attempts) == 1:
+                raise RuntimeError("teardown failed")
+
+        @pytest.mark.flaky(retries=1)
+        def test_fails_once(resource):
+            attempts.append(1)
+            assert len(attempts) == 2
+    """)
+    result = run(pytester)
+
+    assert (result.parseoutcomes() == {'passed': 1, 'rerun': 2})
+    result.stdout.fnmatch_lines(["*1 failed attempts retried*", "RERUN *test_fails_once (call)",
+                                 "RERUN *test_fails_once (teardown)"])
+
+
+def test_only_configured_exceptions_are_retried(pytester):
+    pytester.makepyfile(test_exceptions="""
+        def test_assertion():
+            assert False
+
+        attempts = []
+
+        def test_timeout():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise TimeoutError()
+    """)
+    result = run(pytester, "--max-retries", "1")
+
+    assert (result.parseoutcomes() == {'passed': 1, 'failed': 1, 'rerun': 1})
+
+
+def test_quarantined_test_is_expected_to_fail(pytester):
+    pytester.makepyfile(test_quarantine="""
+        def test_quarantined():
+            assert False
+    """)
+    stats_path = pytester.path / stats_file
+    stats_path.parent.mkdir(parents=True, exist_ok=True)
+    stats_path.write_text(json.dumps({"test_quarantine.py::test_quarantined": {
+        'runs': 10, 'failures': 0, 'flaky': 5, 'retries': 5, 'last_run': 0}}))
+    result = run(pytester, "--max-retries", "0")
+
+    assert (result.parseoutcomes() == {'xfailed': 1})
+    with open(stats_path, 'rt') as fd:
+        entry = json.load(fd)["test_quarantine.py::test_quarantined"]
+    assert (entry['runs'] == 11 and entry['failures'] == 1)
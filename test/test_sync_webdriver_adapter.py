@@ -0,0 +1,146 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import trio
+
+from po.po_dropdown import PODropDown
+from testrunner.factory.async_webdriver import AsyncWebDriver
+from testrunner.factory.sync_webdriver_adapter import SyncWebDriverAdapter
+
+element_key = "element-6066-11e4-a52e-4f735466cecf"
+screenshot = base64.b64encode(b"\x89PNG stand-in").decode("ascii")
+
+
+class StandInDropdownHandler(BaseHTTPRequestHandler):
+    """
+    Minimal W3C WebDriver endpoint serving the dropdown page of the-internet: a <select id="dropdown"> with a
+    placeholder and two options. Only the commands PODropDown and the adapter need are implemented
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body in a single segment, or delayed ACKs stall every keep-alive response
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def __reply__(self, status: int, value):
+        body = json.dumps({'value': value}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __command__(self):
+        # Path after /session/<id>, e.g. ['element', 'option-1', 'click']
+        return self.path.split("/")[3:]
+
+    def do_GET(self):
+        page = self.server
+        command = self.__command__()
+        if command == ["timeouts"]:
+            self.__reply__(200, page.timeouts)
+        elif command == ["screenshot"] or command[-1:] == ["screenshot"]:
+            self.__reply__(200, screenshot)
+        elif command[0] == "element" and command[-1] == "name":
+            self.__reply__(200, "select" if command[1] == "dropdown" else "option")
+        elif command[0] == "element" and command[-2] == "attribute":
+            self.__reply__(200, None)
+        elif command[0] == "element" and command[-1] == "selected":
+            self.__reply__(200, page.selected == command[1])
+        elif command[0] == "element" and command[-1] == "enabled":
+            self.__reply__(200, command[1] != "option-0")
+        elif command[0] == "element" and command[-1] == "text":
+            self.__reply__(200, page.options[command[1]])
+        else:
+            self.__reply__(404, {'error': "unknown command", 'message': self.path})
+
+    def do_POST(self):
+        page = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/session":
+            self.__reply__(200, {'sessionId': "stand-in", 'capabilities': {'browserName': "chrome"}})
+            return
+        command = self.__command__()
+        if command == ["timeouts"]:
+            page.timeouts.update(body)
+            self.__reply__(200, None)
+        elif command == ["element"] and body['value'] == '[id="dropdown"]':
+            self.__reply__(200, {element_key: "dropdown"})
+        elif command == ["element", "dropdown", "elements"] and body['value'] == "option":
+            self.__reply__(200, [{element_key: option} for option in sorted(page.options)])
+        elif command[0] == "element" and command[-1] == "click":
+            page.selected = command[1]
+            self.__reply__(200, None)
+        elif command == ["execute", "sync"]:
+            # Only get_attribute("index") of an option is ever executed
+            element, name = body['args']
+            self.__reply__(200, element[element_key].split("-")[1] if name == "index" else None)
+        else:
+            self.__reply__(404, {'error': "unknown command", 'message': self.path})
+
+    def do_DELETE(self):
+        self.__reply__(200, None)
+
+
+@pytest.fixture
+def endpoint():
+    page = ThreadingHTTPServer(("127.0.0.1", 0), StandInDropdownHandler)
+    page.options = {"option-0": "Please select an option", "option-1": "Option 1", "option-2": "Option 2"}
+    page.selected = "option-0"
+    page.timeouts = {'implicit': 0, 'pageLoad': 300000, 'script': 30000}
+    page.url = "http://127.0.0.1:{}".format(page.server_address[1])
+    threading.Thread(target=page.serve_forever, daemon=True).start()
+    yield page
+    page.shutdown()
+    page.server_close()
+
+
+def run_with_adapter(endpoint, function):
+    async def main():
+        driver = await AsyncWebDriver.start(endpoint.url, {'browserName': "chrome"})
+        try:
+            return await SyncWebDriverAdapter.run(driver, function)
+        finally:
+            await driver.quit()
+    return trio.run(main)
+
+
+def test_page_object_drives_async_session(endpoint):
+    def select(driver):
+        dropdown = PODropDown(driver)
+        dropdown.select_by_index(2)
+        return dropdown.get_text()
+
+    assert (run_with_adapter(endpoint, select) == "Option 2")
+    assert (endpoint.selected == "option-2")
+
+
+def test_selenium_shims(endpoint):
+    def use_shims(driver):
+        driver.set_script_timeout(5)
+        driver.set_page_load_timeout(60)
+        timeouts = driver.timeouts
+        element = driver.find_element("id", "dropdown")
+        return timeouts.script, timeouts.page_load, driver.get_screenshot_as_png(), element.screenshot_as_png
+
+    script, page_load, page_png, element_png = run_with_adapter(endpoint, use_shims)
+    assert (script == 5 and page_load == 60)
+    assert (page_png == element_png == b"\x89PNG stand-in")
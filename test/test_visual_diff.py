@@ -0,0 +1,122 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from testrunner.util import visual_diff
+from testrunner.util.visual_diff import BaselineStore, VisualDiff
+
+
+def png(size=(180, 160), color=(240, 240, 240), boxes=(), gradient: int = 0):
+    image = Image.new("RGB", size, color)
+    if gradient > 0:
+        # Horizontal gradient of at most 'gradient' levels over the background
+        image = Image.merge("RGB", [Image.linear_gradient("L").rotate(90).resize(size).point(
+            lambda value, base=base: base - value * gradient // 255) for base in color])
+    draw = ImageDraw.Draw(image)
+    for box, fill in boxes:
+        draw.rectangle(box, fill=fill)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+@pytest.fixture(params=["numpy", "pillow"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(visual_diff, "numpy", None)
+    return request.param
+
+
+def test_identical_images_match(backend):
+    baseline = png(boxes=[((10, 10, 50, 50), (0, 0, 255))])
+    assert (VisualDiff.compare(baseline, baseline)['reason'] == "identical")
+
+    # Same pixels in a different encoding
+    image = Image.open(io.BytesIO(baseline))
+    reencoded = io.BytesIO()
+    image.save(reencoded, format="PNG", compress_level=0)
+    result = VisualDiff.compare(baseline, reencoded.getvalue())
+    assert (result['match'] and result['reason'] == "identical pixels")
+
+
+def test_size_mismatch_fails(backend):
+    result = VisualDiff.compare(png(size=(180, 160)), png(size=(180, 161)), tolerance=1.0)
+    assert (not result['match'])
+    assert ("size" in result['reason'])
+
+
+def test_tolerance(backend):
+    baseline = png()
+    # 20x20 changed pixels out of 180x160, about 1.4%
+    actual = png(boxes=[((0, 0, 19, 19), (255, 0, 0))])
+
+    strict = VisualDiff.compare(baseline, actual, tolerance=0.01)
+    assert (not strict['match'])
+    assert (strict['mismatched_pixels'] == 400)
+    assert (strict['diff_png'] is not None)
+    assert (VisualDiff.compare(baseline, actual, tolerance=0.02)['match'])
+
+
+def test_pixel_tolerance_absorbs_small_changes(backend):
+    # A gradient of at most 8 levels, which looks very different to a perceptual hash
+    result = VisualDiff.compare(png(), png(gradient=8), pixel_tolerance=16)
+    assert (result['match'])
+    assert (result['mismatched_pixels'] == 0)
+    assert (not VisualDiff.compare(png(), png(gradient=8), pixel_tolerance=4)['match'])
+
+
+def test_ignore_regions(backend):
+    baseline = png()
+    actual = png(boxes=[((100, 100, 149, 149), (0, 0, 0))])
+    assert (not VisualDiff.compare(baseline, actual)['match'])
+    assert (VisualDiff.compare(baseline, actual, ignore_regions=[(90, 90, 80, 80)])['match'])
+
+
+def test_overlapping_ignore_regions_are_counted_once(backend):
+    baseline = png()
+    # 7200 pixels change outside the ignored top 100 rows
+    actual = png(boxes=[((0, 100, 179, 159), (0, 0, 0))])
+    result = VisualDiff.compare(baseline, actual, ignore_regions=[(0, 0, 180, 100), (0, 0, 180, 100)])
+    assert (not result['match'])
+    assert (result['mismatched_pixels'] == 180 * 60)
+    assert (result['mismatch_ratio'] == 1.0)
+
+
+def test_hash_distance_is_reported():
+    baseline = png()
+    actual = png(boxes=[((90, 0, 179, 159), (0, 0, 0))])
+    assert (VisualDiff.hash_distance(VisualDiff.difference_hash(Image.open(io.BytesIO(baseline))),
+                                     VisualDiff.difference_hash(Image.open(io.BytesIO(baseline)))) == 0)
+    assert (VisualDiff.compare(baseline, actual)['hash_distance'] > 0)
+
+
+def test_baseline_store_is_content_addressed(tmp_path):
+    store = BaselineStore(str(tmp_path))
+    assert (store.get("home/header") == (None, None))
+
+    image = png()
+    digest = store.put("home/header", image)
+    assert (store.put("landing/header", image) == digest)
+    assert (store.get("home/header") == (digest, image))
+    assert (len(list((tmp_path / "objects").rglob("*.png"))) == 1)
+
+    updated = png(color=(0, 0, 0))
+    assert (store.put("home/header", updated) != digest)
+    assert (store.get("home/header")[1] == updated)
+    assert (store.get("landing/header")[1] == image)
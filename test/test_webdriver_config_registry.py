@@ -0,0 +1,86 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+
+import pytest
+
+from testrunner.factory.webdriver_config_registry import WebDriverConfigRegistry
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    WebDriverConfigRegistry.clear()
+
+    def write(name: str, content: str, mtime: float = None):
+        path = tmp_path / name
+        path.write_text(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return str(path)
+
+    yield write
+    WebDriverConfigRegistry.clear()
+
+
+def test_valid_configuration_has_no_errors():
+    configuration = {'driver': {'type': "ChromeDriver", 'verbose': False}, 'aliases': ["gc"],
+                     'network': {'enabled': True, 'block': ["*.png"]}}
+    assert (WebDriverConfigRegistry.validate(configuration, "chrome.yaml") == [])
+
+
+def test_schema_errors_are_reported():
+    errors = WebDriverConfigRegistry.validate({'driver': {'verbose': "yes"}, 'options': [], 'aliases': "gc"},
+                                              "broken.yaml")
+    assert ("'broken.yaml': 'driver.verbose' must be a bool" in errors)
+    assert ("'broken.yaml': 'options' must be a dict" in errors)
+    assert ("'broken.yaml': 'aliases' must be a list" in errors)
+    assert ("'broken.yaml': missing mandatory field 'driver.type'" in errors)
+    assert (WebDriverConfigRegistry.validate(["driver"], "list.yaml") == ["'list.yaml' is not a YAML mapping"])
+
+
+def test_invalid_file_is_refused_on_load(config_dir):
+    path = config_dir("broken.yaml", "driver:\n  verbose: yes\n")
+    with pytest.raises(Exception, match="missing mandatory field 'driver.type'"):
+        WebDriverConfigRegistry.load(path)
+
+
+def test_names_aliases_and_partial_names_are_resolved(config_dir):
+    chrome = config_dir("chrome_headless.yaml", "driver:\n  type: ChromeDriver\naliases: [gc, Headless]\n")
+    firefox = config_dir("firefox.yaml", "driver:\n  type: FirefoxDriver\n")
+    directory = os.path.dirname(chrome)
+
+    assert (WebDriverConfigRegistry.find(directory, "firefox.yaml") == firefox)
+    assert (WebDriverConfigRegistry.find(directory, "GC") == chrome)
+    assert (WebDriverConfigRegistry.find(directory, "headless", exact_match=True) == chrome)
+    assert (WebDriverConfigRegistry.find(directory, "fox") == firefox)
+    assert (WebDriverConfigRegistry.find(directory, "fox", exact_match=True) == "")
+    assert (WebDriverConfigRegistry.find(directory, "opera") == "")
+
+
+def test_aliases_edited_in_place_are_reindexed(config_dir):
+    chrome = config_dir("chrome.yaml", "driver:\n  type: ChromeDriver\naliases: [gc]\n", mtime=1000000)
+    directory = os.path.dirname(chrome)
+    directory_mtime = os.stat(directory).st_mtime
+    assert (WebDriverConfigRegistry.find(directory, "gc", exact_match=True) == chrome)
+
+    config_dir("chrome.yaml", "driver:\n  type: ChromeDriver\naliases: [google]\n", mtime=2000000)
+    os.utime(directory, (directory_mtime, directory_mtime))
+    assert (WebDriverConfigRegistry.find(directory, "gc", exact_match=True) == "")
+    assert (WebDriverConfigRegistry.find(directory, "google", exact_match=True) == chrome)
+
+
+def test_loaded_configuration_is_a_copy(config_dir):
+    path = config_dir("chrome.yaml", "driver:\n  type: ChromeDriver\n")
+    WebDriverConfigRegistry.load(path)['driver']['type'] = "Changed"
+    assert (WebDriverConfigRegistry.load(path)['driver']['type'] == "ChromeDriver")
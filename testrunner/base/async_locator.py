@@ -0,0 +1,114 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from selenium.common.exceptions import TimeoutException
+
+from testrunner.base.async_wait import AsyncWait
+from testrunner.base.locator import Locator
+from testrunner.base.wait import Wait
+
+
+class AsyncLocator:
+    """
+    Declarative element locator for async page objects. Reading the attribute returns an awaitable; the element is
+    looked up the first time it is awaited and cached in the page object instance:
+
+        class PODropDownAsync(AsyncPageObject):
+            dropdown = AsyncLocator(By.ID, 'dropdown')
+
+        element = await page.dropdown
+
+    Async drivers never use implicit waits, so lookups always poll up to timeout seconds.
+    """
+
+    def __init__(self, by: str, value: str, multiple: bool = False, timeout: float = None):
+        """
+        :param by: locator strategy, one of selenium.webdriver.common.by.By
+        :param value: locator value
+        :param multiple: return a list with every matching element instead of the first one
+        :param timeout: seconds to wait for the element to be present, waits.default_timeout if not provided
+        """
+        self.by = by
+        self.value = value
+        self.multiple = multiple
+        self.timeout = timeout
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    async def __find__(self, driver):
+        timeout = self.timeout if self.timeout is not None else Wait.settings().get("default_timeout", 10)
+
+        async def present(current_driver):
+            return await current_driver.find_elements(self.by, self.value)
+
+        if self.multiple:
+            # An empty list is a valid result for multiple locators, so don't fail if nothing shows up in time
+            try:
+                return await AsyncWait(driver, timeout, mutation_observer=False).until(present)
+            except TimeoutException:
+                return []
+        elements = await AsyncWait(driver, timeout, mutation_observer=False).until(
+            present, "Element {} '{}' not found after {}s".format(self.by, self.value, timeout))
+        return elements[0]
+
+    async def resolve(self, page_object):
+        cache = page_object.__dict__.setdefault('_locator_cache_', {})
+        if self.name not in cache:
+            cache[self.name] = await self.__find__(page_object.driver)
+        return cache[self.name]
+
+    def __get__(self, page_object, owner):
+        if page_object is None:
+            return self
+        return self.resolve(page_object)
+
+    def invalidate(self, page_object):
+        """
+        Drops the cached element, so it will be looked up again on next access
+        """
+        page_object.__dict__.get('_locator_cache_', {}).pop(self.name, None)
+
+    @staticmethod
+    def declared(page_object_class):
+        """
+        :return: every AsyncLocator declared in a page object class and its parents
+        """
+        locators = {}
+        for klass in reversed(page_object_class.__mro__):
+            for name, attribute in vars(klass).items():
+                if isinstance(attribute, AsyncLocator):
+                    locators[name] = attribute
+        return list(locators.values())
+
+    @staticmethod
+    async def prefetch(page_object):
+        """
+        Resolves every declared locator of a page object with a single script, like Locator.prefetch
+        """
+        locators = [locator for locator in AsyncLocator.declared(type(page_object))
+                    if Locator.lookup_script(locator.by, locator.value) is not None]
+        if len(locators) == 0:
+            return
+
+        script = "return [{}];".format(", ".join(Locator.lookup_script(locator.by, locator.value)
+                                                 for locator in locators))
+        results = await page_object.driver.execute_script(script)
+
+        cache = page_object.__dict__.setdefault('_locator_cache_', {})
+        for locator, elements in zip(locators, results):
+            if locator.multiple:
+                cache[locator.name] = elements
+            elif len(elements) > 0:
+                cache[locator.name] = elements[0]
@@ -0,0 +1,104 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from selenium.common.exceptions import StaleElementReferenceException
+
+from testrunner.base.async_locator import AsyncLocator
+from testrunner.base.async_wait import AsyncWait
+from testrunner.base.locator import Locator
+from testrunner.base.page_object import PageObject
+
+
+class AsyncPageObject:
+    """
+    Page object for AsyncWebDriver, mirroring PageObject. Navigation needs to be awaited, so instances are created
+    with open() instead of the constructor:
+
+        page = await PODropDownAsync.open(driver, url)
+    """
+
+    # Resolve every declared AsyncLocator with a single script right after the page object is opened
+    prefetch_locators = False
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    @classmethod
+    async def open(cls, driver, url: str = None):
+        """
+        :param driver: AsyncWebDriver instance
+        :param url: page to navigate to, if any
+        :return: page object instance
+        """
+        page_object = cls(driver)
+        if url:
+            await driver.get(url)
+        if cls.prefetch_locators:
+            await AsyncLocator.prefetch(page_object)
+        return page_object
+
+    def wait(self, timeout: float = None):
+        """
+        :param timeout: seconds to wait; waits.default_timeout from config.yaml if not provided
+        :return: AsyncWait bound to this page object driver
+        """
+        return AsyncWait(self.driver, timeout)
+
+    async def is_present(self, by: str, value: str):
+        """
+        Checks whether an element exists right now, without waiting
+        """
+        lookup = Locator.lookup_script(by, value)
+        if lookup is None:
+            # find_elements waits the implicit timeout when nothing matches, so it is disabled for the lookup
+            previous = (await self.driver.get_timeouts())['implicit']
+            await self.driver.set_timeouts(implicit=0)
+            try:
+                return len(await self.driver.find_elements(by, value)) > 0
+            finally:
+                await self.driver.set_timeouts(implicit=previous)
+        return await self.driver.execute_script("return {}.length > 0;".format(lookup))
+
+    async def __execute_on_elements__(self, script: str, elements: list, *args):
+        if len(elements) == 0:
+            return []
+        try:
+            return await self.driver.execute_script(script, elements, *args)
+        except StaleElementReferenceException:
+            # Cached elements are gone after a re-render, look them up again next time
+            self.__dict__.pop('_locator_cache_', None)
+            raise
+
+    async def get_properties(self, elements: list, *names: str):
+        """
+        Reads DOM properties of a list of elements in a single round trip, like PageObject.get_properties
+        """
+        return await self.__execute_on_elements__(PageObject.__properties_script__, elements, list(names))
+
+    async def get_attributes(self, elements: list, *names: str):
+        """
+        Reads HTML attributes of a list of elements in a single round trip, like PageObject.get_attributes
+        """
+        return await self.__execute_on_elements__(PageObject.__attributes_script__, elements, list(names))
+
+    async def get_texts(self, elements: list):
+        return [record['innerText'] for record in await self.get_properties(elements, 'innerText')]
+
+    async def get_hrefs(self, elements: list):
+        return [record['href'] for record in await self.get_properties(elements, 'href')]
+
+    async def get_visibility(self, elements: list):
+        return await self.__execute_on_elements__(PageObject.__visibility_script__, elements)
+
+    async def get_rects(self, elements: list):
+        return await self.__execute_on_elements__(PageObject.__rects_script__, elements)
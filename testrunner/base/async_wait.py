@@ -0,0 +1,85 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import inspect
+
+import trio
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from testrunner.base.wait import Wait
+
+
+class AsyncWait:
+    """
+    Explicit wait for AsyncWebDriver with the same exponential backoff and MutationObserver behaviour as Wait,
+    sleeping on the trio loop instead of blocking a thread. Defaults are read from the 'waits' section of config.yaml.
+    """
+
+    def __init__(self, driver, timeout: float = None, poll_initial: float = None, poll_max: float = None,
+                 backoff: float = None, mutation_observer: bool = None):
+        # Same defaults as the blocking Wait; only its settings are used
+        settings = Wait(None, timeout, poll_initial, poll_max, backoff, mutation_observer)
+        self.driver = driver
+        self.timeout = settings.timeout
+        self.poll_initial = settings.poll_initial
+        self.poll_max = settings.poll_max
+        self.backoff = settings.backoff
+        self.mutation_observer = settings.mutation_observer
+
+    async def __check__(self, condition):
+        try:
+            # Conditions built for the blocking Wait can only be awaited through their JavaScript expression
+            if not inspect.iscoroutinefunction(condition) and getattr(condition, "script", None) is not None:
+                return await self.driver.execute_script("return !!({});".format(condition.script))
+            return await condition(self.driver)
+        except Wait.__ignored_exceptions__:
+            return None
+
+    async def __observe__(self, script: str, timeout: float):
+        try:
+            # The script timeout is a session setting: restore it, so later scripts of the test are not affected
+            previous = (await self.driver.get_timeouts())['script']
+            await self.driver.set_timeouts(script=timeout + 1)
+            try:
+                return await self.driver.execute_async_script(Wait.__observer_script__ % script, int(timeout * 1000))
+            finally:
+                await self.driver.set_timeouts(script=previous)
+        except WebDriverException:
+            # A navigation destroys the observer; fall back to polling
+            return False
+
+    async def until(self, condition, message: str = ""):
+        """
+        Waits until the condition holds
+        :param condition: coroutine function receiving the driver, or a Condition with a JavaScript expression
+        :param message: message of the TimeoutException raised if the condition does not hold in time
+        :return: the value returned by the condition
+        """
+        deadline = trio.current_time() + self.timeout
+        script = getattr(condition, "script", None)
+        if self.mutation_observer and script is not None and await self.__observe__(script, self.timeout):
+            result = await self.__check__(condition)
+            if result:
+                return result
+
+        poll = self.poll_initial
+        while True:
+            result = await self.__check__(condition)
+            if result:
+                return result
+            remaining = deadline - trio.current_time()
+            if remaining <= 0:
+                raise TimeoutException(message or "Condition {} not met after {}s".format(
+                    getattr(condition, "description", condition), self.timeout))
+            await trio.sleep(min(poll, remaining))
+            poll = min(poll * self.backoff, self.poll_max)
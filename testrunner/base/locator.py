@@ -0,0 +1,198 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+from selenium.webdriver.common.by import By
+
+from testrunner.base.wait import Condition, Wait
+
+
+class LocatedElement:
+    """
+    Proxy to an element (or wrapper of an element, like Select) resolved by a Locator. Any access which fails with
+    StaleElementReferenceException resolves the element again and is retried once.
+    """
+
+    def __init__(self, resolve, resolved=None):
+        self.__resolve = resolve
+        self.__target = resolved
+
+    @property
+    def wrapped_object(self):
+        if self.__target is None:
+            self.__target = self.__resolve()
+        return self.__target
+
+    def refresh(self):
+        self.__target = self.__resolve()
+        return self.__target
+
+    def __retry__(self, action):
+        try:
+            return action(self.wrapped_object)
+        except StaleElementReferenceException:
+            return action(self.refresh())
+
+    def __getattr__(self, name):
+        # Special names are looked up by copy, pickle and others, and must not resolve the element
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = self.__retry__(lambda target: getattr(target, name))
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            return self.__retry__(lambda target: getattr(target, name)(*args, **kwargs))
+        return call
+
+
+class Locator:
+    """
+    Declarative element locator for page objects. The element is looked up the first time the attribute is read,
+    cached in the page object instance, and transparently looked up again if it becomes stale:
+
+        class PODropDown(PageObject):
+            dropdown = Locator(By.ID, 'dropdown', wrap=Select)
+    """
+
+    # Strategies that can be resolved by Locator.prefetch in a single script, and the JavaScript to do it
+    __prefetch_strategies__ = {
+        By.ID: "[document.getElementById(value)]",
+        By.CSS_SELECTOR: "Array.from(document.querySelectorAll(value))",
+        By.NAME: "Array.from(document.getElementsByName(value))",
+        By.CLASS_NAME: "Array.from(document.getElementsByClassName(value))",
+        By.TAG_NAME: "Array.from(document.getElementsByTagName(value))",
+        By.XPATH: "(function () { var found = [], result = document.evaluate(value, document, null, "
+                  "XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null); for (var i = 0; i < result.snapshotLength; i++) "
+                  "{ found.push(result.snapshotItem(i)); } return found; })()",
+    }
+
+    def __init__(self, by: str, value: str, wrap=None, multiple: bool = False, timeout: float = None):
+        """
+        :param by: locator strategy, one of selenium.webdriver.common.by.By
+        :param value: locator value
+        :param wrap: optional callable applied to every found element, e.g. Select
+        :param multiple: return a list with every matching element instead of the first one
+        :param timeout: seconds to wait for the element to be present. If not provided, the lookup relies on the
+        implicit timeout, or uses waits.default_timeout when implicit waits are disabled
+        """
+        self.by = by
+        self.value = value
+        self.wrap = wrap
+        self.multiple = multiple
+        self.timeout = timeout
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    @staticmethod
+    def lookup_script(by: str, value: str):
+        """
+        :return: JavaScript expression evaluating to the array of elements matching the locator, or None if the
+        strategy can not be evaluated in JavaScript
+        """
+        if by not in Locator.__prefetch_strategies__:
+            return None
+        return "(function (value) {{ return {}.filter(function (e) {{ return e; }}); }})({})".format(
+            Locator.__prefetch_strategies__[by], json.dumps(value))
+
+    def __find__(self, driver):
+        timeout = self.timeout
+        if timeout is None and not Wait.implicit_waits_enabled():
+            timeout = Wait.settings().get("default_timeout", 10)
+        if timeout is None:
+            return driver.find_elements(self.by, self.value) if self.multiple \
+                else [driver.find_element(self.by, self.value)]
+
+        condition = Condition.present(self.by, self.value)
+        if self.multiple:
+            # An empty list is a valid result for multiple locators, so don't fail if nothing shows up in time
+            try:
+                return Wait(driver, timeout, mutation_observer=False).until(condition)
+            except TimeoutException:
+                return []
+        return Wait(driver, timeout, mutation_observer=False).until(
+            condition, "Element {} '{}' not found after {}s".format(self.by, self.value, timeout))
+
+    def __wrap__(self, element):
+        return self.wrap(element) if self.wrap is not None else element
+
+    def __bind__(self, page_object, elements: list = None):
+        driver = page_object.driver
+        if not self.multiple:
+            resolved = self.__wrap__(elements[0]) if elements else None
+            return LocatedElement(lambda: self.__wrap__(self.__find__(driver)[0]), resolved)
+
+        def resolve(index):
+            # A stale element means the list changed: the cached list is dropped, so the next access to the attribute
+            # looks up the whole list again, and this element is resolved by its position in the current one
+            self.invalidate(page_object)
+            found = self.__find__(driver)
+            if index >= len(found):
+                raise NoSuchElementException("Element {} of {} '{}' is gone, only {} elements match now".format(
+                    index, self.by, self.value, len(found)))
+            return self.__wrap__(found[index])
+
+        if elements is None:
+            elements = self.__find__(driver)
+        return [LocatedElement(lambda index=index: resolve(index), self.__wrap__(element))
+                for index, element in enumerate(elements)]
+
+    def __get__(self, page_object, owner):
+        if page_object is None:
+            return self
+        cache = page_object.__dict__.setdefault('_locator_cache_', {})
+        if self.name not in cache:
+            cache[self.name] = self.__bind__(page_object)
+        return cache[self.name]
+
+    def invalidate(self, page_object):
+        """
+        Drops the cached element, so it will be looked up again on next access
+        """
+        page_object.__dict__.get('_locator_cache_', {}).pop(self.name, None)
+
+    @staticmethod
+    def declared(page_object_class):
+        """
+        :return: every Locator declared in a page object class and its parents
+        """
+        locators = {}
+        for klass in reversed(page_object_class.__mro__):
+            for name, attribute in vars(klass).items():
+                if isinstance(attribute, Locator):
+                    locators[name] = attribute
+        return list(locators.values())
+
+    @staticmethod
+    def prefetch(page_object):
+        """
+        Resolves every declared locator of a page object with a single script. Locators whose strategy can not be
+        evaluated in JavaScript, or which find no element, are left to be resolved lazily.
+        """
+        locators = [locator for locator in Locator.declared(type(page_object))
+                    if locator.by in Locator.__prefetch_strategies__]
+        if len(locators) == 0:
+            return
+
+        script = "return [{}];".format(", ".join(Locator.lookup_script(locator.by, locator.value)
+                                                 for locator in locators))
+        results = page_object.driver.execute_script(script)
+
+        cache = page_object.__dict__.setdefault('_locator_cache_', {})
+        for locator, elements in zip(locators, results):
+            if locator.multiple or len(elements) > 0:
+                cache[locator.name] = locator.__bind__(page_object, elements)
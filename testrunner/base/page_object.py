@@ -11,11 +11,194 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import base64
+
+from selenium.common.exceptions import StaleElementReferenceException
 from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support.select import Select
+
+from testrunner.base.locator import Locator, LocatedElement
+from testrunner.base.performance_capture import PerformanceCapture
+from testrunner.base.wait import Condition, Wait
+from testrunner.util.instrumentation import PerformanceRecorder
+from testrunner.util.log_handlers import LogContext
+from testrunner.util.visual_checker import VisualChecker, VisualMismatch
 
 
 class PageObject:
+    # Resolve every declared Locator with a single script right after the page object is created
+    prefetch_locators = False
+
+    __properties_script__ = """
+        var elements = arguments[0], names = arguments[1];
+        return elements.map(function (element) {
+            var record = {};
+            names.forEach(function (name) { record[name] = element[name] === undefined ? null : element[name]; });
+            return record;
+        });"""
+
+    __attributes_script__ = """
+        var elements = arguments[0], names = arguments[1];
+        return elements.map(function (element) {
+            var record = {};
+            names.forEach(function (name) { record[name] = element.getAttribute(name); });
+            return record;
+        });"""
+
+    __visibility_script__ = """
+        return arguments[0].map(function (element) {
+            var style = window.getComputedStyle(element);
+            return element.getClientRects().length > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+        });"""
+
+    __rects_script__ = """
+        return arguments[0].map(function (element) {
+            var rect = element.getBoundingClientRect();
+            return {x: rect.x, y: rect.y, width: rect.width, height: rect.height};
+        });"""
+
+    __geometry_script__ = """
+        return {
+            ratio: window.devicePixelRatio || 1, scroll_x: window.scrollX, scroll_y: window.scrollY,
+            rects: arguments[0].map(function (element) {
+                var rect = element.getBoundingClientRect();
+                return {x: rect.x, y: rect.y, width: rect.width, height: rect.height};
+            })
+        };"""
+
     def __init__(self, driver: WebDriver, url: str = None):
         self.driver = driver
+        self.navigation_metrics = None
         if url:
-            self.driver.get(url)
+            with PerformanceRecorder.measure("navigation"):
+                self.driver.get(url)
+            self.navigation_metrics = PerformanceCapture.collect(self.driver, type(self).__name__)
+        if self.prefetch_locators:
+            Locator.prefetch(self)
+
+    def wait(self, timeout: float = None):
+        """
+        :param timeout: seconds to wait; waits.default_timeout from config.yaml if not provided
+        :return: Wait bound to this page object driver, e.g. self.wait(5).until(Condition.absent(By.ID, 'spinner'))
+        """
+        return Wait(self.driver, timeout)
+
+    def is_present(self, by: str, value: str):
+        """
+        Checks whether an element exists right now, without waiting for the implicit timeout
+        """
+        return not Condition.absent(by, value)(self.driver)
+
+    def __execute_on_elements__(self, script: str, elements: list, *args):
+        if len(elements) == 0:
+            return []
+        try:
+            return self.driver.execute_script(script, PageObject.__unwrap__(elements), *args)
+        except StaleElementReferenceException:
+            for element in elements:
+                if isinstance(element, LocatedElement):
+                    element.refresh()
+            return self.driver.execute_script(script, PageObject.__unwrap__(elements), *args)
+
+    @staticmethod
+    def __unwrap__(elements: list):
+        # Scripts need the WebElement itself, not the LocatedElement proxy or a wrapper like Select around it
+        unwrapped = []
+        for element in elements:
+            if isinstance(element, LocatedElement):
+                element = element.wrapped_object
+            if isinstance(element, Select):
+                element = element._el
+            unwrapped.append(element)
+        return unwrapped
+
+    def get_properties(self, elements: list, *names: str):
+        """
+        Reads DOM properties of a list of elements in a single round trip to the driver
+        :param elements: list of WebElement
+        :param names: name of the properties to read, e.g. 'text', 'href', 'value'
+        :return: one dictionary per element, mapping every property name to its value
+        """
+        return self.__execute_on_elements__(PageObject.__properties_script__, elements, list(names))
+
+    def get_attributes(self, elements: list, *names: str):
+        """
+        Reads HTML attributes of a list of elements in a single round trip to the driver
+        :param elements: list of WebElement
+        :param names: name of the attributes to read
+        :return: one dictionary per element, mapping every attribute name to its value (None if missing)
+        """
+        return self.__execute_on_elements__(PageObject.__attributes_script__, elements, list(names))
+
+    def get_texts(self, elements: list):
+        """
+        :return: innerText of every element, fetched in a single round trip
+        """
+        return [record['innerText'] for record in self.get_properties(elements, 'innerText')]
+
+    def get_hrefs(self, elements: list):
+        """
+        :return: resolved href of every element, fetched in a single round trip
+        """
+        return [record['href'] for record in self.get_properties(elements, 'href')]
+
+    def get_visibility(self, elements: list):
+        """
+        :return: whether every element is rendered and visible, fetched in a single round trip
+        """
+        return self.__execute_on_elements__(PageObject.__visibility_script__, elements)
+
+    def get_rects(self, elements: list):
+        """
+        :return: bounding rectangle of every element as a dictionary with x, y, width and height
+        """
+        return self.__execute_on_elements__(PageObject.__rects_script__, elements)
+
+    def __screenshot__(self, full_page: bool):
+        if full_page and hasattr(self.driver, "execute_cdp_cmd"):
+            return base64.b64decode(self.driver.execute_cdp_cmd(
+                "Page.captureScreenshot", {'format': "png", 'captureBeyondViewport': True})['data'])
+        if full_page and hasattr(self.driver, "get_full_page_screenshot_as_png"):
+            return self.driver.get_full_page_screenshot_as_png()
+        return self.driver.get_screenshot_as_png()
+
+    def check_visual(self, name: str, element=None, ignore: list = None, tolerance: float = None,
+                     full_page: bool = False, wait: bool = False):
+        """
+        Compares a screenshot of the page, or of an element, with the baseline stored for name, which is recorded on
+        the first run. The comparison runs in a background process and fails the running test when it finishes
+        :param name: check name, unique in the suite
+        :param element: element to capture instead of the page
+        :param ignore: regions left out of the comparison: elements, or (x, y, width, height) in CSS pixels
+        relative to the captured area
+        :param tolerance: fraction of pixels allowed to differ, visual.tolerance from config.yaml by default
+        :param full_page: capture the whole page instead of the viewport, if the driver supports it
+        :param wait: wait for the result and raise VisualMismatch right away if it does not match
+        :return: Future with the result of the comparison
+        """
+        ignore = ignore or []
+        elements = [region for region in ignore if not isinstance(region, (list, tuple))]
+        if element is not None:
+            elements = [element] + elements
+        geometry = self.driver.execute_script(PageObject.__geometry_script__, PageObject.__unwrap__(elements))
+        ratio, rects = geometry['ratio'], geometry['rects']
+
+        # Regions are made relative to the captured area, and scaled to screenshot pixels
+        if element is not None:
+            origin = (rects[0]['x'], rects[0]['y'])
+            rects = rects[1:]
+            png = element.screenshot_as_png
+        else:
+            origin = (-geometry['scroll_x'], -geometry['scroll_y']) if full_page else (0, 0)
+            png = self.__screenshot__(full_page)
+        regions = [(rect['x'] - origin[0], rect['y'] - origin[1], rect['width'], rect['height']) for rect in rects]
+        regions += [tuple(region) for region in ignore if isinstance(region, (list, tuple))]
+        regions = [tuple(value * ratio for value in region) for region in regions]
+
+        future = VisualChecker.submit(None if wait else LogContext.test_id, name, png, tolerance,
+                                      ignore_regions=regions)
+        if wait:
+            failures = [result for result in [future.result()] if not result['match']]
+            if len(failures) > 0:
+                raise VisualMismatch(VisualChecker.describe(failures))
+        return future
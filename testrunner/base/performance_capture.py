@@ -0,0 +1,174 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import os.path
+import threading
+import time
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from testrunner.util.log_setup import logger
+
+
+class PerformanceBudgetExceeded(AssertionError):
+    pass
+
+
+class PerformanceCapture:
+    """
+    Opt-in page load metrics, configured in the 'performance_capture' section of webdriver_defaults in config.yaml
+    and overridden by the same section of a webdriver YAML file. After every PageObject navigation it reads
+    Navigation Timing, Resource Timing and long tasks from the page and, on Chrome, the network events of the
+    DevTools performance log. Metrics are appended to a JSONL file and checked against the budgets of the page.
+    """
+
+    __metrics_script__ = """
+        var nav = performance.getEntriesByType('navigation')[0];
+        var resources = performance.getEntriesByType('resource');
+        var transfer = 0;
+        resources.forEach(function (resource) { transfer += resource.transferSize || 0; });
+        var longTasks = window.__testrunnerLongTasks__ || [];
+        if (!nav) { return null; }
+        return {
+            ttfb: nav.responseStart - nav.requestStart,
+            dom_content_loaded: nav.domContentLoadedEventEnd - nav.startTime,
+            load: nav.loadEventEnd - nav.startTime,
+            document_transfer_size: nav.transferSize || 0,
+            resources: resources.length,
+            resources_transfer_size: transfer,
+            long_tasks: longTasks.length,
+            long_tasks_duration: longTasks.reduce(function (total, task) { return total + task.duration; }, 0)
+        };"""
+
+    # Long tasks are not kept in the performance timeline, so an observer has to be registered for them. On Chromium
+    # it runs before the scripts of every new document of the tab; anywhere else (other drivers, windows opened later)
+    # it is only registered when metrics are first collected, and misses the long tasks of that first load
+    __long_task_observer_script__ = """
+        if (window.PerformanceObserver && !window.__testrunnerLongTasks__) {
+            window.__testrunnerLongTasks__ = [];
+            try {
+                new PerformanceObserver(function (list) {
+                    list.getEntries().forEach(function (entry) { window.__testrunnerLongTasks__.push(entry); });
+                }).observe({type: 'longtask', buffered: true});
+            } catch (e) {}
+        }"""
+
+    __lock__ = threading.Lock()
+
+    @staticmethod
+    def enabled(capture_config: dict):
+        return capture_config is not None and bool(capture_config.get("enabled", False))
+
+    @staticmethod
+    def configure_chrome(chrome_options, capture_config: dict):
+        """
+        Enables the DevTools performance log, which includes every network event
+        """
+        if not PerformanceCapture.enabled(capture_config):
+            return
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        chrome_options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+    @staticmethod
+    def attach(driver: WebDriver, capture_config: dict):
+        """
+        Stores the capture configuration in the driver, so page objects created with it collect metrics, and on
+        Chromium registers the long task observer for every document the driver loads from now on
+        """
+        if not PerformanceCapture.enabled(capture_config):
+            return driver
+        driver.performance_capture = capture_config
+        if hasattr(driver, "execute_cdp_cmd"):
+            try:
+                driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument",
+                                       {'source': PerformanceCapture.__long_task_observer_script__})
+            except WebDriverException:
+                logger.exception(__class__.__name__ + ": error registering the long task observer")
+        return driver
+
+    @staticmethod
+    def __network_summary__(driver: WebDriver):
+        try:
+            entries = driver.get_log("performance")
+        except (WebDriverException, ValueError):
+            # Only Chrome provides the performance log
+            return None
+
+        requests, failed, encoded_bytes = 0, 0, 0
+        for entry in entries:
+            message = json.loads(entry['message'])['message']
+            if message['method'] == "Network.requestWillBeSent":
+                requests += 1
+            elif message['method'] == "Network.loadingFinished":
+                encoded_bytes += message['params'].get('encodedDataLength', 0)
+            elif message['method'] == "Network.loadingFailed":
+                failed += 1
+        return {'requests': requests, 'failed_requests': failed, 'encoded_bytes': encoded_bytes}
+
+    @staticmethod
+    def __budget_for__(capture_config: dict, page_name: str, url: str):
+        for key, budget in (capture_config.get("budgets") or {}).items():
+            if key == page_name or key in url:
+                return budget
+        return None
+
+    @staticmethod
+    def collect(driver: WebDriver, page_name: str):
+        """
+        Collects the metrics of the last navigation of a driver, if performance capture is enabled for it
+        :param driver: WebDriver which has just loaded a page
+        :param page_name: name of the page object, used to find its budget
+        :return: dictionary with the metrics, or None if capture is disabled
+        """
+        capture_config = getattr(driver, "performance_capture", None)
+        if not PerformanceCapture.enabled(capture_config):
+            return None
+
+        try:
+            # The observer script does nothing if it is already registered in the page
+            timings = driver.execute_script(PerformanceCapture.__long_task_observer_script__ +
+                                            PerformanceCapture.__metrics_script__) or {}
+            url = driver.current_url
+        except WebDriverException:
+            logger.exception(__class__.__name__ + ": error collecting navigation metrics")
+            return None
+
+        metrics = {'timestamp': time.time(), 'page': page_name, 'url': url, 'session_id': driver.session_id}
+        metrics.update(timings)
+        network = PerformanceCapture.__network_summary__(driver)
+        if network is not None:
+            metrics['network'] = network
+
+        budget = PerformanceCapture.__budget_for__(capture_config, page_name, url) or {}
+        violations = ["{} {} > {}".format(name, metrics[name], limit) for name, limit in budget.items()
+                      if name in metrics and metrics[name] is not None and metrics[name] > limit]
+        metrics['budget_violations'] = violations
+
+        PerformanceCapture.__write__(capture_config.get("output_file", os.path.join("log", "performance",
+                                                                                     "navigation.jsonl")), metrics)
+        if len(violations) > 0:
+            message = "Performance budget exceeded for {} ({}): {}".format(page_name, url, ", ".join(violations))
+            if capture_config.get("enforce_budgets", False):
+                raise PerformanceBudgetExceeded(message)
+            logger.warning(message)
+        return metrics
+
+    @staticmethod
+    def __write__(output_file: str, metrics: dict):
+        with PerformanceCapture.__lock__:
+            os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+            with open(output_file, 'at') as fd:
+                fd.write(json.dumps(metrics) + "\n")
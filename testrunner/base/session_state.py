@@ -0,0 +1,311 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import os.path
+import time
+import urllib.parse
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+
+
+class SessionState:
+    """
+    Snapshots of an authenticated browser state: cookies, localStorage and sessionStorage per origin. A login flow
+    runs once per user and environment, its state is saved to disk with an expiry, and later drivers get the state
+    restored instead of going through the login UI again:
+
+        SessionState.authenticate(driver, "admin", lambda driver: POLogin(driver, url).login("admin", password))
+
+    Chromium drivers get the state restored through the DevTools protocol without any navigation; other drivers
+    navigate once per origin to restore_path. Configured in the 'session_state' section of config.yaml.
+    """
+
+    __marker__ = "__testrunner_session_state__"
+
+    # Fields of a Network.getAllCookies cookie accepted back by Network.setCookies
+    __cdp_cookie_fields__ = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+    __capture_script__ = """
+        function dump(storage) {
+            var items = {};
+            for (var i = 0; i < storage.length; i++) { items[storage.key(i)] = storage.getItem(storage.key(i)); }
+            return items;
+        }
+        return {local_storage: dump(window.localStorage), session_storage: dump(window.sessionStorage)};"""
+
+    __restore_script__ = """
+        var state = arguments[0];
+        Object.keys(state.local_storage).forEach(function (key) {
+            localStorage.setItem(key, state.local_storage[key]);
+        });
+        Object.keys(state.session_storage).forEach(function (key) {
+            sessionStorage.setItem(key, state.session_storage[key]);
+        });"""
+
+    # Registered with Page.addScriptToEvaluateOnNewDocument, so storage is in place before the page scripts run.
+    # The marker keeps it from overwriting storage on later navigations of the same tab
+    __seed_script__ = """
+        (function (states, marker) {
+            var state = states[window.location.origin];
+            if (!state) { return; }
+            try {
+                if (window.sessionStorage.getItem(marker)) { return; }
+                Object.keys(state.local_storage).forEach(function (key) {
+                    localStorage.setItem(key, state.local_storage[key]);
+                });
+                Object.keys(state.session_storage).forEach(function (key) {
+                    sessionStorage.setItem(key, state.session_storage[key]);
+                });
+                window.sessionStorage.setItem(marker, "1");
+            } catch (e) { }
+        })(%s, %s);"""
+
+    @staticmethod
+    def settings():
+        return env.get("session_state") or {}
+
+    @staticmethod
+    def origin(url: str):
+        parsed = urllib.parse.urlsplit(url)
+        return "{}://{}".format(parsed.scheme, parsed.netloc)
+
+    @staticmethod
+    def __uses_cdp__(driver: WebDriver):
+        return hasattr(driver, "execute_cdp_cmd")
+
+    @staticmethod
+    def __cdp_cookies__(cookies: list):
+        restored = []
+        for cookie in cookies:
+            cookie = {key: value for key, value in cookie.items() if key in SessionState.__cdp_cookie_fields__}
+            # Session cookies are reported with expires -1
+            if cookie.get('expires', -1) <= 0:
+                cookie.pop('expires', None)
+            restored.append(cookie)
+        return restored
+
+    @staticmethod
+    def __webdriver_cookies__(state: dict, origin: str):
+        # Cookies captured through DevTools, converted to the WebDriver format for the origin they apply to
+        entry = state['origins'][origin]
+        if state.get('cookies') is None:
+            return entry.get('cookies') or []
+        host = urllib.parse.urlsplit(origin).hostname
+        cookies = []
+        for cookie in state['cookies']:
+            domain = cookie.get('domain', "").lstrip(".")
+            if host != domain and not host.endswith("." + domain):
+                continue
+            converted = {key: cookie[key] for key in ("name", "value", "path", "secure", "httpOnly") if key in cookie}
+            if cookie.get('expires', -1) > 0:
+                converted['expiry'] = int(cookie['expires'])
+            cookies.append(converted)
+        return cookies
+
+    @staticmethod
+    def capture(driver: WebDriver, origins: list = None):
+        """
+        Captures the state of the browser
+        :param driver: WebDriver instance, usually right after a login flow
+        :param origins: origins (scheme://host[:port]) whose storage is captured; by default the current one. Other
+        origins are visited once each
+        :return: state dictionary, as accepted by restore() and save()
+        """
+        current = SessionState.origin(driver.current_url)
+        origins = list(origins or [current])
+        state = {'origins': {}, 'cookies': None}
+        if SessionState.__uses_cdp__(driver):
+            # Every cookie of every domain, including HttpOnly ones, in a single command
+            state['cookies'] = driver.execute_cdp_cmd("Network.getAllCookies", {})['cookies']
+
+        for origin in sorted(origins, key=lambda candidate: candidate != current):
+            if origin != SessionState.origin(driver.current_url):
+                driver.get(origin + SessionState.settings().get("restore_path", "/"))
+            entry = driver.execute_script(SessionState.__capture_script__)
+            entry['session_storage'].pop(SessionState.__marker__, None)
+            if state['cookies'] is None:
+                entry['cookies'] = driver.get_cookies()
+            state['origins'][origin] = entry
+        return state
+
+    @staticmethod
+    def restore(driver: WebDriver, state: dict):
+        """
+        Restores a captured state into a driver, before it navigates to the application
+        :param driver: WebDriver instance
+        :param state: state returned by capture() or load()
+        """
+        # Remembered so clear() can wipe them before the driver is reused by another test
+        restored = driver.__dict__.setdefault('_session_state_origins_', [])
+        restored.extend(origin for origin in state['origins'] if origin not in restored)
+        if SessionState.__uses_cdp__(driver) and state.get('cookies') is not None:
+            driver.execute_cdp_cmd("Network.setCookies", {'cookies': SessionState.__cdp_cookies__(state['cookies'])})
+            storage = {origin: {'local_storage': entry['local_storage'], 'session_storage': entry['session_storage']}
+                       for origin, entry in state['origins'].items()}
+            script = SessionState.__seed_script__ % (json.dumps(storage), json.dumps(SessionState.__marker__))
+            identifier = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {'source': script})
+            driver.__dict__.setdefault('_session_state_scripts_', []).append(identifier['identifier'])
+            return
+
+        restore_path = SessionState.settings().get("restore_path", "/")
+        for origin, entry in state['origins'].items():
+            driver.get(origin + restore_path)
+            for cookie in SessionState.__webdriver_cookies__(state, origin):
+                cookie = dict(cookie)
+                if 'expiry' in cookie:
+                    cookie['expiry'] = int(cookie['expiry'])
+                try:
+                    driver.add_cookie(cookie)
+                except WebDriverException:
+                    logger.warning(__class__.__name__ + ": cookie '{}' could not be restored in {}".format(
+                        cookie.get('name'), origin))
+            driver.execute_script(SessionState.__restore_script__, {'local_storage': entry['local_storage'],
+                                                                    'session_storage': entry['session_storage']})
+
+    @staticmethod
+    def clear(driver: WebDriver):
+        """
+        Removes restored states from a driver, so the next test using it does not inherit them: stops seeding
+        storage into new documents and, on Chromium drivers, deletes every cookie and the storage of every restored
+        origin. Other drivers only get the current origin cleared, by the caller. Called when a pooled driver is reset
+        """
+        for identifier in driver.__dict__.pop('_session_state_scripts_', []):
+            try:
+                driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {'identifier': identifier})
+            except WebDriverException:
+                logger.warning(__class__.__name__ + ": error removing session state script")
+        origins = driver.__dict__.pop('_session_state_origins_', [])
+        if not SessionState.__uses_cdp__(driver) or len(origins) == 0:
+            return
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        for origin in origins:
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {'origin': origin, 'storageTypes': "all"})
+
+    @staticmethod
+    def __path__(user: str, environment: str = None):
+        state_dir = SessionState.settings().get("state_dir", os.path.join(".cache", "session_state"))
+        safe_user = "".join(char if char.isalnum() or char in "-_." else "_" for char in user)
+        return os.path.join(state_dir, environment or env.get("environment"), safe_user + ".json")
+
+    @staticmethod
+    def save(user: str, state: dict, environment: str = None, ttl: float = None):
+        """
+        Persists a state for a user. It expires after ttl seconds, or earlier if a captured cookie does
+        :param user: user the state belongs to
+        :param state: state returned by capture()
+        :param environment: environment the state belongs to, the current one by default
+        :param ttl: seconds the state is valid, session_state.ttl by default
+        """
+        now = time.time()
+        expires = now + float(ttl if ttl is not None else SessionState.settings().get("ttl", 3600))
+        cookies = list(state.get('cookies') or []) + [cookie for entry in state['origins'].values()
+                                                      for cookie in entry.get('cookies') or []]
+        cookie_expiries = [cookie.get('expires', cookie.get('expiry')) for cookie in cookies]
+        expires = min([expires] + [expiry for expiry in cookie_expiries if expiry is not None and expiry > now])
+
+        path = SessionState.__path__(user, environment)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Cookies are credentials: only the current user may read the file
+        with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wt') as fd:
+            json.dump({'user': user, 'created': now, 'expires': expires, 'state': state}, fd)
+
+    @staticmethod
+    def load(user: str, environment: str = None):
+        """
+        :return: the saved state of a user, or None if there is none or it expired
+        """
+        path = SessionState.__path__(user, environment)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'rt') as fd:
+                saved = json.load(fd)
+        except Exception:
+            logger.exception(__class__.__name__ + ": ignoring unreadable state '{}'".format(path))
+            return None
+        if saved.get('expires', 0) <= time.time():
+            return None
+        return saved['state']
+
+    @staticmethod
+    def invalidate(user: str, environment: str = None):
+        """
+        Deletes the saved state of a user, e.g. when the application rejected it
+        """
+        path = SessionState.__path__(user, environment)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    @staticmethod
+    def __acquire_lock__(path: str):
+        # Parallel workers must not all run the login flow for the same user at once
+        timeout = float(SessionState.settings().get("lock_timeout", 120))
+        deadline = time.time() + timeout
+        while True:
+            try:
+                os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+                return
+            except FileExistsError:
+                try:
+                    if os.path.getmtime(path) < time.time() - timeout:
+                        # Left behind by a worker which died during login
+                        os.remove(path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    raise Exception("Timeout waiting for the login of another worker, lock '{}'".format(path))
+                time.sleep(0.2)
+
+    @staticmethod
+    def authenticate(driver: WebDriver, user: str, login, origins: list = None, environment: str = None,
+                     ttl: float = None):
+        """
+        Restores the saved state of a user into a driver, running the login flow and saving its state first if
+        there is no valid one
+        :param driver: WebDriver instance, before it navigates to the application
+        :param user: user to authenticate as
+        :param login: callable receiving the driver which performs the login flow through page objects
+        :param origins: origins to capture, as in capture()
+        :param environment: environment the state belongs to, the current one by default
+        :param ttl: seconds the state is valid, as in save()
+        :return: True if a saved state was restored, False if the login flow had to run
+        """
+        state = SessionState.load(user, environment)
+        if state is not None:
+            SessionState.restore(driver, state)
+            return True
+
+        lock_path = SessionState.__path__(user, environment) + ".lock"
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        SessionState.__acquire_lock__(lock_path)
+        try:
+            # Another worker may have logged in while this one waited for the lock
+            state = SessionState.load(user, environment)
+            if state is not None:
+                SessionState.restore(driver, state)
+                return True
+            login(driver)
+            SessionState.save(user, SessionState.capture(driver, origins), environment, ttl)
+            return False
+        except Exception as e:
+            logger.exception(__class__.__name__ + ": error authenticating '{}'".format(user))
+            raise e
+        finally:
+            os.remove(lock_path)
@@ -0,0 +1,219 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import time
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, \
+    TimeoutException, WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from config.configuration import env
+
+
+class Condition:
+    """
+    Composable wait condition. A condition is a callable which receives the driver and returns a truthy value when
+    it holds. Conditions which can also be expressed as a JavaScript expression carry it in 'script', which allows
+    Wait to evaluate them inside the browser with a MutationObserver instead of polling.
+    Conditions are combined with &, | and ~.
+    """
+
+    def __init__(self, check, description: str = "", script: str = None):
+        self.check = check
+        self.description = description
+        self.script = script
+
+    def __call__(self, driver: WebDriver):
+        return self.check(driver)
+
+    def __and__(self, other):
+        script = "(({}) && ({}))".format(self.script, other.script) \
+            if self.script is not None and other.script is not None else None
+        return Condition(lambda driver: self(driver) and other(driver),
+                         "({} and {})".format(self.description, other.description), script)
+
+    def __or__(self, other):
+        script = "(({}) || ({}))".format(self.script, other.script) \
+            if self.script is not None and other.script is not None else None
+        return Condition(lambda driver: self(driver) or other(driver),
+                         "({} or {})".format(self.description, other.description), script)
+
+    def __invert__(self):
+        script = "!({})".format(self.script) if self.script is not None else None
+        return Condition(lambda driver: not self(driver), "not {}".format(self.description), script)
+
+    @staticmethod
+    def __lookup_script__(by: str, value: str):
+        # Imported here to avoid a circular import, as Locator uses Wait to honour its timeout
+        from testrunner.base.locator import Locator
+        return Locator.lookup_script(by, value)
+
+    @staticmethod
+    def __find_now__(driver, by: str, value: str):
+        # find_elements waits the implicit timeout when nothing matches, so it is disabled for the lookup
+        previous = driver.timeouts.implicit_wait
+        if previous == 0:
+            return driver.find_elements(by, value)
+        driver.implicitly_wait(0)
+        try:
+            return driver.find_elements(by, value)
+        finally:
+            driver.implicitly_wait(previous)
+
+    @staticmethod
+    def present(by: str, value: str):
+        """
+        Holds when at least one element matches the locator; the check returns the list of matching elements. The
+        lookup runs with the implicit timeout disabled, as Wait does the polling
+        """
+        lookup = Condition.__lookup_script__(by, value)
+        return Condition(lambda driver: Condition.__find_now__(driver, by, value),
+                         "present({}, {})".format(by, value),
+                         "{}.length > 0".format(lookup) if lookup is not None else None)
+
+    @staticmethod
+    def absent(by: str, value: str):
+        """
+        Holds when no element matches the locator. It never waits for the implicit timeout: it is evaluated with a
+        script when possible, and otherwise with the implicit timeout disabled during the lookup
+        """
+        lookup = Condition.__lookup_script__(by, value)
+        if lookup is None:
+            return Condition(lambda driver: len(Condition.__find_now__(driver, by, value)) == 0,
+                             "absent({}, {})".format(by, value))
+        return Condition(lambda driver: driver.execute_script("return {}.length === 0;".format(lookup)),
+                         "absent({}, {})".format(by, value), "{}.length === 0".format(lookup))
+
+    @staticmethod
+    def visible(by: str, value: str):
+        """
+        Holds when an element matching the locator is displayed; the check returns that element
+        """
+        def check(driver):
+            for element in Condition.__find_now__(driver, by, value):
+                if element.is_displayed():
+                    return element
+            return None
+        return Condition(check, "visible({}, {})".format(by, value))
+
+    @staticmethod
+    def title_contains(text: str):
+        return Condition(lambda driver: text in driver.title, "title_contains({})".format(text),
+                         "document.title.indexOf({}) >= 0".format(json.dumps(text)))
+
+    @staticmethod
+    def url_contains(text: str):
+        return Condition(lambda driver: text in driver.current_url, "url_contains({})".format(text))
+
+    @staticmethod
+    def script(expression: str):
+        """
+        Holds when a JavaScript expression evaluates to a truthy value in the page
+        """
+        return Condition(lambda driver: driver.execute_script("return !!({});".format(expression)),
+                         "script({})".format(expression), expression)
+
+
+class Wait:
+    """
+    Explicit wait with exponential backoff polling. Conditions with a JavaScript expression are evaluated inside
+    the browser by a MutationObserver, which returns as soon as the DOM changes to satisfy them.
+    Default values are read from the 'waits' section of config.yaml.
+    """
+
+    __observer_script__ = """
+        var timeout = arguments[0], done = arguments[arguments.length - 1];
+        var check = function () { try { return !!(%s); } catch (e) { return false; } };
+        if (check()) { done(true); return; }
+        var timer = null;
+        var observer = new MutationObserver(function () {
+            if (check()) { observer.disconnect(); clearTimeout(timer); done(true); }
+        });
+        observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+        timer = setTimeout(function () { observer.disconnect(); done(check()); }, timeout);"""
+
+    __ignored_exceptions__ = (NoSuchElementException, StaleElementReferenceException)
+
+    def __init__(self, driver: WebDriver, timeout: float = None, poll_initial: float = None, poll_max: float = None,
+                 backoff: float = None, mutation_observer: bool = None):
+        settings = Wait.settings()
+        self.driver = driver
+        self.timeout = float(timeout if timeout is not None else settings.get("default_timeout", 10))
+        self.poll_initial = float(poll_initial if poll_initial is not None else settings.get("poll_initial", 0.05))
+        self.poll_max = float(poll_max if poll_max is not None else settings.get("poll_max", 0.5))
+        self.backoff = float(backoff if backoff is not None else settings.get("backoff", 2))
+        self.mutation_observer = mutation_observer if mutation_observer is not None \
+            else bool(settings.get("mutation_observer", True))
+
+    @staticmethod
+    def settings():
+        return env.get("waits") or {}
+
+    @staticmethod
+    def implicit_waits_enabled():
+        return bool(Wait.settings().get("implicit", True))
+
+    def until(self, condition, message: str = ""):
+        """
+        Waits until the condition holds
+        :param condition: Condition, or any callable receiving the driver
+        :param message: message of the TimeoutException raised if the condition does not hold in time
+        :return: the value returned by the condition
+        """
+        deadline = time.monotonic() + self.timeout
+        script = getattr(condition, "script", None)
+        if self.mutation_observer and script is not None and self.__observe__(script, self.timeout):
+            # The observer only reports that the condition holds; evaluate it once more to return its value
+            result = self.__check__(condition)
+            if result:
+                return result
+
+        poll = self.poll_initial
+        while True:
+            result = self.__check__(condition)
+            if result:
+                return result
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutException(message or "Condition {} not met after {}s".format(
+                    getattr(condition, "description", condition), self.timeout))
+            time.sleep(min(poll, remaining))
+            poll = min(poll * self.backoff, self.poll_max)
+
+    def until_not(self, condition, message: str = ""):
+        """
+        Waits until the condition does not hold
+        """
+        if not isinstance(condition, Condition):
+            condition = Condition(condition, str(condition))
+        return self.until(~condition, message)
+
+    def __check__(self, condition):
+        try:
+            return condition(self.driver)
+        except Wait.__ignored_exceptions__:
+            return None
+
+    def __observe__(self, script: str, timeout: float):
+        try:
+            # The script timeout is a session setting: restore it, so later scripts of the test are not affected
+            previous = self.driver.timeouts.script
+            self.driver.set_script_timeout(timeout + 1)
+            try:
+                return self.driver.execute_async_script(Wait.__observer_script__ % script, int(timeout * 1000))
+            finally:
+                self.driver.set_script_timeout(previous)
+        except WebDriverException:
+            # A navigation destroys the observer; fall back to polling
+            return False
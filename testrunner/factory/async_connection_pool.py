@@ -0,0 +1,129 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import urllib.parse
+
+import h11
+import trio
+
+from config.configuration import env
+
+
+class AsyncConnectionPool:
+    """
+    HTTP/1.1 keep-alive connection pool for trio, used to talk to WebDriver endpoints without a thread per session.
+    Connections are kept per host and port, and at most max_connections_per_host requests are in flight to each.
+    Every trio run gets its own pool through shared(), as trio streams can not be used across runs.
+    """
+
+    __shared__ = trio.lowlevel.RunVar("testrunner_async_connection_pool")
+
+    def __init__(self, max_connections_per_host: int = None, timeout: float = None):
+        async_config = env.get("async_webdriver") or {}
+        self.max_connections_per_host = int(max_connections_per_host if max_connections_per_host is not None
+                                            else async_config.get("max_connections_per_host", 32))
+        # A hung driver must not block the event loop forever, same limit as the blocking client
+        self.timeout = float(timeout if timeout is not None
+                             else (env.get("driver_health") or {}).get("command_timeout", 120))
+        self.__idle = {}
+        self.__limiters = {}
+
+    @staticmethod
+    def shared():
+        """
+        :return: the pool shared by every async driver of the current trio run
+        """
+        try:
+            return AsyncConnectionPool.__shared__.get()
+        except LookupError:
+            pool = AsyncConnectionPool()
+            AsyncConnectionPool.__shared__.set(pool)
+            return pool
+
+    async def __checkout__(self, key: tuple):
+        idle = self.__idle.setdefault(key, [])
+        if len(idle) > 0:
+            stream, connection = idle.pop()
+            return stream, connection, True
+        stream = await trio.open_tcp_stream(*key)
+        return stream, h11.Connection(our_role=h11.CLIENT), False
+
+    async def __checkin__(self, key: tuple, stream, connection):
+        if connection.our_state is h11.DONE and connection.their_state is h11.DONE:
+            connection.start_next_cycle()
+            self.__idle.setdefault(key, []).append((stream, connection))
+        else:
+            await trio.aclose_forcefully(stream)
+
+    @staticmethod
+    async def __exchange__(stream, connection, method: str, key: tuple, target: str, body: bytes):
+        headers = [("Host", "{}:{}".format(*key)), ("Accept", "application/json"),
+                   ("Content-Type", "application/json;charset=UTF-8"), ("Content-Length", str(len(body))),
+                   ("Connection", "keep-alive")]
+        data = connection.send(h11.Request(method=method, target=target, headers=headers))
+        if len(body) > 0:
+            data += connection.send(h11.Data(data=body))
+        data += connection.send(h11.EndOfMessage())
+        await stream.send_all(data)
+
+        status, chunks = None, []
+        while True:
+            event = connection.next_event()
+            if event is h11.NEED_DATA:
+                connection.receive_data(await stream.receive_some(65536))
+            elif isinstance(event, h11.Response):
+                status = event.status_code
+            elif isinstance(event, h11.Data):
+                chunks.append(bytes(event.data))
+            elif isinstance(event, (h11.EndOfMessage, h11.ConnectionClosed)):
+                return status, b"".join(chunks)
+
+    async def request(self, method: str, url: str, payload=None):
+        """
+        Sends a JSON request
+        :param method: HTTP method
+        :param url: absolute http:// URL
+        :param payload: object to send as JSON body, or None
+        :return: tuple with the status code and the decoded JSON response (None if the body was empty)
+        """
+        parsed = urllib.parse.urlsplit(url)
+        key = (parsed.hostname, parsed.port or 80)
+        target = (parsed.path or "/") + ("?" + parsed.query if parsed.query else "")
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+
+        limiter = self.__limiters.setdefault(key, trio.CapacityLimiter(self.max_connections_per_host))
+        async with limiter:
+            with trio.fail_after(self.timeout):
+                while True:
+                    stream, connection, reused = await self.__checkout__(key)
+                    try:
+                        status, data = await AsyncConnectionPool.__exchange__(stream, connection, method, key,
+                                                                              target, body)
+                        break
+                    except (trio.BrokenResourceError, trio.ClosedResourceError, h11.RemoteProtocolError):
+                        await trio.aclose_forcefully(stream)
+                        # The server may have closed an idle keep-alive connection; retry only on a new one
+                        if not reused:
+                            raise
+                    except BaseException:
+                        await trio.aclose_forcefully(stream)
+                        raise
+                await self.__checkin__(key, stream, connection)
+        return status, json.loads(data.decode("utf-8")) if len(data) > 0 else None
+
+    async def aclose(self):
+        for connections in self.__idle.values():
+            for stream, _ in connections:
+                await trio.aclose_forcefully(stream)
+        self.__idle.clear()
@@ -0,0 +1,314 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+
+import trio
+from selenium.common.exceptions import ElementClickInterceptedException, ElementNotInteractableException, \
+    InvalidSelectorException, JavascriptException, NoSuchElementException, NoSuchWindowException, \
+    StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+
+from testrunner.util.log_setup import logger
+from testrunner.factory.async_connection_pool import AsyncConnectionPool
+from testrunner.util.instrumentation import PerformanceRecorder
+from testrunner.util.process_supervisor import ProcessSupervisor
+
+
+class AsyncWebElement:
+    """
+    Element of an AsyncWebDriver session. Methods mirror selenium's WebElement, as coroutines; the names in
+    'properties' are coroutines here but plain properties in WebElement.
+    """
+
+    properties = ("text", "tag_name", "rect", "id", "screenshot_as_base64")
+
+    __attribute_script__ = """
+        var element = arguments[0], name = arguments[1], value = element[name];
+        if (value === undefined || value === null || typeof value === 'object' || typeof value === 'function') {
+            return element.getAttribute(name);
+        }
+        return typeof value === 'boolean' ? (value ? 'true' : null) : String(value);"""
+
+    def __init__(self, parent, element_id: str):
+        self.parent = parent
+        self.element_id = element_id
+
+    def __eq__(self, other):
+        return isinstance(other, AsyncWebElement) and other.element_id == self.element_id
+
+    def __hash__(self):
+        return hash(self.element_id)
+
+    async def __execute__(self, command: str, method: str, path: str = "", payload: dict = None):
+        return await self.parent.execute(command, method, "/element/" + self.element_id + path, payload)
+
+    async def id(self):
+        return self.element_id
+
+    async def click(self):
+        await self.__execute__("clickElement", "POST", "/click", {})
+
+    async def clear(self):
+        await self.__execute__("clearElement", "POST", "/clear", {})
+
+    async def send_keys(self, *values):
+        text = "".join(str(value) for value in values)
+        await self.__execute__("sendKeysToElement", "POST", "/value", {'text': text, 'value': list(text)})
+
+    async def text(self):
+        return await self.__execute__("getElementText", "GET", "/text")
+
+    async def tag_name(self):
+        return await self.__execute__("getElementTagName", "GET", "/name")
+
+    async def rect(self):
+        return await self.__execute__("getElementRect", "GET", "/rect")
+
+    async def get_dom_attribute(self, name: str):
+        return await self.__execute__("getElementAttribute", "GET", "/attribute/" + name)
+
+    async def get_property(self, name: str):
+        return await self.__execute__("getElementProperty", "GET", "/property/" + name)
+
+    async def get_attribute(self, name: str):
+        """
+        Property of the element if it has a primitive value, otherwise the HTML attribute, like selenium does
+        """
+        return await self.parent.execute_script(AsyncWebElement.__attribute_script__, self, name)
+
+    async def is_displayed(self):
+        return await self.__execute__("isElementDisplayed", "GET", "/displayed")
+
+    async def is_enabled(self):
+        return await self.__execute__("isElementEnabled", "GET", "/enabled")
+
+    async def is_selected(self):
+        return await self.__execute__("isElementSelected", "GET", "/selected")
+
+    async def find_element(self, by: str = By.ID, value: str = None):
+        by, value = AsyncWebDriver.w3c_locator(by, value)
+        return await self.__execute__("findChildElement", "POST", "/element", {'using': by, 'value': value})
+
+    async def find_elements(self, by: str = By.ID, value: str = None):
+        by, value = AsyncWebDriver.w3c_locator(by, value)
+        return await self.__execute__("findChildElements", "POST", "/elements", {'using': by, 'value': value})
+
+    async def screenshot_as_base64(self):
+        return await self.__execute__("elementScreenshot", "GET", "/screenshot")
+
+
+class AsyncWebDriver:
+    """
+    WebDriver client for trio. Commands of every session go through the AsyncConnectionPool of the running trio
+    loop, so a single thread can drive dozens of sessions concurrently. Methods mirror selenium's WebDriver, as
+    coroutines; the names in 'properties' are coroutines here but plain properties in WebDriver.
+    Created by AsyncWebDriverFactory.
+    """
+
+    properties = ("title", "current_url", "page_source", "window_handles", "current_window_handle", "session_id")
+
+    __element_key__ = "element-6066-11e4-a52e-4f735466cecf"
+
+    __errors__ = {
+        "no such element": NoSuchElementException,
+        "stale element reference": StaleElementReferenceException,
+        "timeout": TimeoutException,
+        "script timeout": TimeoutException,
+        "no such window": NoSuchWindowException,
+        "javascript error": JavascriptException,
+        "element not interactable": ElementNotInteractableException,
+        "element click intercepted": ElementClickInterceptedException,
+        "invalid selector": InvalidSelectorException,
+    }
+
+    def __init__(self, url: str, session_id: str, capabilities: dict, service=None):
+        self.url = url.rstrip("/")
+        self.capabilities = capabilities
+        self.service = service
+        self.__session_id = session_id
+
+    @staticmethod
+    async def start(url: str, capabilities: dict, service=None):
+        """
+        Creates a new session on a WebDriver endpoint
+        :param url: endpoint URL, e.g. the service_url of a started driver service or a Selenium Grid
+        :param capabilities: W3C capabilities, as returned by the to_capabilities() method of selenium options
+        :param service: driver service to stop when the session quits, if any
+        :return: AsyncWebDriver instance
+        """
+        status, response = await AsyncConnectionPool.shared().request(
+            "POST", url.rstrip("/") + "/session", {'capabilities': {'firstMatch': [{}], 'alwaysMatch': capabilities}})
+        value = (response or {}).get('value') or {}
+        if status >= 400 or 'sessionId' not in value:
+            raise WebDriverException("Error creating session: {}".format(value.get('message', response)))
+        return AsyncWebDriver(url, value['sessionId'], value.get('capabilities', {}), service)
+
+    @staticmethod
+    def w3c_locator(by: str, value: str):
+        """
+        Translates the locator strategies which are not part of the W3C protocol to CSS selectors, like selenium does
+        """
+        if by == By.ID:
+            return By.CSS_SELECTOR, '[id="{}"]'.format(value)
+        if by == By.NAME:
+            return By.CSS_SELECTOR, '[name="{}"]'.format(value)
+        if by == By.CLASS_NAME:
+            return By.CSS_SELECTOR, ".{}".format(value)
+        return by, value
+
+    def __wrap__(self, value):
+        if isinstance(value, list):
+            return [self.__wrap__(item) for item in value]
+        if isinstance(value, dict):
+            if AsyncWebDriver.__element_key__ in value:
+                return AsyncWebElement(self, value[AsyncWebDriver.__element_key__])
+            return {key: self.__wrap__(item) for key, item in value.items()}
+        return value
+
+    @staticmethod
+    def __unwrap__(value):
+        if isinstance(value, AsyncWebElement):
+            return {AsyncWebDriver.__element_key__: value.element_id}
+        if isinstance(value, (list, tuple)):
+            return [AsyncWebDriver.__unwrap__(item) for item in value]
+        if isinstance(value, dict):
+            return {key: AsyncWebDriver.__unwrap__(item) for key, item in value.items()}
+        return value
+
+    async def execute(self, command: str, method: str, path: str, payload: dict = None):
+        """
+        Sends a command of this session
+        :param command: command name, as in selenium.webdriver.remote.command.Command, used for instrumentation
+        :param method: HTTP method
+        :param path: path relative to the session URL, e.g. '/url'
+        :param payload: JSON payload for POST commands
+        :return: value of the response, with elements wrapped as AsyncWebElement
+        """
+        start = time.perf_counter()
+        try:
+            status, response = await AsyncConnectionPool.shared().request(
+                method, "{}/session/{}{}".format(self.url, self.__session_id, path), payload)
+        finally:
+            PerformanceRecorder.record_command(command, time.perf_counter() - start)
+
+        value = (response or {}).get('value')
+        if status >= 400:
+            error = value.get('error', "") if isinstance(value, dict) else ""
+            message = value.get('message', "") if isinstance(value, dict) else str(response)
+            raise AsyncWebDriver.__errors__.get(error, WebDriverException)(message)
+        return self.__wrap__(value)
+
+    async def session_id(self):
+        return self.__session_id
+
+    async def get(self, url: str):
+        await self.execute("get", "POST", "/url", {'url': url})
+
+    async def title(self):
+        return await self.execute("getTitle", "GET", "/title")
+
+    async def current_url(self):
+        return await self.execute("getCurrentUrl", "GET", "/url")
+
+    async def page_source(self):
+        return await self.execute("getPageSource", "GET", "/source")
+
+    async def refresh(self):
+        await self.execute("refresh", "POST", "/refresh", {})
+
+    async def back(self):
+        await self.execute("goBack", "POST", "/back", {})
+
+    async def forward(self):
+        await self.execute("goForward", "POST", "/forward", {})
+
+    async def execute_script(self, script: str, *args):
+        return await self.execute("w3cExecuteScript", "POST", "/execute/sync",
+                                  {'script': script, 'args': AsyncWebDriver.__unwrap__(list(args))})
+
+    async def execute_async_script(self, script: str, *args):
+        return await self.execute("w3cExecuteScriptAsync", "POST", "/execute/async",
+                                  {'script': script, 'args': AsyncWebDriver.__unwrap__(list(args))})
+
+    async def find_element(self, by: str = By.ID, value: str = None):
+        by, value = AsyncWebDriver.w3c_locator(by, value)
+        return await self.execute("findElement", "POST", "/element", {'using': by, 'value': value})
+
+    async def find_elements(self, by: str = By.ID, value: str = None):
+        by, value = AsyncWebDriver.w3c_locator(by, value)
+        return await self.execute("findElements", "POST", "/elements", {'using': by, 'value': value})
+
+    async def window_handles(self):
+        return await self.execute("w3cGetWindowHandles", "GET", "/window/handles")
+
+    async def current_window_handle(self):
+        return await self.execute("w3cGetCurrentWindowHandle", "GET", "/window")
+
+    async def switch_to_window(self, handle: str):
+        await self.execute("switchToWindow", "POST", "/window", {'handle': handle})
+
+    async def get_cookies(self):
+        return await self.execute("getCookies", "GET", "/cookie")
+
+    async def add_cookie(self, cookie: dict):
+        await self.execute("addCookie", "POST", "/cookie", {'cookie': cookie})
+
+    async def delete_all_cookies(self):
+        await self.execute("deleteAllCookies", "DELETE", "/cookie")
+
+    async def get_screenshot_as_base64(self):
+        return await self.execute("screenshot", "GET", "/screenshot")
+
+    async def set_window_rect(self, x: int = None, y: int = None, width: int = None, height: int = None):
+        rect = {key: value for key, value in (('x', x), ('y', y), ('width', width), ('height', height))
+                if value is not None}
+        return await self.execute("setWindowRect", "POST", "/window/rect", rect)
+
+    async def set_window_size(self, width: int, height: int):
+        await self.set_window_rect(width=width, height=height)
+
+    async def maximize_window(self):
+        await self.execute("w3cMaximizeWindow", "POST", "/window/maximize", {})
+
+    async def set_timeouts(self, implicit: float = None, page_load: float = None, script: float = None):
+        """
+        Sets session timeouts, in seconds
+        """
+        timeouts = {key: int(value * 1000) for key, value in (('implicit', implicit), ('pageLoad', page_load),
+                                                              ('script', script)) if value is not None}
+        await self.execute("setTimeouts", "POST", "/timeouts", timeouts)
+
+    async def get_timeouts(self):
+        """
+        :return: dictionary with the implicit, page_load and script session timeouts, in seconds
+        """
+        timeouts = await self.execute("getTimeouts", "GET", "/timeouts")
+        return {'implicit': timeouts['implicit'] / 1000, 'page_load': timeouts['pageLoad'] / 1000,
+                'script': timeouts['script'] / 1000 if timeouts.get('script') is not None else None}
+
+    async def implicitly_wait(self, seconds: float):
+        await self.set_timeouts(implicit=seconds)
+
+    async def quit(self):
+        """
+        Deletes the session and stops the driver service started for it, if any
+        """
+        try:
+            await self.execute("quit", "DELETE", "")
+        except Exception:
+            logger.exception(__class__.__name__ + ": error deleting session {}".format(self.__session_id))
+        finally:
+            if self.service is not None:
+                await trio.to_thread.run_sync(self.service.stop)
+                await trio.to_thread.run_sync(ProcessSupervisor.unregister, self)
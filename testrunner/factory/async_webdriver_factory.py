@@ -0,0 +1,125 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+
+import trio
+
+from testrunner.util.log_setup import logger
+from testrunner.base.wait import Wait
+from testrunner.factory.async_webdriver import AsyncWebDriver
+from testrunner.factory.webdriver_factory import WebDriverFactory
+from testrunner.factory.webdrivers.remotedriver_factory import RemoteDriverFactory
+from testrunner.util.process_supervisor import ProcessSupervisor
+
+
+class AsyncWebDriverFactory:
+    """
+    Counterpart of WebDriverFactory for AsyncWebDriver. Configurations are the same YAML files, and options are built
+    by the same {driver.type}Factory classes; only the session is created and driven through trio.
+    """
+
+    # Module with the Service class which launches the driver binary of every local driver type
+    __services__ = {
+        "ChromeDriver": "selenium.webdriver.chrome.service",
+        "FirefoxDriver": "selenium.webdriver.firefox.service",
+    }
+
+    @staticmethod
+    def __capabilities__(configuration):
+        # FirefoxDriverFactory returns options, profile and additional capabilities; the rest only options
+        if not isinstance(configuration, tuple):
+            return configuration, configuration.to_capabilities()
+        options, profile, extra_capabilities = configuration
+        if profile is not None:
+            options.profile = profile
+        capabilities = dict(extra_capabilities or {})
+        capabilities.update(options.to_capabilities())
+        return options, capabilities
+
+    @staticmethod
+    def __prepare__(driver_config: dict):
+        """
+        Blocking part of the launch, run in a worker thread: builds options, resolves driver binaries and starts the
+        driver service
+        :return: tuple with the endpoint URL, the started service (None for remote endpoints) and the capabilities
+        """
+        driver_type = driver_config['driver']['type']
+        options, capabilities = AsyncWebDriverFactory.__capabilities__(
+            WebDriverFactory.create_factory(driver_config)._create_webdriver_options_())
+
+        if driver_type == "RemoteDriver":
+            endpoints = list(driver_config['driver'].get('endpoints') or [])
+            if len(endpoints) == 0:
+                raise Exception(__class__.__name__ + ": no endpoints configured in driver.endpoints")
+            endpoint = max(endpoints, key=RemoteDriverFactory.free_slots)
+            return endpoint['url'], None, capabilities
+
+        if driver_type not in AsyncWebDriverFactory.__services__:
+            raise Exception(__class__.__name__ + ": driver type '{}' is not supported".format(driver_type))
+        service_class = importlib.import_module(AsyncWebDriverFactory.__services__[driver_type]).Service
+        service = service_class(options.driver_executable_path)
+        ProcessSupervisor.admit()
+        try:
+            service.start()
+        except Exception:
+            ProcessSupervisor.withdraw()
+            raise
+        return service.service_url, service, capabilities
+
+    @staticmethod
+    async def __apply_extended_options__(driver: AsyncWebDriver, options: dict):
+        if "window_position" in options and type(options["window_position"]) is list and len(options["window_position"]) == 2:
+            await driver.set_window_rect(x=options["window_position"][0], y=options["window_position"][1])
+        if "window_size" in options and type(options["window_size"]) is list and len(options["window_size"]) == 2:
+            await driver.set_window_size(options["window_size"][0], options["window_size"][1])
+        if "start_maximized" in options and options['start_maximized']:
+            await driver.maximize_window()
+        if "implicit_timeout" in options and Wait.implicit_waits_enabled():
+            await driver.set_timeouts(implicit=int(options["implicit_timeout"]))
+        if "page_load_timeout" in options:
+            await driver.set_timeouts(page_load=int(options["page_load_timeout"]))
+
+    @staticmethod
+    async def create_instance(browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
+        """
+        Creates an AsyncWebDriver instance. Parameters are the same as WebDriverFactory.create_instance
+        :return: AsyncWebDriver instance
+        """
+        driver_config = await trio.to_thread.run_sync(WebDriverFactory.resolve_configuration, browser_name,
+                                                      config_file_path, exact_match)
+        return await AsyncWebDriverFactory.create_instance_from_configuration(driver_config)
+
+    @staticmethod
+    async def create_instance_from_configuration(driver_config: dict):
+        """
+        Creates an AsyncWebDriver instance from an already loaded configuration dictionary
+        :param driver_config: driver configuration, as returned by WebDriverFactory.resolve_configuration
+        :return: AsyncWebDriver instance
+        """
+        service = None
+        try:
+            url, service, capabilities = await trio.to_thread.run_sync(AsyncWebDriverFactory.__prepare__,
+                                                                       driver_config)
+            driver = await AsyncWebDriver.start(url, capabilities, service)
+        except Exception as e:
+            logger.exception(__class__.__name__ + ": error creating instance")
+            if service is not None:
+                await trio.to_thread.run_sync(service.stop)
+                ProcessSupervisor.withdraw()
+            raise e
+        if service is not None:
+            await trio.to_thread.run_sync(ProcessSupervisor.register, driver)
+
+        await AsyncWebDriverFactory.__apply_extended_options__(driver, driver_config.get("extended_options") or {})
+        return driver
@@ -0,0 +1,179 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+import threading
+import time
+
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.switch_to import SwitchTo
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from testrunner.util.log_setup import logger
+from testrunner.factory.driver_health import DriverHealth
+
+
+class BrowserContextDriver:
+    """
+    Mixin for the WebDriver-compatible handles bound to one isolated browser context of a SharedBrowser. Handles are
+    shallow copies of the launched driver whose class derives from both this mixin and the driver class, so they
+    pass isinstance checks and PageObject code works unchanged. Every command, including the ones sent by elements,
+    goes through execute(), which switches the shared session to the window of the context first.
+    """
+
+    __handle_classes__ = {}
+
+    @staticmethod
+    def handle_class(driver_class: type):
+        if driver_class not in BrowserContextDriver.__handle_classes__:
+            BrowserContextDriver.__handle_classes__[driver_class] = type(
+                "Context" + driver_class.__name__, (BrowserContextDriver, driver_class), {})
+        return BrowserContextDriver.__handle_classes__[driver_class]
+
+    def bind_context(self, browser, context_id: str, window: str):
+        self.__browser = browser
+        self.__window = window
+        self.context_id = context_id
+
+    @property
+    def shared_browser(self):
+        return self.__browser
+
+    def execute(self, driver_command: str, params: dict = None):
+        browser = self.__browser
+        with browser.lock:
+            if driver_command == Command.SWITCH_TO_WINDOW:
+                result = browser.driver.execute(driver_command, params)
+                self.__window = browser.current_window = params['handle']
+                return result
+
+            if browser.current_window != self.__window:
+                browser.driver.execute(Command.SWITCH_TO_WINDOW, {'handle': self.__window})
+                browser.current_window = self.__window
+            result = browser.driver.execute(driver_command, params)
+
+            if driver_command == Command.W3C_GET_WINDOW_HANDLES:
+                # Windows of other contexts are invisible to this handle
+                result['value'] = browser.context_windows(self.context_id, result['value'])
+            elif driver_command == Command.CLOSE:
+                # Keep the handle usable if the context still has other windows, like popups
+                remaining = browser.context_windows(self.context_id, browser.driver.window_handles)
+                browser.current_window = None
+                if len(remaining) > 0:
+                    self.__window = remaining[0]
+            return result
+
+    def quit(self):
+        """
+        Closes this context and every window in it. The browser keeps running for the other contexts.
+        """
+        self.__browser.close_context(self)
+
+
+class SharedBrowser:
+    """
+    One launched Chromium browser hosting several isolated browser contexts, the same mechanism as incognito
+    windows: every context has its own cookies, storage and cache. Contexts are created through the Chrome DevTools
+    Protocol and share the WebDriver session, so commands of different contexts are serialized by a lock.
+    """
+
+    __window_prefix__ = "CDwindow-"
+
+    def __init__(self, driver: WebDriver, max_contexts: int):
+        if not hasattr(driver, "execute_cdp_cmd"):
+            raise Exception("Isolated browser contexts require a Chromium based driver, got {}"
+                            .format(type(driver).__name__))
+        self.driver = driver
+        self.max_contexts = max(1, int(max_contexts))
+        self.lock = threading.RLock()
+        self.current_window = driver.current_window_handle
+        self.contexts = {}
+
+    def has_capacity(self):
+        with self.lock:
+            return len(self.contexts) < self.max_contexts
+
+    @staticmethod
+    def __target_id__(window: str):
+        # Depending on its version, ChromeDriver names windows after their target id with or without a prefix
+        return window[len(SharedBrowser.__window_prefix__):] if window.startswith(SharedBrowser.__window_prefix__) \
+            else window
+
+    def context_windows(self, context_id: str, windows: list):
+        """
+        :return: the windows from the given list which belong to a browser context
+        """
+        with self.lock:
+            targets = self.driver.execute_cdp_cmd("Target.getTargets", {})['targetInfos']
+        in_context = set(target['targetId'] for target in targets
+                         if target.get('browserContextId') == context_id and target.get('type') == "page")
+        return [window for window in windows if SharedBrowser.__target_id__(window) in in_context]
+
+    def __find_window__(self, target_id: str, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while True:
+            for window in self.driver.window_handles:
+                if SharedBrowser.__target_id__(window) == target_id:
+                    return window
+            if time.monotonic() > deadline:
+                raise Exception("Window of target {} not found".format(target_id))
+            time.sleep(0.05)
+
+    def new_context(self, url: str = "about:blank"):
+        """
+        Creates an isolated browser context with a single window
+        :param url: page loaded in the window of the context
+        :return: WebDriver-compatible handle bound to the new context
+        """
+        with self.lock:
+            context_id = self.driver.execute_cdp_cmd("Target.createBrowserContext", {})['browserContextId']
+            try:
+                target_id = self.driver.execute_cdp_cmd("Target.createTarget",
+                                                        {'url': url, 'browserContextId': context_id})['targetId']
+                window = self.__find_window__(target_id)
+            except Exception as e:
+                logger.exception(__class__.__name__ + ": error creating browser context")
+                self.driver.execute_cdp_cmd("Target.disposeBrowserContext", {'browserContextId': context_id})
+                raise e
+
+            handle = copy.copy(self.driver)
+            # Commands are routed through BrowserContextDriver.execute, which calls the launched driver's execute
+            handle.__dict__.pop("execute", None)
+            handle.__class__ = BrowserContextDriver.handle_class(type(self.driver))
+            handle._switch_to = SwitchTo(handle)
+            handle.bind_context(self, context_id, window)
+            self.contexts[context_id] = handle
+            return handle
+
+    def close_context(self, handle: BrowserContextDriver):
+        """
+        Disposes a browser context, closing its windows and discarding its cookies and storage
+        :param handle: handle returned by new_context()
+        """
+        with self.lock:
+            if self.contexts.pop(handle.context_id, None) is None:
+                return
+            self.current_window = None
+            try:
+                self.driver.execute_cdp_cmd("Target.disposeBrowserContext", {'browserContextId': handle.context_id})
+            except Exception:
+                logger.exception(__class__.__name__ + ": error disposing browser context {}".format(handle.context_id))
+
+    def is_alive(self):
+        with self.lock:
+            return DriverHealth.ping(self.driver)
+
+    def quit(self):
+        with self.lock:
+            self.contexts.clear()
+        DriverHealth.kill(self.driver)
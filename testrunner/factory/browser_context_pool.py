@@ -0,0 +1,130 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+import os
+import threading
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+from testrunner.factory.browser_context import SharedBrowser, BrowserContextDriver
+from testrunner.factory.webdriver_factory import WebDriverFactory
+
+
+class BrowserContextPool:
+    """
+    Leases isolated browser contexts instead of whole browsers. Every launched browser hosts up to
+    contexts_per_browser contexts. Handles returned by acquire() are WebDriver-compatible and can be used from
+    different threads.
+    Tests of a pytest process run one after another, so a process alone only holds one context at a time. Browsers
+    are shared between processes instead: with --workers, ParallelRunner launches one browser for every
+    contexts_per_browser workers and passes its DevTools address in TESTRUNNER_SHARED_BROWSER. The pool of every
+    worker then attaches a ChromeDriver session to that browser instead of launching its own, and its contexts live
+    next to the ones of the other workers.
+    """
+
+    env_var_shared_browser = "TESTRUNNER_SHARED_BROWSER"
+
+    def __init__(self, contexts_per_browser: int = None):
+        contexts_config = env.get("browser_contexts") or {}
+        self.contexts_per_browser = int(contexts_per_browser if contexts_per_browser is not None
+                                        else contexts_config.get("contexts_per_browser", 4))
+        self.__lock = threading.Lock()
+        self.__browsers = {}
+        self.shared_browser_address = os.environ.get(BrowserContextPool.env_var_shared_browser)
+
+    @staticmethod
+    def debugger_address(driver):
+        """
+        :return: host:port of the DevTools endpoint of a browser launched by ChromeDriver, or None
+        """
+        return (driver.capabilities.get('goog:chromeOptions') or {}).get('debuggerAddress')
+
+    @staticmethod
+    def attach_configuration(driver_config: dict, debugger_address: str):
+        """
+        Turns a ChromeDriver configuration into one attaching to an already running browser. Browser arguments,
+        profiles and network interception belong to the process which launched the browser, so only session settings
+        are kept
+        :param driver_config: driver configuration, as returned by WebDriverFactory.resolve_configuration
+        :param debugger_address: host:port of the DevTools endpoint of the browser
+        :return: new driver configuration
+        """
+        if driver_config['driver']['type'] != "ChromeDriver":
+            raise Exception("Only ChromeDriver sessions can attach to a shared browser, got {}"
+                            .format(driver_config['driver']['type']))
+        configuration = copy.deepcopy(driver_config)
+        configuration['options'] = dict(configuration['options'], arguments=None, user_data_template=None,
+                                        experimental_options={'debuggerAddress': debugger_address})
+        configuration['network'] = dict(configuration.get('network') or {}, enabled=False)
+        extended_options = configuration.get('extended_options') or {}
+        configuration['extended_options'] = {key: value for key, value in extended_options.items()
+                                             if key in ("implicit_timeout", "page_load_timeout")}
+        return configuration
+
+    def __launch__(self, key: tuple):
+        if self.shared_browser_address is None:
+            return WebDriverFactory.create_instance(*key)
+        # Quitting this session leaves the browser running, it is owned by the parallel runner
+        driver_config = WebDriverFactory.resolve_configuration(*key)
+        return WebDriverFactory.create_instance_from_configuration(
+            BrowserContextPool.attach_configuration(driver_config, self.shared_browser_address))
+
+    def acquire(self, browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
+        """
+        Leases a new isolated context in a browser for the given configuration, launching the browser if none has
+        room left. Parameters are the same as WebDriverFactory.create_instance
+        :return: BrowserContextDriver handle owned by the caller until release() is called
+        """
+        key = (browser_name, config_file_path, exact_match)
+        with self.__lock:
+            browsers = self.__browsers.setdefault(key, [])
+            browser = next((browser for browser in browsers if browser.has_capacity()), None)
+            if browser is None:
+                browser = SharedBrowser(self.__launch__(key), self.contexts_per_browser)
+                browsers.append(browser)
+            return browser.new_context()
+
+    def release(self, handle: BrowserContextDriver):
+        """
+        Disposes the context of a handle, discarding its cookies and storage. The browser keeps running for other
+        contexts
+        :param handle: handle previously returned by acquire()
+        """
+        handle.quit()
+
+    def discard(self, handle: BrowserContextDriver):
+        """
+        Disposes the context of a handle after a failure, and quits its browser if it no longer answers
+        :param handle: handle previously returned by acquire()
+        """
+        browser = handle.shared_browser
+        handle.quit()
+        if browser.is_alive():
+            return
+        logger.warning(__class__.__name__ + ": quitting unhealthy shared browser")
+        with self.__lock:
+            for browsers in self.__browsers.values():
+                if browser in browsers:
+                    browsers.remove(browser)
+        browser.quit()
+
+    def quit_all(self):
+        """
+        Quits every browser launched by the pool, closing all their contexts
+        """
+        with self.__lock:
+            browsers = [browser for browsers in self.__browsers.values() for browser in browsers]
+            self.__browsers.clear()
+        for browser in browsers:
+            browser.quit()
@@ -0,0 +1,110 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+from testrunner.util.process_supervisor import ProcessSupervisor
+
+
+class DriverHealth:
+    """
+    Detects crashed or hung drivers and gets rid of them. Every command sent to a driver is bounded by a hard socket
+    timeout, and liveness checks and quits run in a separate thread so a hung browser never blocks the caller.
+    """
+
+    __command_timeout__ = None
+
+    @staticmethod
+    def __settings__():
+        return env.get("driver_health") or {}
+
+    @staticmethod
+    def __run_with_timeout__(function, timeout: float):
+        # Returns (finished, error). The thread is a daemon so a call which never returns does not keep the process
+        result = {}
+
+        def target():
+            try:
+                function()
+            except Exception as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=target, name="driver-health", daemon=True)
+        thread.start()
+        thread.join(timeout)
+        return not thread.is_alive(), result.get('error')
+
+    @staticmethod
+    def apply_command_timeout(timeout: float = None):
+        """
+        Sets the socket timeout of the HTTP connection used by WebDriver clients, so a command sent to a hung driver
+        fails instead of waiting forever. Only drivers created afterwards are affected.
+        :param timeout: seconds, by default driver_health.command_timeout from config.yaml. 0 disables the timeout
+        """
+        if timeout is None:
+            timeout = DriverHealth.__settings__().get("command_timeout", 0)
+        timeout = float(timeout or 0)
+        if timeout <= 0 or timeout == DriverHealth.__command_timeout__:
+            return
+        RemoteConnection.set_timeout(timeout)
+        DriverHealth.__command_timeout__ = timeout
+
+    @staticmethod
+    def ping(driver: WebDriver, timeout: float = None):
+        """
+        Checks that the driver and its browser still answer commands
+        :param driver: WebDriver instance
+        :param timeout: seconds to wait for an answer, by default driver_health.ping_timeout from config.yaml
+        :return: True if the driver answered in time without errors
+        """
+        if timeout is None:
+            timeout = DriverHealth.__settings__().get("ping_timeout", 5)
+        finished, error = DriverHealth.__run_with_timeout__(lambda: driver.window_handles, float(timeout))
+        if not finished:
+            logger.warning(__class__.__name__ + ": driver did not answer in {} seconds".format(timeout))
+            return False
+        if error is not None:
+            logger.warning(__class__.__name__ + ": driver is not usable: {}".format(error))
+            return False
+        return True
+
+    @staticmethod
+    def kill(driver: WebDriver, timeout: float = None):
+        """
+        Quits a driver, killing its driver process if quit fails or does not finish in time, and any browser process
+        left behind
+        :param driver: WebDriver instance
+        :param timeout: seconds allowed for a clean quit, by default driver_health.quit_timeout from config.yaml
+        """
+        if timeout is None:
+            timeout = DriverHealth.__settings__().get("quit_timeout", 10)
+        finished, error = DriverHealth.__run_with_timeout__(driver.quit, float(timeout))
+        if finished and error is None:
+            ProcessSupervisor.unregister(driver)
+            return
+
+        logger.warning(__class__.__name__ + ": driver did not quit cleanly, killing its process")
+        process = getattr(getattr(driver, "service", None), "process", None)
+        if process is None:
+            return
+        try:
+            process.kill()
+            process.wait(timeout)
+        except Exception:
+            logger.exception(__class__.__name__ + ": error killing driver process {}".format(process.pid))
+        ProcessSupervisor.unregister(driver)
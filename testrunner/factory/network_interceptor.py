@@ -0,0 +1,281 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import atexit
+import fnmatch
+import hashlib
+import json
+import os
+import os.path
+import select
+import socket
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from testrunner.util.log_setup import logger
+
+
+class NetworkInterceptor(ThreadingHTTPServer):
+    """
+    Local HTTP proxy started by the driver factories when the 'network' section is enabled, either in
+    webdriver_defaults in config.yaml or in a webdriver YAML file, which overrides the defaults.
+    It blocks requests matching any of the 'block' URL patterns and, depending on 'mode', records or replays
+    responses from 'cache_dir':
+        passthrough: only blocks requests
+        record: forwards every request and stores the response in the cache
+        replay: serves cached responses and forwards the rest
+        offline: serves cached responses only; anything else fails without touching the network
+    HTTPS traffic goes through CONNECT tunnels, which the proxy cannot decrypt: it can be blocked by host, but not
+    recorded or replayed, so in record, replay and offline modes HTTPS connections are refused instead of silently
+    bypassing the cache. On Chrome, blocking patterns are also applied to HTTPS URLs through the DevTools
+    Network.setBlockedURLs command.
+    """
+
+    daemon_threads = True
+
+    __lock__ = threading.Lock()
+    __instances__ = {}
+
+    __modes__ = ("passthrough", "record", "replay", "offline")
+    __hop_by_hop_headers__ = ("connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+                              "proxy-connection", "te", "trailers", "transfer-encoding", "upgrade")
+
+    def __init__(self, network_config: dict):
+        super().__init__(("127.0.0.1", 0), InterceptProxyHandler)
+        self.block = list(network_config.get("block") or [])
+        self.cache_dir = network_config.get("cache_dir", os.path.join(".cache", "responses"))
+        self.mode = network_config.get("mode", "passthrough")
+        if self.mode not in NetworkInterceptor.__modes__:
+            raise Exception(__class__.__name__ + ": unknown network mode '{}'".format(self.mode))
+        self.metrics = {'blocked': 0, 'cache_hits': 0, 'recorded': 0, 'forwarded': 0, 'offline_misses': 0,
+                        'https_refused': 0}
+        self.__metrics_lock = threading.Lock()
+        self.__refused_hosts = set()
+        if self.mode != "passthrough":
+            logger.warning(__class__.__name__ + ": HTTPS connections are refused in '{}' mode, as they cannot be "
+                                                "recorded or replayed".format(self.mode))
+        self.__thread = threading.Thread(target=self.serve_forever, name="network-interceptor", daemon=True)
+        self.__thread.start()
+
+    @property
+    def address(self):
+        return "127.0.0.1:{}".format(self.server_address[1])
+
+    @staticmethod
+    def enabled(network_config: dict):
+        return network_config is not None and bool(network_config.get("enabled", False))
+
+    @staticmethod
+    def get_instance(network_config: dict):
+        """
+        Returns the proxy serving a network configuration, starting it the first time; drivers sharing the same
+        configuration share the proxy
+        """
+        key = json.dumps(network_config, sort_keys=True)
+        with NetworkInterceptor.__lock__:
+            if key not in NetworkInterceptor.__instances__:
+                NetworkInterceptor.__instances__[key] = NetworkInterceptor(network_config)
+            return NetworkInterceptor.__instances__[key]
+
+    @staticmethod
+    def shutdown_all():
+        with NetworkInterceptor.__lock__:
+            for interceptor in NetworkInterceptor.__instances__.values():
+                logger.debug(__class__.__name__ + ": {} {}".format(interceptor.address, interceptor.metrics))
+                interceptor.shutdown()
+                interceptor.server_close()
+            NetworkInterceptor.__instances__.clear()
+
+    @staticmethod
+    def configure_chrome(chrome_options, network_config: dict):
+        if not NetworkInterceptor.enabled(network_config):
+            return
+        interceptor = NetworkInterceptor.get_instance(network_config)
+        chrome_options.add_argument("--proxy-server=http://" + interceptor.address)
+
+    @staticmethod
+    def firefox_preferences(network_config: dict):
+        """
+        :return: Firefox preferences routing the browser through the proxy, or an empty dictionary if disabled
+        """
+        if not NetworkInterceptor.enabled(network_config):
+            return {}
+        interceptor = NetworkInterceptor.get_instance(network_config)
+        port = interceptor.server_address[1]
+        return {"network.proxy.type": 1,
+                "network.proxy.http": "127.0.0.1", "network.proxy.http_port": port,
+                "network.proxy.ssl": "127.0.0.1", "network.proxy.ssl_port": port,
+                "network.proxy.no_proxies_on": ""}
+
+    @staticmethod
+    def after_launch(driver, network_config: dict):
+        """
+        Applies the blocking patterns through DevTools when the driver supports it, which also covers HTTPS URLs
+        """
+        if not NetworkInterceptor.enabled(network_config) or not hasattr(driver, "execute_cdp_cmd"):
+            return
+        patterns = list(network_config.get("block") or [])
+        if len(patterns) > 0:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+    def count(self, metric: str):
+        # Handler threads update the metrics concurrently
+        with self.__metrics_lock:
+            self.metrics[metric] += 1
+
+    def refuse_https(self, host: str):
+        """
+        Counts an HTTPS connection refused because of the mode, warning once per host
+        """
+        with self.__metrics_lock:
+            self.metrics['https_refused'] += 1
+            first = host not in self.__refused_hosts
+            self.__refused_hosts.add(host)
+        if first:
+            logger.warning(__class__.__name__ + ": refused HTTPS connection to {} in '{}' mode".format(host, self.mode))
+
+    def is_blocked(self, url: str):
+        return any(fnmatch.fnmatch(url, pattern) for pattern in self.block)
+
+    def __cache_path__(self, method: str, url: str):
+        key = hashlib.sha256("{} {}".format(method, url).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def load_response(self, method: str, url: str):
+        path = self.__cache_path__(method, url)
+        if not os.path.isfile(path + ".json"):
+            return None
+        with open(path + ".json", 'rt') as fd:
+            response = json.load(fd)
+        with open(path + ".body", 'rb') as fd:
+            response['body'] = fd.read()
+        return response
+
+    def store_response(self, method: str, url: str, status: int, headers: list, body: bytes):
+        path = self.__cache_path__(method, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".body", 'wb') as fd:
+            fd.write(body)
+        with open(path + ".json", 'wt') as fd:
+            json.dump({'url': url, 'status': status, 'headers': headers}, fd, indent=2)
+
+
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # Redirects are relayed to the browser instead of being followed by the proxy
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class InterceptProxyHandler(BaseHTTPRequestHandler):
+    __opener__ = urllib.request.build_opener(NoRedirectHandler)
+
+    def log_message(self, format, *args):
+        pass
+
+    def __send__(self, status: int, headers: list, body: bytes):
+        self.send_response(status)
+        for name, value in headers:
+            if name.lower() not in NetworkInterceptor.__hop_by_hop_headers__ and name.lower() != "content-length":
+                self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def __forward__(self, url: str):
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length) if length > 0 else None
+        headers = {name: value for name, value in self.headers.items()
+                   if name.lower() not in NetworkInterceptor.__hop_by_hop_headers__}
+        request = urllib.request.Request(url, data=data, headers=headers, method=self.command)
+        try:
+            with InterceptProxyHandler.__opener__.open(request, timeout=30) as response:
+                return response.status, list(response.getheaders()), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, list(e.headers.items()), e.read()
+
+    def __handle__(self):
+        interceptor = self.server
+        url = self.path
+        if interceptor.is_blocked(url):
+            interceptor.count('blocked')
+            self.__send__(204, [], b"")
+            return
+
+        if interceptor.mode in ("replay", "offline"):
+            cached = interceptor.load_response(self.command, url)
+            if cached is not None:
+                interceptor.count('cache_hits')
+                self.__send__(cached['status'], cached['headers'], cached['body'])
+                return
+            if interceptor.mode == "offline":
+                interceptor.count('offline_misses')
+                self.__send__(504, [("Content-Type", "text/plain")], b"Not available in offline mode")
+                return
+
+        try:
+            status, headers, body = self.__forward__(url)
+        except Exception as e:
+            self.__send__(502, [("Content-Type", "text/plain")], str(e).encode("utf-8"))
+            return
+        interceptor.count('forwarded')
+        if interceptor.mode == "record":
+            interceptor.store_response(self.command, url, status, headers, body)
+            interceptor.count('recorded')
+        self.__send__(status, headers, body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_OPTIONS = do_PATCH = __handle__
+
+    def do_CONNECT(self):
+        interceptor = self.server
+        host, _, port = self.path.partition(":")
+        if interceptor.is_blocked("https://{}/".format(host)) or interceptor.is_blocked(host):
+            interceptor.count('blocked')
+            self.send_error(403)
+            return
+        if interceptor.mode != "passthrough":
+            interceptor.refuse_https(host)
+            self.send_error(403)
+            return
+
+        try:
+            upstream = socket.create_connection((host, int(port or 443)), timeout=30)
+        except OSError:
+            self.send_error(502)
+            return
+        self.send_response(200, "Connection established")
+        self.end_headers()
+        interceptor.count('forwarded')
+
+        sockets = [self.connection, upstream]
+        try:
+            while True:
+                readable, _, failed = select.select(sockets, [], sockets, 30)
+                if failed or not readable:
+                    break
+                for source in readable:
+                    data = source.recv(65536)
+                    if not data:
+                        return
+                    (upstream if source is self.connection else self.connection).sendall(data)
+        except OSError:
+            pass
+        finally:
+            upstream.close()
+
+
+atexit.register(NetworkInterceptor.shutdown_all)
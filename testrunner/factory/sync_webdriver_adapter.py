@@ -0,0 +1,106 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import base64
+import functools
+import inspect
+
+import trio
+from selenium.webdriver.common.timeouts import Timeouts
+
+from testrunner.factory.async_webdriver import AsyncWebDriver, AsyncWebElement
+
+
+class SyncWebDriverAdapter:
+    """
+    Blocking view of an AsyncWebDriver or AsyncWebElement, so existing page objects in po/ can drive an async
+    session. Coroutine methods become blocking calls run on the trio loop, the names in 'properties' are read as
+    plain attributes like in selenium, and elements in results are wrapped as adapters too. Adapters must be used
+    from a worker thread of the trio run that owns the driver, e.g. through SyncWebDriverAdapter.run.
+    """
+
+    def __init__(self, target, trio_token=None):
+        self.__target = target
+        self.__token = trio_token if trio_token is not None else trio.lowlevel.current_trio_token()
+
+    @staticmethod
+    async def run(driver: AsyncWebDriver, function, *args):
+        """
+        Runs blocking code in a worker thread, passing a synchronous view of the driver as first argument:
+            page = await SyncWebDriverAdapter.run(driver, PODropDown)
+        :param driver: AsyncWebDriver instance
+        :param function: callable receiving the adapter, e.g. a PageObject class
+        :return: value returned by function
+        """
+        return await trio.to_thread.run_sync(function, SyncWebDriverAdapter(driver), *args)
+
+    @property
+    def wrapped_object(self):
+        return self.__target
+
+    def __wrap__(self, value):
+        if isinstance(value, (AsyncWebDriver, AsyncWebElement)):
+            return SyncWebDriverAdapter(value, self.__token)
+        if isinstance(value, list):
+            return [self.__wrap__(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.__wrap__(item) for key, item in value.items()}
+        return value
+
+    @staticmethod
+    def __unwrap__(value):
+        if isinstance(value, SyncWebDriverAdapter):
+            return value.wrapped_object
+        if isinstance(value, (list, tuple)):
+            return [SyncWebDriverAdapter.__unwrap__(item) for item in value]
+        return value
+
+    def __call_async__(self, function, *args, **kwargs):
+        args = [SyncWebDriverAdapter.__unwrap__(arg) for arg in args]
+        return self.__wrap__(trio.from_thread.run(functools.partial(function, *args, **kwargs),
+                                                  trio_token=self.__token))
+
+    def __getattr__(self, name):
+        value = getattr(self.__target, name)
+        if name in getattr(self.__target, "properties", ()):
+            return self.__call_async__(value)
+        if inspect.iscoroutinefunction(value):
+            return functools.partial(self.__call_async__, value)
+        return value
+
+    # Selenium methods without a coroutine of the same name, built on the ones AsyncWebDriver provides
+
+    @property
+    def timeouts(self):
+        timeouts = self.__call_async__(self.__target.get_timeouts)
+        return Timeouts(implicit_wait=timeouts['implicit'], page_load=timeouts['page_load'],
+                        script=timeouts['script'])
+
+    def set_script_timeout(self, seconds: float):
+        self.__call_async__(self.__target.set_timeouts, script=seconds)
+
+    def set_page_load_timeout(self, seconds: float):
+        self.__call_async__(self.__target.set_timeouts, page_load=seconds)
+
+    def get_screenshot_as_png(self):
+        return base64.b64decode(self.__call_async__(self.__target.get_screenshot_as_base64).encode("ascii"))
+
+    @property
+    def screenshot_as_png(self):
+        return base64.b64decode(self.__call_async__(self.__target.screenshot_as_base64).encode("ascii"))
+
+    def __eq__(self, other):
+        return isinstance(other, SyncWebDriverAdapter) and other.wrapped_object == self.__target
+
+    def __hash__(self):
+        return hash(self.__target)
@@ -0,0 +1,192 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+import os
+import os.path
+import threading
+
+import yaml
+
+from testrunner.util.log_setup import logger
+from testrunner.util.utils import Utils
+
+
+class WebDriverConfigRegistry:
+    """
+    Scans and parses the webdriver configuration directory once, and resolves configurations by exact name, alias or
+    partial name from memory. Lookups only list the directory and stat its files: files are validated when they are
+    loaded, and reloaded and re-indexed when their modification time changes. Factory classes are imported once per
+    driver type.
+    """
+
+    # Expected type of every section and field; only driver.type is mandatory
+    __schema__ = {
+        'driver': (dict, {'type': str, 'executable_path': str, 'verbose': bool}),
+        'options': (dict, {'preferences': dict, 'extensions': list, 'arguments': dict}),
+        'extended_options': (dict, None),
+        'performance_capture': (dict, {'enabled': bool, 'output_file': str, 'enforce_budgets': bool, 'budgets': dict}),
+        'network': (dict, {'enabled': bool, 'block': list, 'cache_dir': str, 'mode': str}),
+        'aliases': (list, None),
+        'profile': (str, None),
+    }
+    __required__ = [('driver', 'type')]
+
+    __lock__ = threading.RLock()
+    __signature__ = None
+    __by_name__ = {}
+    __by_partial_name__ = {}
+    __files__ = {}
+    __factory_classes__ = {}
+
+    @staticmethod
+    def validate(driver_configuration: dict, config_file_path: str = ""):
+        """
+        Checks a driver configuration against the registry schema
+        :param driver_configuration: dictionary loaded from a webdriver YAML file
+        :param config_file_path: path of the file, used in error messages
+        :return: list of error messages, empty if the configuration is valid
+        """
+        if type(driver_configuration) is not dict:
+            return ["'{}' is not a YAML mapping".format(config_file_path)]
+
+        errors = []
+        for section, (section_type, fields) in WebDriverConfigRegistry.__schema__.items():
+            value = driver_configuration.get(section)
+            if value is None:
+                continue
+            if not isinstance(value, section_type):
+                errors.append("'{}': '{}' must be a {}".format(config_file_path, section, section_type.__name__))
+                continue
+            for field, field_type in (fields or {}).items():
+                if field in value and value[field] is not None and not isinstance(value[field], field_type):
+                    errors.append("'{}': '{}.{}' must be a {}".format(config_file_path, section, field,
+                                                                       field_type.__name__))
+        for section, field in WebDriverConfigRegistry.__required__:
+            if not isinstance(driver_configuration.get(section), dict) or field not in driver_configuration[section]:
+                errors.append("'{}': missing mandatory field '{}.{}'".format(config_file_path, section, field))
+        return errors
+
+    @staticmethod
+    def __parse__(config_file_path: str, mtime: float = None):
+        if mtime is None:
+            mtime = os.stat(config_file_path).st_mtime
+        cached = WebDriverConfigRegistry.__files__.get(config_file_path)
+        if cached is not None and cached['mtime'] == mtime:
+            return cached
+
+        with open(config_file_path, 'rt') as fd:
+            driver_configuration = yaml.safe_load(fd.read())
+        errors = WebDriverConfigRegistry.validate(driver_configuration, config_file_path)
+        if len(errors) > 0:
+            logger.error(__class__.__name__ + ": invalid driver configuration\n" + "\n".join(errors))
+
+        entry = {'mtime': mtime, 'configuration': driver_configuration, 'errors': errors}
+        WebDriverConfigRegistry.__files__[config_file_path] = entry
+        return entry
+
+    @staticmethod
+    def __scan__(directory: str):
+        # The directory mtime does not change when a file is edited in place, so the index is keyed on the mtime of
+        # every file: editing the aliases of a file re-indexes the directory as well
+        mtimes = []
+        for file_i in sorted(os.listdir(directory)):
+            if file_i.lower().endswith((".yaml", ".yml")):
+                config_file_path = os.path.join(directory, file_i)
+                try:
+                    mtimes.append((file_i, os.stat(config_file_path).st_mtime))
+                except OSError:
+                    # Removed while listing
+                    continue
+        signature = (directory, tuple(mtimes))
+        if WebDriverConfigRegistry.__signature__ == signature:
+            return
+
+        by_name = {}
+        for file_i, mtime in mtimes:
+            config_file_path = os.path.join(directory, file_i)
+            by_name.setdefault(os.path.splitext(file_i)[0].lower(), config_file_path)
+            try:
+                entry = WebDriverConfigRegistry.__parse__(config_file_path, mtime)
+            except Exception:
+                logger.exception(__class__.__name__ + ": error loading '{}'".format(config_file_path))
+                continue
+            aliases = entry['configuration'].get('aliases') if type(entry['configuration']) is dict else None
+            for alias in aliases or []:
+                by_name.setdefault(str(alias).lower(), config_file_path)
+
+        WebDriverConfigRegistry.__signature__ = signature
+        WebDriverConfigRegistry.__by_name__ = by_name
+        WebDriverConfigRegistry.__by_partial_name__ = {}
+
+    @staticmethod
+    def find(directory: str, browser_name: str, exact_match: bool = False):
+        """
+        Resolves a browser name to a configuration file of the given directory
+        :param directory: webdriver configuration directory
+        :param browser_name: file name without extension, alias declared in the 'aliases' field, or part of a file name
+        :param exact_match: if False and there is no exact match, the first file containing browser_name is returned
+        :return: path to the configuration file, or an empty string if nothing matches
+        """
+        if browser_name is None or browser_name == "":
+            return ""
+
+        with WebDriverConfigRegistry.__lock__:
+            WebDriverConfigRegistry.__scan__(directory)
+            name = browser_name.lower()
+            if name.endswith(".yaml"):
+                name = name[:-len(".yaml")]
+            config_file_path = WebDriverConfigRegistry.__by_name__.get(name)
+            if config_file_path is not None or exact_match:
+                return config_file_path or ""
+
+            if name not in WebDriverConfigRegistry.__by_partial_name__:
+                matches = [path for path in sorted(set(WebDriverConfigRegistry.__by_name__.values()))
+                           if name in os.path.basename(path).lower()]
+                WebDriverConfigRegistry.__by_partial_name__[name] = matches[0] if len(matches) > 0 else ""
+            return WebDriverConfigRegistry.__by_partial_name__[name]
+
+    @staticmethod
+    def load(config_file_path: str):
+        """
+        Returns the validated configuration stored in a YAML file, parsing it only if it changed since the last call
+        :param config_file_path: path to the YAML configuration file
+        :return: copy of the configuration dictionary, so callers can modify it freely
+        """
+        with WebDriverConfigRegistry.__lock__:
+            entry = WebDriverConfigRegistry.__parse__(config_file_path)
+        if len(entry['errors']) > 0:
+            raise Exception("Invalid driver configuration: " + "; ".join(entry['errors']))
+        return copy.deepcopy(entry['configuration'])
+
+    @staticmethod
+    def factory_class(module_name: str, class_name: str):
+        """
+        Imports a webdriver factory class, or returns it from cache if it was already imported
+        """
+        key = (module_name, class_name)
+        if key not in WebDriverConfigRegistry.__factory_classes__:
+            WebDriverConfigRegistry.__factory_classes__[key] = Utils.dynamic_import(module_name, class_name)
+        return WebDriverConfigRegistry.__factory_classes__[key]
+
+    @staticmethod
+    def clear():
+        """
+        Forgets every scanned directory, parsed file and imported factory class
+        """
+        with WebDriverConfigRegistry.__lock__:
+            WebDriverConfigRegistry.__signature__ = None
+            WebDriverConfigRegistry.__by_name__ = {}
+            WebDriverConfigRegistry.__by_partial_name__ = {}
+            WebDriverConfigRegistry.__files__ = {}
+            WebDriverConfigRegistry.__factory_classes__ = {}
@@ -12,14 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os.path
-import yaml
 import sys
 
 from testrunner.util.log_setup import logger
 from config.configuration import env
 from selenium.webdriver.remote.webdriver import WebDriver
 
-from testrunner.util.utils import Utils
+from testrunner.factory.webdriver_config_registry import WebDriverConfigRegistry
+from testrunner.base.wait import Wait
+from testrunner.base.performance_capture import PerformanceCapture
+from testrunner.factory.driver_health import DriverHealth
+from testrunner.factory.network_interceptor import NetworkInterceptor
+from testrunner.factory.webdriver_profiles import WebDriverProfiles
+from testrunner.util.instrumentation import PerformanceRecorder
+from testrunner.util.process_supervisor import ProcessSupervisor
 
 
 class WebDriverFactory:
@@ -29,12 +35,11 @@ class WebDriverFactory:
     @staticmethod
     def __load_configuration__(config_file_path: str):
         if os.path.exists(config_file_path):
-            with open(config_file_path, 'rt') as fd:
-                try:
-                    driver_config = yaml.safe_load(fd.read())
-                    return driver_config
-                except Exception as e:
-                    logger.exception("Error loading driver configuration from file '{}'".format(config_file_path))
+            try:
+                return WebDriverConfigRegistry.load(config_file_path)
+            except Exception as e:
+                logger.exception("Error loading driver configuration from file '{}'".format(config_file_path))
+                raise e
         else:
             raise Exception("Driver configuration file '{}' not found.".format(config_file_path))
 
@@ -51,7 +56,7 @@ class WebDriverFactory:
             webdriver_factory_package = sys.modules[__name__].__package__ + ".webdrivers"
             current_factory_module = webdriver_factory_package + ".{}_factory".format(factory_name.lower())
             current_factory_classname = "{}Factory".format(factory_name)
-            factory_class = Utils.dynamic_import(current_factory_module, current_factory_classname)
+            factory_class = WebDriverConfigRegistry.factory_class(current_factory_module, current_factory_classname)
             factory = factory_class(driver_configuration)
 
             return factory
@@ -62,20 +67,7 @@ class WebDriverFactory:
     @staticmethod
     def __search_webdriver_configuration_by_name__(browser_name: str = None, exact_match: bool = False):
         try:
-            config_file_path = ""
-
-            if browser_name is None or browser_name == "":
-                return config_file_path
-
-            file_tree = sorted(os.listdir(env.get("webdriver_config_dir")))
-            for file_i in file_tree:
-                if exact_match and file_i.lower().replace(".yaml") == browser_name.lower().replace(".yaml"):
-                        config_file_path = os.path.join(env.get("webdriver_config_dir", file_i))
-                        break
-                elif browser_name.lower() in file_i.lower():
-                        config_file_path = os.path.join(env.get("webdriver_config_dir"), file_i)
-                        break
-            return config_file_path
+            return WebDriverConfigRegistry.find(env.get("webdriver_config_dir"), browser_name, exact_match)
         except Exception as e:
             logger.exception(__class__.__name__ + ": error while searching for configuration '{}'".format(browser_name))
 
@@ -90,7 +82,7 @@ class WebDriverFactory:
             driver.maximize_window()
         elif "start_minimized" in options and options['start_minimized']:
             driver.minimize_window()
-        if "implicit_timeout" in options:
+        if "implicit_timeout" in options and Wait.implicit_waits_enabled():
             driver.implicitly_wait(int(options["implicit_timeout"]))
             driver.capabilities['timeouts']['implicit'] = int(options["implicit_timeout"])
         if "page_load_timeout" in options:
@@ -99,15 +91,11 @@ class WebDriverFactory:
 
 
     @staticmethod
-    def create_instance(browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
+    def resolve_configuration(browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
         """
-        Creates a WebDriver instance by providing a YAML configuration path with configuration parameters
-        :param browser_name: name of the browser to drive. This parameter will search in config/webdrivers folder for
-        the first configuration file matching this parameter.
-        :param config_file_path: path to YAML configuration file. If not provided, a default instance will be spawned
-        loading configuration from config/webdrivers/default.yaml file
-        :param exact_match: if browser_name is provided, search for the whole configuration file or just for part of it
-        :return: WebDriver instance
+        Finds and loads the driver configuration create_instance would use, with its performance profile applied
+        and merged over the webdriver_defaults section of config.yaml. Parameters are the same as create_instance
+        :return: driver configuration dictionary
         """
         try:
             config_file_path_by_name = ""
@@ -124,14 +112,76 @@ class WebDriverFactory:
             else:
                 config_file_path = config_file_path_by_name
 
-            # Generate dictionary from YAML, and create an instance of driver factory
-            driver_config = WebDriverFactory.__load_configuration__(config_file_path)
-            driver_factory = WebDriverFactory.__create_factory__(driver_config)
+            # Generate dictionary from YAML, applying the performance profile it refers to, if any, and filling the
+            # sections and values it does not set from the shared defaults
+            with PerformanceRecorder.measure("driver_configuration"):
+                driver_config = WebDriverProfiles.apply(WebDriverFactory.__load_configuration__(config_file_path))
+                return WebDriverProfiles.merge(env.get("webdriver_defaults") or {}, driver_config)
+        except Exception as e:
+            logger.exception(__class__.__name__ + ": error resolving driver configuration")
+            raise e
+
+
+    @staticmethod
+    def create_factory(driver_config: dict):
+        """
+        :param driver_config: driver configuration
+        :return: the {driver.type}Factory instance which launches drivers for a configuration
+        """
+        driver_factory = WebDriverFactory.__create_factory__(driver_config)
+        if driver_factory is None:
+            raise Exception("No factory available for driver type '{}'".format(driver_config['driver']['type']))
+        return driver_factory
+
+
+    @staticmethod
+    def create_instance(browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
+        """
+        Creates a WebDriver instance by providing a YAML configuration path with configuration parameters
+        :param browser_name: name of the browser to drive. This parameter will search in config/webdrivers folder for
+        the first configuration file matching this parameter.
+        :param config_file_path: path to YAML configuration file. If not provided, a default instance will be spawned
+        loading configuration from config/webdrivers/default.yaml file
+        :param exact_match: if browser_name is provided, search for the whole configuration file or just for part of it
+        :return: WebDriver instance
+        """
+        driver_config = WebDriverFactory.resolve_configuration(browser_name, config_file_path, exact_match)
+        return WebDriverFactory.create_instance_from_configuration(driver_config)
 
-            # Use factory to create a WebDriver instance
-            driver = driver_factory.create_instance()
+
+    @staticmethod
+    def create_instance_from_configuration(driver_config: dict):
+        """
+        Creates a WebDriver instance from an already loaded configuration dictionary, with the same structure as the
+        YAML files in config/webdrivers
+        :param driver_config: driver configuration
+        :return: WebDriver instance
+        """
+        try:
+            with PerformanceRecorder.measure("driver_configuration"):
+                driver_factory = WebDriverFactory.__create_factory__(driver_config)
+
+            # Use factory to create a WebDriver instance, with a hard timeout on every command it sends
+            DriverHealth.apply_command_timeout()
+            # Only drivers which spawn a local driver service and browser take local resources
+            local = driver_config['driver']['type'] != "RemoteDriver"
+            if local:
+                ProcessSupervisor.admit()
+            try:
+                with PerformanceRecorder.measure("driver_launch"):
+                    driver = driver_factory.create_instance()
+            except Exception:
+                if local:
+                    ProcessSupervisor.withdraw()
+                raise
+            if local:
+                ProcessSupervisor.register(driver)
+            PerformanceRecorder.instrument_driver(driver)
+            PerformanceCapture.attach(driver, driver_config.get("performance_capture"))
+            NetworkInterceptor.after_launch(driver, driver_config.get("network"))
             if "extended_options" in driver_config:
-                WebDriverFactory.__apply_extended_options__(driver, driver_config["extended_options"])
+                with PerformanceRecorder.measure("driver_extended_options"):
+                    WebDriverFactory.__apply_extended_options__(driver, driver_config["extended_options"])
 
             return driver
         except Exception as e:
@@ -0,0 +1,174 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from testrunner.util.log_setup import logger
+from testrunner.base.session_state import SessionState
+from config.configuration import env
+from testrunner.factory.driver_health import DriverHealth
+from testrunner.factory.webdriver_factory import WebDriverFactory
+from testrunner.factory.webdriver_prewarmer import WebDriverPrewarmer
+
+
+class WebDriverPool:
+    """
+    Keeps a set of warm WebDriver instances per configuration and leases them to tests. Drivers are reset when they
+    are released, recycled after a number of uses or when they crash, and quit when the pool is shut down.
+    Reused drivers are pinged before being leased, and the ones which died or hung are killed and replaced.
+    """
+
+    def __init__(self, size: int = None, max_uses: int = None, prewarm: int = None):
+        pool_config = env.get("webdriver_pool") or {}
+        self.size = int(size if size is not None else pool_config.get("size", 1))
+        self.max_uses = int(max_uses if max_uses is not None else pool_config.get("max_uses", 0))
+        prewarm = int(prewarm if prewarm is not None else pool_config.get("prewarm", 0))
+        self.prewarmer = WebDriverPrewarmer(prewarm) if prewarm > 0 else None
+        self.max_replacements = int((env.get("driver_health") or {}).get("max_replacements", 2))
+        self.__lock = threading.Lock()
+        self.__idle = {}
+        self.__leased = {}
+        self.__uses = {}
+
+    @staticmethod
+    def __pool_key__(browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
+        return browser_name, config_file_path, exact_match
+
+    def prewarm(self, browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
+        """
+        Starts creating drivers for a configuration in background, if pre-warming is enabled. Parameters are the same
+        as acquire()
+        """
+        if self.prewarmer is not None:
+            self.prewarmer.prewarm(browser_name, config_file_path, exact_match)
+
+    def __refill__(self, key: tuple):
+        # A replacement is only warmed when no idle driver is left to serve the next acquire of this configuration
+        with self.__lock:
+            idle = len(self.__idle.get(key, []))
+        if idle == 0:
+            self.prewarmer.prewarm(*key)
+
+    def acquire(self, browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
+        """
+        Leases a driver for the given configuration, reusing an idle one if available
+        :param browser_name: name of the browser to drive, as in WebDriverFactory.create_instance
+        :param config_file_path: path to YAML configuration file, as in WebDriverFactory.create_instance
+        :param exact_match: exact match for browser_name, as in WebDriverFactory.create_instance
+        :return: WebDriver instance owned by the caller until release() is called
+        """
+        key = WebDriverPool.__pool_key__(browser_name, config_file_path, exact_match)
+        driver = None
+        for _ in range(self.max_replacements + 1):
+            with self.__lock:
+                idle = self.__idle.setdefault(key, [])
+                driver = idle.pop() if len(idle) > 0 else None
+            if driver is None and self.prewarmer is not None:
+                driver = self.prewarmer.acquire(browser_name, config_file_path, exact_match)
+                self.__refill__(key)
+            if driver is None or DriverHealth.ping(driver):
+                break
+            logger.warning(__class__.__name__ + ": replacing unhealthy driver")
+            self.__discard__(driver)
+            driver = None
+
+        if driver is None:
+            driver = WebDriverFactory.create_instance(browser_name, config_file_path, exact_match)
+
+        with self.__lock:
+            self.__leased[driver] = key
+            self.__uses[driver] = self.__uses.get(driver, 0) + 1
+        return driver
+
+    def release(self, driver: WebDriver):
+        """
+        Returns a leased driver to the pool. Its state is reset so the next test gets a clean browser; drivers which
+        fail to reset, exceed max_uses or do not fit in the pool are quit instead.
+        :param driver: WebDriver instance previously returned by acquire()
+        """
+        with self.__lock:
+            key = self.__leased.pop(driver, None)
+        if key is None:
+            logger.warning(__class__.__name__ + ": releasing a driver which does not belong to this pool")
+            return
+
+        if self.max_uses > 0 and self.__uses.get(driver, 0) >= self.max_uses:
+            self.__discard__(driver)
+            return
+
+        if not WebDriverPool.reset(driver):
+            self.__discard__(driver)
+            return
+
+        with self.__lock:
+            idle = self.__idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append(driver)
+                return
+        self.__discard__(driver)
+
+    def discard(self, driver: WebDriver):
+        """
+        Returns a leased driver which must not be reused, e.g. after a failed test, killing it if it does not quit
+        :param driver: WebDriver instance previously returned by acquire()
+        """
+        with self.__lock:
+            self.__leased.pop(driver, None)
+        self.__discard__(driver)
+
+    @staticmethod
+    def reset(driver: WebDriver):
+        """
+        Clears cookies, web storage, restored session states and additional windows, and navigates to a blank page
+        :param driver: WebDriver instance to reset
+        :return: True if the driver was reset, False if it is no longer usable
+        """
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            SessionState.clear(driver)
+            driver.delete_all_cookies()
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except WebDriverException:
+                # Storage is not accessible from some pages, like about:blank or data: URLs
+                pass
+            driver.get("about:blank")
+            return True
+        except WebDriverException:
+            logger.exception(__class__.__name__ + ": error resetting driver, it will be recycled")
+            return False
+
+    def __discard__(self, driver: WebDriver):
+        with self.__lock:
+            self.__uses.pop(driver, None)
+        DriverHealth.kill(driver)
+
+    def quit_all(self):
+        """
+        Quits every driver created by the pool, both idle and leased, and stops pre-warming
+        """
+        if self.prewarmer is not None:
+            self.prewarmer.shutdown()
+        with self.__lock:
+            drivers = [driver for idle in self.__idle.values() for driver in idle] + list(self.__leased.keys())
+            self.__idle.clear()
+            self.__leased.clear()
+        for driver in drivers:
+            self.__discard__(driver)
@@ -0,0 +1,101 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from testrunner.util.log_setup import logger
+from testrunner.factory.driver_health import DriverHealth
+from testrunner.factory.webdriver_factory import WebDriverFactory
+
+
+class WebDriverPrewarmer:
+    """
+    Starts drivers in background threads before they are requested, so browser startup overlaps with the test that
+    is currently running. Keeps up to 'depth' drivers starting or ready per configuration, and records how many
+    requests got a ready driver (hits), had to wait for one still starting (waits) or found none (misses).
+    """
+
+    def __init__(self, depth: int = 1, max_workers: int = None):
+        self.depth = max(0, int(depth))
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers or max(1, self.depth),
+                                             thread_name_prefix="webdriver-prewarm")
+        self.__lock = threading.Lock()
+        self.__pending = {}
+        self.metrics = {'hits': 0, 'waits': 0, 'misses': 0, 'wait_time': 0.0, 'errors': 0}
+
+    def __fill__(self, key: tuple):
+        # Must be called with the lock held
+        pending = self.__pending.setdefault(key, [])
+        while len(pending) < self.depth:
+            pending.append(self.__executor.submit(WebDriverFactory.create_instance, *key))
+
+    def prewarm(self, browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
+        """
+        Starts creating drivers for a configuration in background, up to the prewarm depth
+        """
+        with self.__lock:
+            self.__fill__((browser_name, config_file_path, exact_match))
+
+    def acquire(self, browser_name: str = None, config_file_path: str = None, exact_match: bool = False):
+        """
+        Returns a driver for the given configuration, taking a pre-warmed one if available. No replacement is
+        started: the caller calls prewarm() once the driver is ready and it knows another one will be needed, so two
+        browsers never compete for the CPU while one is awaited. Parameters are the same as
+        WebDriverFactory.create_instance
+        :return: WebDriver instance
+        """
+        key = (browser_name, config_file_path, exact_match)
+        with self.__lock:
+            pending = self.__pending.setdefault(key, [])
+            future = pending.pop(0) if len(pending) > 0 else None
+            outcome = "misses" if future is None else "hits" if future.done() else "waits"
+            self.metrics[outcome] += 1
+
+        start = time.perf_counter()
+        failed = False
+        if future is None:
+            driver = WebDriverFactory.create_instance(*key)
+        else:
+            try:
+                driver = future.result()
+            except Exception:
+                # The error was already logged by WebDriverFactory; try once more in the foreground
+                failed = True
+                driver = WebDriverFactory.create_instance(*key)
+
+        with self.__lock:
+            if future is not None:
+                self.metrics['wait_time'] += time.perf_counter() - start
+            if failed:
+                self.metrics['errors'] += 1
+        return driver
+
+    def shutdown(self):
+        """
+        Stops warming drivers and kills every driver which was started but never handed out
+        """
+        with self.__lock:
+            futures = [future for pending in self.__pending.values() for future in pending]
+            self.__pending.clear()
+            self.depth = 0
+        self.__executor.shutdown(wait=True)
+        for future in futures:
+            try:
+                driver = future.result()
+            except Exception:
+                # The error was already logged by WebDriverFactory
+                continue
+            DriverHealth.kill(driver)
+        logger.info(__class__.__name__ + ": {}".format(self.metrics))
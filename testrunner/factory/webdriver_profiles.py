@@ -0,0 +1,61 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os.path
+
+from testrunner.util.log_setup import logger
+from config.configuration import env, merge, read_yaml
+
+
+class WebDriverProfiles:
+    """
+    Built-in performance profiles (config/profiles.yaml), applied to a driver configuration through its 'profile'
+    field. A profile provides defaults per driver type; the driver configuration overrides them.
+    """
+
+    __profiles__ = None
+
+    @staticmethod
+    def profiles():
+        if WebDriverProfiles.__profiles__ is None:
+            path = env.get("webdriver_profiles_file", os.path.join("config", "profiles.yaml"))
+            WebDriverProfiles.__profiles__ = (read_yaml(path) or {}) if os.path.isfile(path) else {}
+        return WebDriverProfiles.__profiles__
+
+    @staticmethod
+    def merge(base: dict, override: dict):
+        """
+        Deep merges two configuration dictionaries
+        :return: new dictionary with the values of base, replaced by those in override
+        """
+        return merge(base, override)
+
+    @staticmethod
+    def apply(driver_configuration: dict):
+        """
+        :param driver_configuration: driver configuration, optionally with a 'profile' field
+        :return: driver configuration with the profile defaults for its driver type applied
+        """
+        profile_name = driver_configuration.get('profile')
+        if profile_name is None:
+            return driver_configuration
+
+        profile = WebDriverProfiles.profiles().get(profile_name)
+        if profile is None:
+            raise Exception(__class__.__name__ + ": unknown profile '{}'".format(profile_name))
+        defaults = profile.get(driver_configuration['driver']['type'])
+        if defaults is None:
+            logger.warning(__class__.__name__ + ": profile '{}' has no settings for {}".format(
+                profile_name, driver_configuration['driver']['type']))
+            return driver_configuration
+        return WebDriverProfiles.merge(defaults, driver_configuration)
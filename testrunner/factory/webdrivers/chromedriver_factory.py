@@ -16,6 +16,11 @@ import yaml
 
 from testrunner.util.log_setup import logger
 from testrunner.factory.webdrivers.webdriverfactory_interface import WebDriverFactoryInterface
+from testrunner.factory.webdrivers.driver_binary_cache import DriverBinaryCache
+from testrunner.util.instrumentation import PerformanceRecorder
+from testrunner.base.performance_capture import PerformanceCapture
+from testrunner.factory.network_interceptor import NetworkInterceptor
+from testrunner.factory.webdrivers.profile_template import ProfileTemplate
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium import webdriver
 from selenium.common.exceptions import WebDriverException
@@ -56,7 +61,8 @@ class ChromeDriverFactory(WebDriverFactoryInterface):
 
             # Get chromedriver path
             if not os.path.isfile(self.driver_configuration['driver']['executable_path']):
-                chrome_options.driver_executable_path = ChromeDriverManager().install()
+                chrome_options.driver_executable_path = DriverBinaryCache.resolve(
+                    "google-chrome", lambda: ChromeDriverManager().install())
             else:
                 chrome_options.driver_executable_path = self.driver_configuration['driver']['executable_path']
 
@@ -81,6 +87,17 @@ class ChromeDriverFactory(WebDriverFactoryInterface):
                     else:
                         chrome_options.add_experimental_option(key, options['experimental_options'][key])
 
+            # Private copy of a pre-seeded user data directory, if a template is configured
+            if options.get('user_data_template'):
+                profile_dir = ProfileTemplate.checkout(options['user_data_template'])
+                chrome_options.add_argument("--user-data-dir=" + profile_dir)
+
+            # Local proxy to block and stub requests, if network interception is enabled
+            NetworkInterceptor.configure_chrome(chrome_options, self.driver_configuration.get('network'))
+
+            # DevTools performance log, if performance capture is enabled
+            PerformanceCapture.configure_chrome(chrome_options, self.driver_configuration.get('performance_capture'))
+
             return chrome_options
 
         except Exception as e:
@@ -93,12 +110,15 @@ class ChromeDriverFactory(WebDriverFactoryInterface):
         Creates a ChromeDriver instance by loading configuration parameters provided in constructor
         :return: A configured ChromeDriver instance
         """
-        chrome_options = self._create_webdriver_options_()
+        with PerformanceRecorder.measure("driver_options"):
+            chrome_options = self._create_webdriver_options_()
 
+        # chromedriver verbose logging is kept by default, and can be disabled with driver.verbose
+        verbose = self.driver_configuration['driver'].get('verbose', True)
         try:
             driver = webdriver.Chrome(executable_path=chrome_options.driver_executable_path,
                                       chrome_options=chrome_options,
-                                      service_args=["--verbose"])
+                                      service_args=["--verbose"] if verbose else None)
 
             return driver
 
@@ -0,0 +1,137 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import contextlib
+import json
+import os
+import os.path
+import platform
+import tempfile
+import threading
+import time
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where concurrent workers may resolve the same driver twice
+    fcntl = None
+
+
+class DriverBinaryCache:
+    """
+    Process-wide and on-disk cache of resolved driver binaries (chromedriver, geckodriver...), keyed by browser type,
+    browser version and platform. webdriver_manager is only invoked on a cache miss or once an entry has expired,
+    and never in offline mode. Parallel workers update the cache file under a file lock, so a driver is downloaded
+    once and no worker overwrites the entries written by another.
+    """
+
+    __lock__ = threading.Lock()
+    __resolved__ = {}
+    __browser_versions__ = {}
+
+    @staticmethod
+    def __settings__():
+        cache_config = env.get("driver_binary_cache") or {}
+        return (cache_config.get("cache_file", os.path.join(".cache", "driver_binaries.json")),
+                int(cache_config.get("ttl", 86400)),
+                bool(cache_config.get("offline", False)))
+
+    @staticmethod
+    def __browser_version__(browser_type: str):
+        if browser_type not in DriverBinaryCache.__browser_versions__:
+            try:
+                from webdriver_manager.utils import get_browser_version_from_os
+                version = get_browser_version_from_os(browser_type)
+            except Exception:
+                version = None
+            DriverBinaryCache.__browser_versions__[browser_type] = version or "unknown"
+        return DriverBinaryCache.__browser_versions__[browser_type]
+
+    @staticmethod
+    def __read_cache_file__(cache_file: str):
+        if not os.path.isfile(cache_file):
+            return {}
+        try:
+            with open(cache_file, 'rt') as fd:
+                return json.load(fd)
+        except Exception:
+            logger.exception(__class__.__name__ + ": ignoring unreadable cache file '{}'".format(cache_file))
+            return {}
+
+    @staticmethod
+    def __write_cache_file__(cache_file: str, entries: dict):
+        cache_dir = os.path.dirname(cache_file) or "."
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file and rename it, so concurrent workers never read a half written cache
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'wt') as tmp_fd:
+            json.dump(entries, tmp_fd, indent=2, sort_keys=True)
+        os.replace(tmp_path, cache_file)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def __file_lock__(cache_file: str):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+        with open(cache_file + ".lock", 'a') as lock_fd:
+            fcntl.flock(lock_fd.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fd.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def __cached_path__(entry: dict, ttl: int, offline: bool):
+        if entry is not None and os.path.isfile(entry['path']) and \
+                (offline or time.time() - entry['resolved_at'] < ttl):
+            return entry['path']
+        return None
+
+    @staticmethod
+    def resolve(browser_type: str, install):
+        """
+        Returns the path of the driver binary for the installed version of a browser
+        :param browser_type: browser identifier as understood by webdriver_manager ('google-chrome', 'firefox'...)
+        :param install: callable which downloads the driver and returns its path, e.g. ChromeDriverManager().install
+        :return: path to the driver binary
+        """
+        cache_file, ttl, offline = DriverBinaryCache.__settings__()
+        key = "{}|{}|{}".format(browser_type, DriverBinaryCache.__browser_version__(browser_type), platform.platform())
+
+        with DriverBinaryCache.__lock__:
+            path = DriverBinaryCache.__resolved__.get(key)
+            if path is not None and os.path.isfile(path):
+                return path
+
+            path = DriverBinaryCache.__cached_path__(DriverBinaryCache.__read_cache_file__(cache_file).get(key), ttl,
+                                                     offline)
+            if path is None and offline:
+                raise Exception(__class__.__name__ + ": offline mode enabled and no cached driver for '{}'".format(key))
+
+            if path is None:
+                # The file is read again under the lock, as another worker may have resolved the driver meanwhile,
+                # and the entries written by other workers are kept
+                with DriverBinaryCache.__file_lock__(cache_file):
+                    entries = DriverBinaryCache.__read_cache_file__(cache_file)
+                    path = DriverBinaryCache.__cached_path__(entries.get(key), ttl, offline)
+                    if path is None:
+                        path = install()
+                        entries[key] = {'path': path, 'resolved_at': time.time()}
+                        DriverBinaryCache.__write_cache_file__(cache_file, entries)
+            DriverBinaryCache.__resolved__[key] = path
+            return path
@@ -0,0 +1,114 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import json
+import os
+import os.path
+import tempfile
+import threading
+
+from selenium import webdriver
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+
+
+class CachedFirefoxProfile(webdriver.FirefoxProfile):
+    """
+    FirefoxProfile whose zipped and base64 encoded contents were computed beforehand, so Selenium does not zip the
+    profile directory again on every launch
+    """
+
+    def __init__(self, encoded: str):
+        # The parent creates an empty temporary profile directory, which Selenium removes when the driver quits
+        super().__init__()
+        self.__encoded = encoded
+
+    @property
+    def encoded(self):
+        return self.__encoded
+
+
+class FirefoxProfileCache:
+    """
+    Builds a Firefox profile once per set of preferences and extensions, and keeps its encoded archive in memory
+    and on disk (firefox_profile_cache.cache_dir), so it is reused across drivers and runs. Any change in the
+    preferences, or in the extension files, produces a different profile, so preferences which change on every run,
+    like the port of the network interception proxy, belong in FirefoxOptions instead.
+    """
+
+    __lock__ = threading.Lock()
+    __encoded__ = {}
+
+    @staticmethod
+    def __cache_dir__():
+        cache_config = env.get("firefox_profile_cache") or {}
+        return cache_config.get("cache_dir", os.path.join(".cache", "firefox_profiles"))
+
+    @staticmethod
+    def profile_hash(preferences: dict, extensions: list = None, accept_untrusted_certs: bool = None):
+        """
+        :return: hash identifying a profile; extensions are identified by path, size and modification time
+        """
+        extension_ids = []
+        for extension in extensions or []:
+            stat = os.stat(extension)
+            extension_ids.append([os.path.abspath(extension), stat.st_size, stat.st_mtime])
+        content = json.dumps({'preferences': preferences, 'extensions': extension_ids,
+                              'accept_untrusted_certs': accept_untrusted_certs}, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def __build__(preferences: dict, extensions: list, accept_untrusted_certs: bool):
+        firefox_profile = webdriver.FirefoxProfile()
+        if accept_untrusted_certs is not None:
+            firefox_profile.accept_untrusted_certs = accept_untrusted_certs
+        for key, value in preferences.items():
+            firefox_profile.set_preference(key, value)
+        for extension in extensions or []:
+            firefox_profile.add_extension(extension)
+        return firefox_profile.encoded
+
+    @staticmethod
+    def get(preferences: dict, extensions: list = None, accept_untrusted_certs: bool = None):
+        """
+        Returns a profile with the given settings, building it only if it is not cached yet
+        :param preferences: Firefox preferences
+        :param extensions: paths to extension files
+        :param accept_untrusted_certs: value of FirefoxProfile.accept_untrusted_certs, if provided
+        :return: FirefoxProfile instance ready to be passed to webdriver.Firefox
+        """
+        key = FirefoxProfileCache.profile_hash(preferences, extensions, accept_untrusted_certs)
+        with FirefoxProfileCache.__lock__:
+            encoded = FirefoxProfileCache.__encoded__.get(key)
+            if encoded is None:
+                cache_path = os.path.join(FirefoxProfileCache.__cache_dir__(), key + ".b64")
+                if os.path.isfile(cache_path):
+                    with open(cache_path, 'rt') as fd:
+                        encoded = fd.read()
+                else:
+                    logger.debug(__class__.__name__ + ": building Firefox profile " + key)
+                    encoded = FirefoxProfileCache.__build__(preferences, extensions, accept_untrusted_certs)
+                    FirefoxProfileCache.__store__(cache_path, encoded)
+                FirefoxProfileCache.__encoded__[key] = encoded
+        return CachedFirefoxProfile(encoded)
+
+    @staticmethod
+    def __store__(cache_path: str, encoded: str):
+        cache_dir = os.path.dirname(cache_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'wt') as tmp_fd:
+            tmp_fd.write(encoded)
+        os.replace(tmp_path, cache_path)
@@ -16,6 +16,10 @@ import yaml
 
 from testrunner.util.log_setup import logger
 from testrunner.factory.webdrivers.webdriverfactory_interface import WebDriverFactoryInterface
+from testrunner.factory.webdrivers.driver_binary_cache import DriverBinaryCache
+from testrunner.util.instrumentation import PerformanceRecorder
+from testrunner.factory.network_interceptor import NetworkInterceptor
+from testrunner.factory.webdrivers.firefox_profile_cache import FirefoxProfileCache
 from webdriver_manager.firefox import GeckoDriverManager
 from selenium import webdriver
 from selenium.common.exceptions import WebDriverException
@@ -53,12 +57,12 @@ class FirefoxDriverFactory(WebDriverFactoryInterface):
     def _create_webdriver_options_(self):
         try:
             firefox_options = webdriver.FirefoxOptions()
-            firefox_profile = webdriver.FirefoxProfile()
             firefox_capabilities = DesiredCapabilities.FIREFOX
 
             # Get Geckodriver path
             if not os.path.isfile(self.driver_configuration['driver']['executable_path']):
-                firefox_options.driver_executable_path = GeckoDriverManager().install()
+                firefox_options.driver_executable_path = DriverBinaryCache.resolve(
+                    "firefox", lambda: GeckoDriverManager().install())
             else:
                 firefox_options.driver_executable_path = self.driver_configuration['driver']['executable_path']
 
@@ -67,21 +71,19 @@ class FirefoxDriverFactory(WebDriverFactoryInterface):
             if os.path.isfile(options['binary_path']):
                 firefox_options.binary_location = options['binary_path']
 
-            # Allow self-signed certificates
-            if 'accept_untrusted_certs' in options:
-                firefox_profile.accept_untrusted_certs = options['accept_untrusted_certs']
+            # Headless mode
+            if options.get('headless', False):
+                firefox_options.headless = True
 
-            # Preferences
-            if 'preferences' in options is not None:
-                for key in options['preferences']:
-                    if options['preferences'][key] == "":
-                        firefox_profile.set_preference(key, "")
-                    else:
-                        firefox_profile.set_preference(key, options['preferences'][key])
+            # The profile is only built (and zipped) when preferences, extensions or certificate settings change
+            firefox_profile = FirefoxProfileCache.get(dict(options.get('preferences') or {}), options.get('extensions'),
+                                                      options.get('accept_untrusted_certs'))
 
-            if 'extensions' in options is not None:
-                for key in options['extensions']:
-                    firefox_profile.add_extension(key)
+            # Local proxy to block and stub requests, if network interception is enabled. Its port changes on every
+            # run, so it is kept out of the cached profile: geckodriver writes these preferences into its copy of the
+            # profile at launch
+            for key, value in NetworkInterceptor.firefox_preferences(self.driver_configuration.get('network')).items():
+                firefox_options.set_preference(key, value)
 
             firefox_capabilities['marionette'] = True
 
@@ -97,15 +99,20 @@ class FirefoxDriverFactory(WebDriverFactoryInterface):
         Creates a FirefoxDriver instance by loading configuration parameters provided in constructor
         :return: A configured FirefoxDriver instance
         """
-        firefox_configuration = self._create_webdriver_options_()
+        with PerformanceRecorder.measure("driver_options"):
+            firefox_configuration = self._create_webdriver_options_()
         firefox_options = firefox_configuration[0]
         firefox_profile = firefox_configuration[1]
         firefox_capabilities = firefox_configuration[2]
 
         try:
+            # geckodriver.log is written by default; it is discarded if driver.verbose is disabled
+            verbose = self.driver_configuration['driver'].get('verbose', True)
             driver = webdriver.Firefox(executable_path=firefox_options.driver_executable_path,
                                        firefox_profile=firefox_profile,
-                                       desired_capabilities=firefox_capabilities)
+                                       options=firefox_options,
+                                       desired_capabilities=firefox_capabilities,
+                                       service_log_path="geckodriver.log" if verbose else os.devnull)
             return driver
 
         except WebDriverException as e:
@@ -0,0 +1,118 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import atexit
+import os
+import os.path
+import shutil
+import tempfile
+import threading
+
+from testrunner.util.log_setup import logger
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where profiles are always copied
+    fcntl = None
+
+
+class ProfileTemplate:
+    """
+    Reusable browser user-data directories. Every driver gets a private copy of a template directory instead of
+    having the browser build a new profile from scratch. Files are cloned copy-on-write where the filesystem
+    supports it (Btrfs, XFS) and copied otherwise. If the template does not exist yet, the first profile used in the
+    process is saved as the template at exit, so later runs start from a fully initialized profile.
+    """
+
+    # Lock and crash files which must never be copied between profiles
+    __ignored__ = shutil.ignore_patterns("Singleton*", "lock", ".parentlock", "parent.lock", "Crashpad",
+                                         "crashes", "minidumps", "*.tmp")
+
+    # ioctl request cloning a whole file on Linux (FICLONE from linux/fs.h)
+    __ficlone__ = 0x40049409
+
+    __lock__ = threading.Lock()
+    __checked_out__ = []
+    __seeds__ = {}
+
+    @staticmethod
+    def __copy_file__(source: str, destination: str):
+        # shutil.copytree copy_function: a reflink shares the blocks of the template until the browser writes them
+        if fcntl is not None:
+            try:
+                with open(source, 'rb') as source_fd, open(destination, 'wb') as destination_fd:
+                    fcntl.ioctl(destination_fd.fileno(), ProfileTemplate.__ficlone__, source_fd.fileno())
+                shutil.copystat(source, destination)
+                return destination
+            except OSError:
+                pass
+        return shutil.copy2(source, destination)
+
+    @staticmethod
+    def __copy__(source_dir: str, destination_dir: str):
+        shutil.copytree(source_dir, destination_dir, ignore=ProfileTemplate.__ignored__,
+                        copy_function=ProfileTemplate.__copy_file__, dirs_exist_ok=True)
+
+    @staticmethod
+    def __save__(profile_dir: str, template_dir: str):
+        # Parallel workers may seed the same template at once: each one copies into a temporary directory next to
+        # the template and renames it into place, so the template appears complete or not at all
+        parent_dir = os.path.dirname(os.path.abspath(template_dir))
+        os.makedirs(parent_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=".{}-".format(os.path.basename(template_dir)), dir=parent_dir)
+        try:
+            ProfileTemplate.__copy__(profile_dir, staging_dir)
+            os.replace(staging_dir, template_dir)
+        except OSError:
+            if not os.path.isdir(template_dir):
+                raise
+            # Another worker saved the template first
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    @staticmethod
+    def checkout(template_dir: str):
+        """
+        Creates a private copy of a profile template
+        :param template_dir: template directory; it does not need to exist
+        :return: path of a new directory to be used as the browser profile
+        """
+        profile_dir = tempfile.mkdtemp(prefix="testrunner-profile-")
+        with ProfileTemplate.__lock__:
+            ProfileTemplate.__checked_out__.append(profile_dir)
+            if os.path.isdir(template_dir):
+                ProfileTemplate.__copy__(template_dir, profile_dir)
+            elif template_dir not in ProfileTemplate.__seeds__:
+                ProfileTemplate.__seeds__[template_dir] = profile_dir
+        return profile_dir
+
+    @staticmethod
+    def cleanup():
+        """
+        Saves missing templates from the first profile created from them and removes every profile copy
+        """
+        with ProfileTemplate.__lock__:
+            for template_dir, profile_dir in ProfileTemplate.__seeds__.items():
+                try:
+                    if not os.path.isdir(template_dir):
+                        ProfileTemplate.__save__(profile_dir, template_dir)
+                except Exception:
+                    logger.exception(__class__.__name__ + ": error saving profile template '{}'".format(template_dir))
+            for profile_dir in ProfileTemplate.__checked_out__:
+                shutil.rmtree(profile_dir, ignore_errors=True)
+            ProfileTemplate.__seeds__.clear()
+            ProfileTemplate.__checked_out__.clear()
+
+
+atexit.register(ProfileTemplate.cleanup)
@@ -0,0 +1,215 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import atexit
+import json
+import os.path
+import threading
+import urllib.request
+
+import yaml
+
+from testrunner.util.log_setup import logger
+from testrunner.factory.webdrivers.webdriverfactory_interface import WebDriverFactoryInterface
+from testrunner.util.instrumentation import PerformanceRecorder
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+
+class SharedRemoteConnection(RemoteConnection):
+    """
+    RemoteConnection shared by several sessions. WebDriver.quit() closes the command executor of the session, which
+    would clear the keep-alive pool of every other session on the endpoint, so close() does nothing and the pool is
+    only closed by close_pool() when the process is done with the endpoint
+    """
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        super().close()
+
+
+class RemoteDriverFactory(WebDriverFactoryInterface):
+    """
+    Internal class that generates a Remote WebDriver instance on one of the Selenium Grid or remote WebDriver
+    endpoints listed in driver.endpoints. Every endpoint is driven through a single keep-alive connection pool shared
+    by all its sessions, new sessions go to the endpoint with the most free slots, and session creation is retried
+    on another endpoint when one fails.
+    """
+
+    __lock__ = threading.Lock()
+    __executors__ = {}
+    __active_sessions__ = {}
+
+    __browser_options__ = {
+        "chrome": webdriver.ChromeOptions,
+        "firefox": webdriver.FirefoxOptions,
+        "edge": webdriver.EdgeOptions,
+    }
+
+    def __init__(self, driver_configuration: dict = None, config_file_path: str = None):
+        self.driver_configuration = driver_configuration
+        self.config_file_path = config_file_path
+
+        if config_file_path is not None and os.path.isfile(config_file_path):
+            self._load_default_options_(config_file_path)
+
+
+    def _load_default_options_(self, config_file_path: str = None):
+        if config_file_path is None:
+            cfg_path = os.path.join("config", "webdrivers", "default.yaml")
+        else:
+            cfg_path = config_file_path
+        try:
+            with open(cfg_path, 'rt') as fd:
+                self.driver_configuration = yaml.safe_load(fd.read())
+            if self.driver_configuration['driver']['type'] != "RemoteDriver":
+                raise Exception(__class__.__name__ + ": The provided configuration is not compatible with RemoteDriver")
+
+        except Exception as e:
+            logger.exception("Error loading remote default configuration")
+            raise e
+
+
+    def _create_webdriver_options_(self):
+        try:
+            browser = self.driver_configuration['driver'].get('browser', 'chrome').lower()
+            if browser not in RemoteDriverFactory.__browser_options__:
+                raise Exception(__class__.__name__ + ": unsupported remote browser '{}'".format(browser))
+            browser_options = RemoteDriverFactory.__browser_options__[browser]()
+
+            options = self.driver_configuration.get('options') or {}
+
+            # Arguments
+            for key, value in (options.get('arguments') or {}).items():
+                browser_options.add_argument(key if value == "" else key + "=" + str(value))
+
+            # Experimental options, only for Chromium based browsers
+            for key, value in (options.get('experimental_options') or {}).items():
+                browser_options.add_experimental_option(key, value)
+
+            # Preferences, only for Firefox
+            for key, value in (options.get('preferences') or {}).items():
+                browser_options.set_preference(key, value)
+
+            # Any additional capability, like platformName or se:options
+            for key, value in (options.get('capabilities') or {}).items():
+                browser_options.set_capability(key, value)
+
+            return browser_options
+
+        except Exception as e:
+            logger.exception("Error creating Remote options")
+            raise e
+
+
+    @staticmethod
+    def executor(url: str):
+        """
+        Returns the command executor shared by every session of an endpoint, so they reuse its keep-alive pool
+        """
+        with RemoteDriverFactory.__lock__:
+            if url not in RemoteDriverFactory.__executors__:
+                RemoteDriverFactory.__executors__[url] = SharedRemoteConnection(url, keep_alive=True)
+            return RemoteDriverFactory.__executors__[url]
+
+
+    @staticmethod
+    def shutdown():
+        """
+        Closes the connection pool of every endpoint. Sessions still open on them can no longer send commands
+        """
+        with RemoteDriverFactory.__lock__:
+            executors = list(RemoteDriverFactory.__executors__.values())
+            RemoteDriverFactory.__executors__.clear()
+        for executor in executors:
+            executor.close_pool()
+
+
+    @staticmethod
+    def free_slots(endpoint: dict):
+        """
+        Asks an endpoint for its free capacity. Selenium Grid 4 reports its slots in /status; for other endpoints the
+        configured max_sessions minus the sessions created by this process is used
+        :param endpoint: endpoint configuration, with 'url' and optionally 'max_sessions'
+        :return: number of sessions the endpoint can still accept
+        """
+        url = endpoint['url']
+        active = RemoteDriverFactory.__active_sessions__.get(url, 0)
+        estimated = int(endpoint.get('max_sessions', 1)) - active
+        try:
+            with urllib.request.urlopen(url.rstrip("/") + "/status", timeout=2) as response:
+                status = json.loads(response.read().decode("utf-8")).get('value', {})
+        except Exception:
+            return estimated
+
+        nodes = status.get('nodes')
+        if nodes is None:
+            return estimated if status.get('ready', True) else 0
+        return sum(1 for node in nodes if node.get('availability', "UP") == "UP"
+                   for slot in node.get('slots', []) if slot.get('session') is None)
+
+
+    @staticmethod
+    def __track__(driver, url: str):
+        with RemoteDriverFactory.__lock__:
+            RemoteDriverFactory.__active_sessions__[url] = RemoteDriverFactory.__active_sessions__.get(url, 0) + 1
+        quit_session = driver.quit
+
+        def quit():
+            try:
+                quit_session()
+            finally:
+                with RemoteDriverFactory.__lock__:
+                    RemoteDriverFactory.__active_sessions__[url] -= 1
+
+        driver.quit = quit
+        return driver
+
+
+    def create_instance(self):
+        """
+        Creates a Remote WebDriver instance on the endpoint with more free capacity
+        :return: A configured Remote WebDriver instance
+        """
+        with PerformanceRecorder.measure("driver_options"):
+            browser_options = self._create_webdriver_options_()
+
+        endpoints = list(self.driver_configuration['driver'].get('endpoints') or [])
+        if len(endpoints) == 0:
+            raise Exception(__class__.__name__ + ": no endpoints configured in driver.endpoints")
+        retries = int(self.driver_configuration['driver'].get('retries', len(endpoints)))
+
+        failed = set()
+        last_error = None
+        for _ in range(max(1, retries)):
+            candidates = [endpoint for endpoint in endpoints if endpoint['url'] not in failed] or endpoints
+            ranked = sorted(((RemoteDriverFactory.free_slots(endpoint), endpoint) for endpoint in candidates),
+                            key=lambda item: item[0], reverse=True)
+            url = ranked[0][1]['url']
+            try:
+                driver = webdriver.Remote(command_executor=RemoteDriverFactory.executor(url),
+                                          options=browser_options)
+                return RemoteDriverFactory.__track__(driver, url)
+            except WebDriverException as e:
+                logger.warning(__class__.__name__ + ": error creating session on '{}': {}".format(url, e))
+                failed.add(url)
+                last_error = e
+
+        logger.error(__class__.__name__ + ": Error initializing Remote WebDriver")
+        raise last_error
+
+
+atexit.register(RemoteDriverFactory.shutdown)
@@ -0,0 +1,54 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from testrunner.util.log_setup import logger
+from testrunner.util.artifacts import ArtifactCollector
+
+
+def pytest_configure(config):
+    config.testrunner_artifacts = ArtifactCollector()
+
+
+def __find_driver__(item):
+    # Any fixture value which is a WebDriver (or a driver-like adapter), 'driver' first. Only the class is inspected:
+    # reading properties like page_source on the instance sends commands to a browser which may have crashed
+    funcargs = getattr(item, "funcargs", None) or {}
+    candidates = [funcargs["driver"]] if "driver" in funcargs else []
+    candidates += [value for name, value in funcargs.items() if name != "driver"]
+    for candidate in candidates:
+        if isinstance(candidate, WebDriver) or hasattr(type(candidate), "get_screenshot_as_base64"):
+            return candidate
+    return None
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    # Artifacts must be captured before fixture teardown resets or releases the driver
+    if report.failed and report.when in ("setup", "call"):
+        # Never let a broken browser turn a test failure into a pytest internal error
+        try:
+            directory = item.config.testrunner_artifacts.collect(__find_driver__(item), item.nodeid)
+        except Exception:
+            logger.exception("Error collecting artifacts of {}".format(item.nodeid))
+            directory = None
+        if directory is not None:
+            report.sections.append(("artifacts", directory))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    session.config.testrunner_artifacts.shutdown()
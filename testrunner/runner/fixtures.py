@@ -0,0 +1,93 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+from config.configuration import env
+from testrunner.base.session_state import SessionState
+from testrunner.factory.browser_context_pool import BrowserContextPool
+from testrunner.factory.webdriver_pool import WebDriverPool
+from testrunner.util.log_handlers import LogContext
+from testrunner.util.process_supervisor import ProcessSupervisor
+
+
+def __uses_webdriver_pool__(session):
+    if session.config.option.collectonly or (env.get("browser_contexts") or {}).get("enabled", False):
+        return False
+    return any("driver" in item.fixturenames or "webdriver_pool" in item.fixturenames for item in session.items)
+
+
+def __create_webdriver_pool__(config):
+    # Signal handlers must be installed from the main thread, before pre-warming launches drivers in the background
+    ProcessSupervisor.install()
+    config.testrunner_webdriver_pool = WebDriverPool()
+    return config.testrunner_webdriver_pool
+
+
+def pytest_collection_finish(session):
+    # The first driver starts as soon as collection shows that a test needs one, so its startup overlaps the
+    # session setup and the fixtures of the first test instead of happening when that test asks for the driver
+    if __uses_webdriver_pool__(session):
+        __create_webdriver_pool__(session.config).prewarm(env.get("default_browser", "chrome"))
+
+
+def pytest_sessionfinish(session):
+    # The pool may have been created by pytest_collection_finish without any test using it
+    pool = getattr(session.config, "testrunner_webdriver_pool", None)
+    if pool is not None:
+        session.config.testrunner_webdriver_pool = None
+        pool.quit_all()
+
+
+@pytest.fixture(scope="session")
+def webdriver_pool(request):
+    pool = getattr(request.config, "testrunner_webdriver_pool", None)
+    return pool if pool is not None else __create_webdriver_pool__(request.config)
+
+
+@pytest.fixture(scope="session")
+def browser_context_pool():
+    ProcessSupervisor.install()
+    pool = BrowserContextPool()
+    yield pool
+    pool.quit_all()
+
+
+@pytest.fixture
+def driver(request):
+    # Either a whole browser from the WebDriverPool or an isolated context in a shared browser
+    contexts_enabled = (env.get("browser_contexts") or {}).get("enabled", False)
+    pool = request.getfixturevalue("browser_context_pool" if contexts_enabled else "webdriver_pool")
+    driver = pool.acquire(env.get("default_browser", "chrome"))
+    LogContext.set(session_id=getattr(driver, "session_id", None))
+    ProcessSupervisor.lease(driver, request.node.nodeid)
+    yield driver
+    ProcessSupervisor.release(driver, request.node.nodeid)
+    LogContext.set(session_id=None)
+    # A failed test may have left the browser crashed or hung, so a retry always gets a fresh driver
+    if getattr(request.node, "testrunner_failed", False):
+        pool.discard(driver)
+    else:
+        pool.release(driver)
+
+
+@pytest.fixture
+def login_as(driver):
+    """
+    Authenticates the driver fixture from a saved session state, running the login flow only when there is none:
+        def test_profile(driver, login_as):
+            login_as("admin", lambda driver: POLogin(driver, url).login("admin", password))
+    """
+    def authenticate(user: str, login, origins: list = None):
+        return SessionState.authenticate(driver, user, login, origins)
+    return authenticate
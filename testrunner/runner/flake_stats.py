@@ -0,0 +1,114 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import os.path
+import time
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+
+
+class FlakeStatistics:
+    """
+    Per test counters persisted across runs in retry.stats_file:
+        runs: executions, counting every retry of a run as one execution
+        failures: executions which failed even after retrying
+        flaky: executions which failed at least once and then passed on retry
+        retries: additional attempts spent
+    Tests whose flake rate (flaky / runs) reaches the configured threshold are quarantined.
+    """
+
+    __counters__ = ("runs", "failures", "flaky", "retries")
+
+    def __init__(self, stats_file: str = None):
+        retry_config = env.get("retry") or {}
+        quarantine_config = retry_config.get("quarantine") or {}
+        self.stats_file = stats_file or retry_config.get("stats_file", os.path.join(".cache", "flake_stats.json"))
+        self.quarantine_enabled = bool(quarantine_config.get("enabled", False))
+        self.min_runs = int(quarantine_config.get("min_runs", 10))
+        self.flake_rate_threshold = float(quarantine_config.get("flake_rate", 0.2))
+        self.tests = FlakeStatistics.read(self.stats_file)
+        self.session = {}
+
+    @staticmethod
+    def read(path: str):
+        if not os.path.isfile(path):
+            return {}
+        try:
+            with open(path, 'rt') as fd:
+                return json.load(fd)
+        except Exception:
+            logger.exception(__class__.__name__ + ": ignoring unreadable statistics '{}'".format(path))
+            return {}
+
+    @staticmethod
+    def write(path: str, tests: dict):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'wt') as fd:
+            json.dump(tests, fd, indent=1, sort_keys=True)
+
+    @staticmethod
+    def merge(tests: dict, delta: dict):
+        """
+        Adds the counters of delta to tests, in place
+        :param tests: accumulated statistics, as stored in stats_file
+        :param delta: statistics of a single session
+        :return: tests
+        """
+        for node_id, counters in delta.items():
+            entry = tests.setdefault(node_id, {})
+            for counter in FlakeStatistics.__counters__:
+                entry[counter] = entry.get(counter, 0) + counters.get(counter, 0)
+            entry['last_run'] = max(entry.get('last_run', 0), counters.get('last_run', 0))
+        return tests
+
+    def record(self, node_id: str, attempts: int, passed: bool):
+        """
+        Records the outcome of one execution of a test in this session
+        :param node_id: pytest node id
+        :param attempts: number of times the test ran, 1 if it was not retried
+        :param passed: whether the last attempt passed
+        """
+        entry = self.session.setdefault(node_id, dict.fromkeys(FlakeStatistics.__counters__, 0))
+        entry['runs'] += 1
+        entry['retries'] += attempts - 1
+        if not passed:
+            entry['failures'] += 1
+        elif attempts > 1:
+            entry['flaky'] += 1
+        entry['last_run'] = int(time.time())
+
+    def flake_rate(self, node_id: str):
+        entry = self.tests.get(node_id) or {}
+        runs = entry.get('runs', 0)
+        return entry.get('flaky', 0) / runs if runs > 0 else 0.0
+
+    def is_quarantined(self, node_id: str):
+        if not self.quarantine_enabled:
+            return False
+        entry = self.tests.get(node_id) or {}
+        return entry.get('runs', 0) >= self.min_runs and self.flake_rate(node_id) >= self.flake_rate_threshold
+
+    def save(self, delta_file: str = None):
+        """
+        Persists the statistics of this session. Parallel workers write only their session to delta_file, and the
+        runner merges them into stats_file once every worker has finished
+        :param delta_file: file for this session alone, or None to merge directly into stats_file
+        """
+        if delta_file is not None:
+            FlakeStatistics.write(delta_file, self.session)
+            return
+        FlakeStatistics.write(self.stats_file, FlakeStatistics.merge(FlakeStatistics.read(self.stats_file),
+                                                                     self.session))
@@ -0,0 +1,252 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import ast
+import fnmatch
+import hashlib
+import json
+import os
+import os.path
+import subprocess
+import sys
+import threading
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+
+
+class TestImpactIndex:
+    """
+    Maps every test to the project files it depends on, so only the tests affected by a change are run.
+    Dependencies come from two sources, both persisted in impact.index_file:
+        static: project modules imported by the test file, transitively; recomputed only for files whose content
+        hash changed since the last run
+        runtime: project files whose code was executed while the test ran, recorded with --impact-record
+    """
+
+    __test__ = False
+
+    def __init__(self, root_dir: str = None, index_file: str = None):
+        impact_config = env.get("impact") or {}
+        self.root_dir = os.path.abspath(root_dir or os.getcwd())
+        self.index_file = index_file or impact_config.get("index_file", os.path.join(".cache", "impact_index.json"))
+        self.run_all_patterns = impact_config.get("run_all_patterns", ["conftest.py"])
+        self.files = {}
+        self.runtime = {}
+        # Runtime dependencies recorded by this session, the only ones a parallel worker reports
+        self.recorded = {}
+        self.__load__()
+
+    @staticmethod
+    def read(path: str):
+        if not os.path.isfile(path):
+            return {}
+        try:
+            with open(path, 'rt') as fd:
+                return json.load(fd)
+        except Exception:
+            logger.exception(__class__.__name__ + ": ignoring unreadable index '{}'".format(path))
+            return {}
+
+    def __load__(self):
+        index = TestImpactIndex.read(self.index_file)
+        self.files = index.get('files', {})
+        self.runtime = index.get('runtime', {})
+
+    def merge(self, delta_file: str):
+        """
+        Adds the file entries and runtime dependencies saved by a parallel worker to this index
+        :param delta_file: file written by save(delta_file) in the worker
+        """
+        delta = TestImpactIndex.read(delta_file)
+        self.files.update(delta.get('files', {}))
+        self.runtime.update(delta.get('runtime', {}))
+        self.recorded.update(delta.get('runtime', {}))
+
+    def save(self, delta_file: str = None):
+        """
+        Persists the index. Parallel workers write only what their session computed to delta_file, and the runner
+        merges them into index_file once every worker has finished
+        :param delta_file: file for this session alone, or None to write index_file
+        """
+        path = delta_file if delta_file is not None else self.index_file
+        index = {'files': self.files, 'runtime': self.recorded if delta_file is not None else self.runtime}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'wt') as fd:
+            json.dump(index, fd, indent=1, sort_keys=True)
+
+    def relative(self, path: str):
+        """
+        :return: path relative to the project root with '/' separators, or None if it is outside the project
+        """
+        path = os.path.abspath(path)
+        if not path.startswith(self.root_dir + os.sep):
+            return None
+        return os.path.relpath(path, self.root_dir).replace(os.sep, "/")
+
+    def __module_file__(self, module_name: str):
+        base = os.path.join(self.root_dir, *module_name.split("."))
+        for candidate in (base + ".py", os.path.join(base, "__init__.py")):
+            if os.path.isfile(candidate):
+                return self.relative(candidate)
+        return None
+
+    def __parse_imports__(self, relative_path: str):
+        with open(os.path.join(self.root_dir, relative_path), 'rb') as fd:
+            source = fd.read()
+        tree = ast.parse(source, relative_path)
+        package = relative_path[:-len(".py")].replace("/", ".").split(".")[:-1]
+
+        module_names = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                module_names.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == "pytest_plugins"
+                                                      for target in node.targets):
+                # Plugins declared in conftest files are imported by pytest
+                if isinstance(node.value, (ast.List, ast.Tuple)):
+                    module_names.extend(element.value for element in node.value.elts
+                                        if isinstance(element, ast.Constant) and isinstance(element.value, str))
+            elif isinstance(node, ast.ImportFrom):
+                base = package[:len(package) - node.level + 1] if node.level > 0 else []
+                module = ".".join(base + ([node.module] if node.module else []))
+                module_names.append(module)
+                # 'from package import module' imports a module, not just a name
+                module_names.extend(module + "." + alias.name if module else alias.name for alias in node.names)
+
+        imports = set()
+        for module_name in module_names:
+            parts = module_name.split(".")
+            # Importing a.b.c also executes the __init__ of a and a.b
+            for depth in range(1, len(parts) + 1):
+                module_file = self.__module_file__(".".join(parts[:depth]))
+                if module_file is not None and module_file != relative_path:
+                    imports.add(module_file)
+        return hashlib.sha1(source).hexdigest(), sorted(imports)
+
+    def __file_entry__(self, relative_path: str):
+        absolute_path = os.path.join(self.root_dir, relative_path)
+        if not os.path.isfile(absolute_path):
+            self.files.pop(relative_path, None)
+            return None
+        entry = self.files.get(relative_path)
+        stat = os.stat(absolute_path)
+        if entry is not None and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            return entry
+        try:
+            digest, imports = self.__parse_imports__(relative_path)
+        except SyntaxError:
+            digest, imports = None, []
+        if entry is None or entry['hash'] != digest:
+            entry = {'hash': digest, 'imports': imports}
+        entry.update({'mtime': stat.st_mtime, 'size': stat.st_size})
+        self.files[relative_path] = entry
+        return entry
+
+    def static_dependencies(self, relative_path: str):
+        """
+        :return: set of project files imported, directly or transitively, by a file (itself included)
+        """
+        dependencies = set()
+        pending = [relative_path]
+        while len(pending) > 0:
+            current = pending.pop()
+            if current in dependencies:
+                continue
+            dependencies.add(current)
+            entry = self.__file_entry__(current)
+            if entry is not None:
+                pending.extend(entry['imports'])
+        return dependencies
+
+    def __conftests__(self, relative_path: str):
+        # conftest.py files in the directory of a test and its parents, which pytest loads for it
+        directory = os.path.dirname(relative_path)
+        while True:
+            conftest = (directory + "/conftest.py") if directory else "conftest.py"
+            if os.path.isfile(os.path.join(self.root_dir, conftest)):
+                yield conftest
+            if directory == "":
+                break
+            directory = os.path.dirname(directory)
+
+    def record_runtime(self, node_id: str, executed_files: set):
+        self.runtime[node_id] = self.recorded[node_id] = sorted(executed_files)
+
+    @staticmethod
+    def changed_files(reference: str):
+        """
+        :param reference: git reference to compare the working tree with, e.g. origin/master
+        :return: set of project files changed since the reference, including uncommitted and untracked files
+        """
+        changed = set()
+        for command in (["git", "diff", "--name-only", reference],
+                        ["git", "ls-files", "--others", "--exclude-standard"]):
+            output = subprocess.run(command, stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+            changed.update(line.strip() for line in output.splitlines() if line.strip() != "")
+        return changed
+
+    def select(self, node_ids: list, changed: set):
+        """
+        :param node_ids: collected tests
+        :param changed: project files changed, relative to the project root
+        :return: list with the node ids of the tests affected by the change; every test if a changed file matches
+        impact.run_all_patterns, and tests without any recorded dependency are always selected
+        """
+        if any(fnmatch.fnmatch(path, pattern) for path in changed for pattern in self.run_all_patterns):
+            return list(node_ids)
+
+        static = {}
+        selected = []
+        for node_id in node_ids:
+            test_file = node_id.split("::")[0]
+            if test_file not in static:
+                static[test_file] = self.static_dependencies(test_file)
+                for conftest in self.__conftests__(test_file):
+                    static[test_file] |= self.static_dependencies(conftest)
+            dependencies = static[test_file] | set(self.runtime.get(node_id, []))
+            if len(dependencies & changed) > 0 or self.__file_entry__(test_file) is None:
+                selected.append(node_id)
+        return selected
+
+
+class RuntimeRecorder:
+    """
+    Records which project files run code while it is active. It only traces function calls, not lines, to keep
+    the overhead low, and must be used on the thread that runs the test.
+    """
+
+    def __init__(self, index: TestImpactIndex):
+        self.index = index
+        self.executed = set()
+        self.__seen = {}
+        self.__previous = None
+
+    def __trace__(self, frame, event, arg):
+        filename = frame.f_code.co_filename
+        if filename not in self.__seen:
+            self.__seen[filename] = self.index.relative(filename)
+        if self.__seen[filename] is not None:
+            self.executed.add(self.__seen[filename])
+        return None
+
+    def start(self):
+        self.executed = set()
+        self.__previous = sys.gettrace()
+        sys.settrace(self.__trace__)
+        threading.settrace(self.__trace__)
+
+    def stop(self):
+        sys.settrace(self.__previous)
+        threading.settrace(None)
+        return self.executed
@@ -0,0 +1,65 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+from testrunner.runner.impact import TestImpactIndex, RuntimeRecorder
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("testrunner")
+    group.addoption("--impact-diff", action="store", default=None, metavar="GIT_REF",
+                    help="only run the tests affected by the changes since GIT_REF")
+    group.addoption("--impact-record", action="store_true", default=False,
+                    help="record the project files executed by every test in the impact index")
+    group.addoption("--impact-delta-file", action="store", default=None,
+                    help="write the impact index changes of this session to this file instead of impact.index_file")
+
+
+def pytest_configure(config):
+    enabled = config.getoption("impact_diff") is not None or config.getoption("impact_record")
+    config.testrunner_impact_index = TestImpactIndex(str(config.rootpath)) if enabled else None
+
+
+def pytest_collection_modifyitems(config, items):
+    index = config.testrunner_impact_index
+    reference = config.getoption("impact_diff")
+    if index is None or reference is None:
+        return
+
+    selected = set(index.select([item.nodeid for item in items], TestImpactIndex.changed_files(reference)))
+    deselected = [item for item in items if item.nodeid not in selected]
+    items[:] = [item for item in items if item.nodeid in selected]
+    if len(deselected) > 0:
+        config.hook.pytest_deselected(items=deselected)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    index = item.config.testrunner_impact_index
+    if index is None or not item.config.getoption("impact_record"):
+        yield
+        return
+
+    recorder = RuntimeRecorder(index)
+    recorder.start()
+    try:
+        yield
+    finally:
+        index.record_runtime(item.nodeid, recorder.stop())
+
+
+def pytest_sessionfinish(session, exitstatus):
+    index = session.config.testrunner_impact_index
+    if index is not None:
+        index.save(session.config.getoption("impact_delta_file"))
@@ -0,0 +1,72 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+
+import pytest
+
+from testrunner.util.instrumentation import PerformanceRecorder
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    PerformanceRecorder.set_current_test(item.nodeid)
+    yield
+    PerformanceRecorder.set_current_test(None)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    with PerformanceRecorder.measure("setup"):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    with PerformanceRecorder.measure("call"):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    with PerformanceRecorder.measure("teardown"):
+        yield
+
+
+def __reporting__(config):
+    # Nothing to report when tests are only collected, or when none of them drove a browser
+    return PerformanceRecorder.enabled() and not config.option.collectonly and PerformanceRecorder.recorded()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not __reporting__(session.config):
+        return
+    worker_id = os.environ.get("TESTRUNNER_WORKER_ID")
+    PerformanceRecorder.write_report(suffix="-worker-{}".format(worker_id) if worker_id is not None else "")
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if not __reporting__(config):
+        return
+    top = int(PerformanceRecorder.settings().get("top", 10))
+
+    terminalreporter.section("slowest webdriver commands")
+    for item in PerformanceRecorder.command_summary()[:top]:
+        terminalreporter.write_line("{:>10.1f}ms total {:>6} calls {:>8.1f}ms mean {:>8}ms p95  {}".format(
+            item['total_ms'], item['count'], item['mean_ms'], item['p95_ms'], item['command']))
+
+    terminalreporter.section("slowest tests")
+    for item in PerformanceRecorder.test_summary()[:top]:
+        phases = ", ".join("{} {:.3f}s".format(phase, duration) for phase, duration in sorted(item['phases'].items()))
+        terminalreporter.write_line("{:>9.3f}s {:>6} round trips  {} ({})".format(
+            item['total_s'], item['round_trips'], item['test'], phases))
@@ -0,0 +1,245 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import heapq
+import json
+import math
+import os
+import os.path
+import subprocess
+import sys
+import xml.etree.ElementTree as ElementTree
+
+from testrunner.util.log_setup import logger
+from config.configuration import env, env_var_snapshot
+from testrunner.runner.flake_stats import FlakeStatistics
+from testrunner.runner.impact import TestImpactIndex
+from testrunner.factory.browser_context_pool import BrowserContextPool
+from testrunner.factory.driver_health import DriverHealth
+from testrunner.factory.webdriver_factory import WebDriverFactory
+
+
+class ParallelRunner:
+    """
+    Runs a pytest suite across several worker processes. Tests are collected once, distributed between workers using
+    the durations recorded in previous runs, and the reports, logs and flake statistics of every worker are merged at
+    the end.
+    Every worker is an independent pytest session, so it owns its own WebDriverPool and driver set. When browser
+    contexts are enabled, workers share browsers launched by the runner instead, see BrowserContextPool.
+    """
+
+    __plugin__ = "testrunner.runner.pytest_plugin"
+
+    def __init__(self, workers: int, pytest_args: list = None):
+        parallel_config = env.get("parallel") or {}
+        self.workers = max(1, int(workers))
+        self.pytest_args = list(pytest_args or [])
+        self.durations_file = parallel_config.get("durations_file", os.path.join(".cache", "test_durations.json"))
+        self.report_file = parallel_config.get("report_file", os.path.join("log", "report.xml"))
+        self.worker_dir = parallel_config.get("worker_dir", os.path.join("log", "workers"))
+
+    def collect(self):
+        """
+        Collects the node ids of the tests selected by pytest_args without running them
+        :return: list of node ids
+        """
+        command = [sys.executable, "-m", "pytest", "--collect-only", "-q"] + self.pytest_args
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        node_ids = []
+        for line in result.stdout.splitlines():
+            if line.strip() == "":
+                break
+            if "::" in line:
+                node_ids.append(line.strip())
+        if len(node_ids) == 0:
+            logger.error(__class__.__name__ + ": no tests collected\n" + result.stdout)
+        return node_ids
+
+    def load_durations(self):
+        if not os.path.isfile(self.durations_file):
+            return {}
+        try:
+            with open(self.durations_file, 'rt') as fd:
+                return json.load(fd)
+        except Exception:
+            logger.exception(__class__.__name__ + ": error loading durations from '{}'".format(self.durations_file))
+            return {}
+
+    @staticmethod
+    def schedule(node_ids: list, durations: dict, workers: int):
+        """
+        Splits tests between workers using the longest-processing-time-first heuristic: the slowest pending test is
+        always assigned to the least loaded worker. Tests without history are estimated with the mean duration.
+        :param node_ids: tests to distribute
+        :param durations: historical duration in seconds per node id
+        :param workers: number of workers
+        :return: list with the node ids assigned to every worker
+        """
+        known = [durations[node_id] for node_id in node_ids if node_id in durations]
+        default_duration = sum(known) / len(known) if len(known) > 0 else 1.0
+
+        estimated = sorted(node_ids, key=lambda node_id: durations.get(node_id, default_duration), reverse=True)
+        buckets = [[] for _ in range(workers)]
+        load = [(0.0, index) for index in range(workers)]
+        for node_id in estimated:
+            worker_load, index = heapq.heappop(load)
+            buckets[index].append(node_id)
+            heapq.heappush(load, (worker_load + durations.get(node_id, default_duration), index))
+        return [bucket for bucket in buckets if len(bucket) > 0]
+
+    def __launch_shared_browsers__(self, worker_count: int):
+        """
+        Launches one browser for every contexts_per_browser workers, when browser contexts are shared between workers
+        :return: list of launched drivers, empty if workers launch their own browsers
+        """
+        contexts_config = env.get("browser_contexts") or {}
+        per_browser = max(1, int(contexts_config.get("contexts_per_browser", 4)))
+        if not contexts_config.get("enabled", False) or not contexts_config.get("share_between_workers", True) or \
+                per_browser < 2:
+            return []
+        driver_config = WebDriverFactory.resolve_configuration(env.get("default_browser", "chrome"))
+        if driver_config['driver']['type'] != "ChromeDriver":
+            logger.warning(__class__.__name__ + ": browsers can only be shared by ChromeDriver, workers will launch "
+                                                "their own")
+            return []
+
+        browsers = []
+        try:
+            for _ in range(math.ceil(worker_count / per_browser)):
+                browsers.append(WebDriverFactory.create_instance_from_configuration(driver_config))
+                if BrowserContextPool.debugger_address(browsers[-1]) is None:
+                    raise Exception("ChromeDriver did not report the DevTools address of the browser")
+        except Exception as e:
+            logger.exception(__class__.__name__ + ": error launching shared browsers")
+            self.__quit_shared_browsers__(browsers)
+            raise e
+        logger.info(__class__.__name__ + ": {} workers share {} browsers".format(worker_count, len(browsers)))
+        return browsers
+
+    @staticmethod
+    def __quit_shared_browsers__(browsers: list):
+        for driver in browsers:
+            DriverHealth.kill(driver)
+
+    def __start_worker__(self, worker_id: int, node_ids: list, shared_browser=None):
+        tests_path = os.path.join(self.worker_dir, "worker-{}.tests".format(worker_id))
+        with open(tests_path, 'wt') as fd:
+            fd.write("\n".join(node_ids))
+
+        command = [sys.executable, "-m", "pytest", "-p", ParallelRunner.__plugin__,
+                   "--worker-tests", tests_path,
+                   "--durations-file", os.path.join(self.worker_dir, "worker-{}.durations.json".format(worker_id)),
+                   "--flake-stats-file", os.path.join(self.worker_dir, "worker-{}.flakes.json".format(worker_id)),
+                   "--impact-delta-file", os.path.join(self.worker_dir, "worker-{}.impact.json".format(worker_id)),
+                   "--junitxml", os.path.join(self.worker_dir, "worker-{}.xml".format(worker_id))]
+        command += self.pytest_args + sorted(set(node_id.split("::")[0] for node_id in node_ids))
+
+        worker_env = dict(os.environ)
+        worker_env["TESTRUNNER_WORKER_ID"] = str(worker_id)
+        worker_env[env_var_snapshot] = env.snapshot()
+        if shared_browser is not None:
+            worker_env[BrowserContextPool.env_var_shared_browser] = BrowserContextPool.debugger_address(shared_browser)
+        log_fd = open(os.path.join(self.worker_dir, "worker-{}.log".format(worker_id)), 'wt')
+        process = subprocess.Popen(command, stdout=log_fd, stderr=subprocess.STDOUT, env=worker_env)
+        return process, log_fd
+
+    def __merge_durations__(self, worker_ids: list):
+        durations = self.load_durations()
+        for worker_id in worker_ids:
+            path = os.path.join(self.worker_dir, "worker-{}.durations.json".format(worker_id))
+            if os.path.isfile(path):
+                with open(path, 'rt') as fd:
+                    durations.update(json.load(fd))
+        os.makedirs(os.path.dirname(self.durations_file) or ".", exist_ok=True)
+        with open(self.durations_file, 'wt') as fd:
+            json.dump(durations, fd, indent=2, sort_keys=True)
+
+    def __merge_flake_statistics__(self, worker_ids: list):
+        statistics = FlakeStatistics()
+        merged = FlakeStatistics.read(statistics.stats_file)
+        for worker_id in worker_ids:
+            path = os.path.join(self.worker_dir, "worker-{}.flakes.json".format(worker_id))
+            if os.path.isfile(path):
+                FlakeStatistics.merge(merged, FlakeStatistics.read(path))
+                os.remove(path)
+        FlakeStatistics.write(statistics.stats_file, merged)
+
+    def __merge_impact_index__(self, worker_ids: list):
+        paths = [os.path.join(self.worker_dir, "worker-{}.impact.json".format(worker_id)) for worker_id in worker_ids]
+        paths = [path for path in paths if os.path.isfile(path)]
+        if len(paths) == 0:
+            # Impact analysis was not enabled in the workers
+            return
+        index = TestImpactIndex(os.getcwd())
+        for path in paths:
+            index.merge(path)
+            os.remove(path)
+        index.save()
+
+    def __merge_reports__(self, worker_ids: list):
+        merged = ElementTree.Element("testsuites")
+        for worker_id in worker_ids:
+            path = os.path.join(self.worker_dir, "worker-{}.xml".format(worker_id))
+            if not os.path.isfile(path):
+                continue
+            root = ElementTree.parse(path).getroot()
+            suites = [root] if root.tag == "testsuite" else list(root)
+            for suite in suites:
+                suite.set("name", "{}-worker-{}".format(suite.get("name", "pytest"), worker_id))
+                merged.append(suite)
+        os.makedirs(os.path.dirname(self.report_file) or ".", exist_ok=True)
+        ElementTree.ElementTree(merged).write(self.report_file, encoding="utf-8", xml_declaration=True)
+
+    def __merge_logs__(self, worker_ids: list):
+        for worker_id in worker_ids:
+            path = os.path.join(self.worker_dir, "worker-{}.log".format(worker_id))
+            with open(path, 'rt') as fd:
+                sys.stdout.write("\n===== worker {} =====\n".format(worker_id))
+                sys.stdout.write(fd.read())
+        sys.stdout.flush()
+
+    def run(self):
+        """
+        Collects, distributes and runs the suite, then merges durations, JUnit reports and logs of every worker
+        :return: pytest exit code, non-zero if any worker failed
+        """
+        node_ids = self.collect()
+        if len(node_ids) == 0:
+            return 5
+
+        os.makedirs(self.worker_dir, exist_ok=True)
+        buckets = ParallelRunner.schedule(node_ids, self.load_durations(), self.workers)
+        logger.info(__class__.__name__ + ": running {} tests in {} workers".format(len(node_ids), len(buckets)))
+
+        shared_browsers = self.__launch_shared_browsers__(len(buckets))
+        try:
+            per_browser = math.ceil(len(buckets) / len(shared_browsers)) if len(shared_browsers) > 0 else 0
+            workers = [self.__start_worker__(worker_id, bucket,
+                                             shared_browsers[worker_id // per_browser] if per_browser > 0 else None)
+                       for worker_id, bucket in enumerate(buckets)]
+            exit_codes = []
+            for process, log_fd in workers:
+                exit_codes.append(process.wait())
+                log_fd.close()
+        finally:
+            ParallelRunner.__quit_shared_browsers__(shared_browsers)
+
+        worker_ids = list(range(len(buckets)))
+        self.__merge_logs__(worker_ids)
+        self.__merge_durations__(worker_ids)
+        self.__merge_flake_statistics__(worker_ids)
+        self.__merge_impact_index__(worker_ids)
+        self.__merge_reports__(worker_ids)
+
+        failed = [code for code in exit_codes if code != 0]
+        return failed[0] if len(failed) > 0 else 0
@@ -0,0 +1,66 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os.path
+import time
+
+import pytest
+
+from testrunner.util.log_handlers import LogContext
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("testrunner")
+    group.addoption("--worker-tests", action="store", default=None,
+                    help="file with the node ids this worker must run, one per line")
+    group.addoption("--durations-file", action="store", default=None,
+                    help="JSON file where the duration of every executed test is written")
+
+
+def pytest_configure(config):
+    config.testrunner_durations = {}
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(config, items):
+    worker_tests_path = config.getoption("worker_tests")
+    if worker_tests_path is None:
+        return
+
+    with open(worker_tests_path, 'rt') as fd:
+        selected = set(line.strip() for line in fd if line.strip() != "")
+
+    deselected = [item for item in items if item.nodeid not in selected]
+    items[:] = [item for item in items if item.nodeid in selected]
+    if len(deselected) > 0:
+        config.hook.pytest_deselected(items=deselected)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    LogContext.set(test_id=item.nodeid)
+    start = time.perf_counter()
+    yield
+    item.config.testrunner_durations[item.nodeid] = time.perf_counter() - start
+    LogContext.set(test_id=None, session_id=None)
+
+
+def pytest_unconfigure(config):
+    durations_path = config.getoption("durations_file")
+    if durations_path is None:
+        return
+
+    os.makedirs(os.path.dirname(durations_path) or ".", exist_ok=True)
+    with open(durations_path, 'wt') as fd:
+        json.dump(config.testrunner_durations, fd, indent=2)
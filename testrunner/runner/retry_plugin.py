@@ -0,0 +1,137 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+from testrunner.runner.flake_stats import FlakeStatistics
+
+try:
+    # Private pytest API, also used by pytest-rerunfailures, to run the setup, call and teardown of a test without
+    # reporting them. Retries are disabled if a pytest version no longer provides it
+    from _pytest.runner import runtestprotocol
+except ImportError:
+    runtestprotocol = None
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("testrunner")
+    group.addoption("--max-retries", action="store", type=int, default=None,
+                    help="times a failed test is retried on a fresh driver, overrides retry.max_retries")
+    group.addoption("--flake-stats-file", action="store", default=None,
+                    help="write the flake statistics of this session to this file instead of retry.stats_file")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "flaky(retries=N): retry this test N times after any failure")
+    retry_config = env.get("retry") or {}
+    config.testrunner_retry = retry_config if retry_config.get("enabled", False) else None
+    config.testrunner_flakes = FlakeStatistics()
+    if runtestprotocol is None:
+        logger.warning("Test retries are disabled, this pytest version has no _pytest.runner.runtestprotocol")
+
+
+def pytest_collection_modifyitems(config, items):
+    statistics = config.testrunner_flakes
+    action = ((env.get("retry") or {}).get("quarantine") or {}).get("action", "xfail")
+    for item in items:
+        if not statistics.is_quarantined(item.nodeid):
+            continue
+        reason = "quarantined, flake rate {:.0%}".format(statistics.flake_rate(item.nodeid))
+        if action == "skip":
+            item.add_marker(pytest.mark.skip(reason=reason))
+        else:
+            item.add_marker(pytest.mark.xfail(reason=reason, strict=False))
+
+
+def __max_retries__(item):
+    marker = item.get_closest_marker("flaky")
+    if marker is not None:
+        return int(marker.kwargs.get("retries", marker.args[0] if len(marker.args) > 0 else 1))
+    if item.config.testrunner_retry is None:
+        return 0
+    option = item.config.getoption("max_retries")
+    return int(option if option is not None else item.config.testrunner_retry.get("max_retries", 0))
+
+
+def __is_retriable__(item, report):
+    # Tests marked as flaky retry any failure, the rest only the exception types listed in retry.retry_on
+    if item.get_closest_marker("flaky") is not None:
+        return True
+    retry_on = item.config.testrunner_retry.get("retry_on") or []
+    exception_names = getattr(report, "testrunner_exception_names", [])
+    return len(retry_on) == 0 or any(name in exception_names for name in retry_on)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    if call.excinfo is not None:
+        report.testrunner_exception_names = [cls.__name__ for cls in call.excinfo.type.__mro__]
+    # The driver fixture discards the driver of a failed test instead of returning it to the pool
+    if report.failed and report.when in ("setup", "call"):
+        item.testrunner_failed = True
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_protocol(item, nextitem):
+    max_retries = __max_retries__(item)
+    if runtestprotocol is None or (max_retries <= 0 and item.config.testrunner_retry is None):
+        return None
+
+    item.ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+    attempt = 0
+    while True:
+        attempt += 1
+        item.testrunner_failed = False
+        reports = runtestprotocol(item, nextitem=nextitem, log=False)
+        failed = [report for report in reports if report.failed]
+        if len(failed) > 0 and attempt <= max_retries and any(__is_retriable__(item, report) for report in failed):
+            logger.warning("Retrying {} after failed attempt {} of {}".format(item.nodeid, attempt, max_retries + 1))
+            # Every failure of the attempt is reported, e.g. a teardown error after the failed call
+            for report in failed:
+                report.outcome = "rerun"
+                report.testrunner_attempt = attempt
+                item.ihook.pytest_runtest_logreport(report=report)
+            continue
+        for report in reports:
+            item.ihook.pytest_runtest_logreport(report=report)
+        break
+    item.ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+
+    # An expected failure, e.g. of a quarantined test, is reported as skipped but counts as failed
+    passed = len(failed) == 0 and not any(report.skipped and hasattr(report, "wasxfail") for report in reports)
+    item.config.testrunner_flakes.record(item.nodeid, attempt, passed)
+    return True
+
+
+def pytest_report_teststatus(report):
+    if report.outcome == "rerun":
+        return "rerun", "R", ("RERUN", {"yellow": True})
+
+
+def pytest_terminal_summary(terminalreporter):
+    reruns = terminalreporter.stats.get("rerun", [])
+    if len(reruns) > 0:
+        attempts = set((report.nodeid, getattr(report, "testrunner_attempt", 0)) for report in reruns)
+        terminalreporter.write_sep("=", "{} failed attempts retried".format(len(attempts)), yellow=True)
+        for report in reruns:
+            terminalreporter.write_line("RERUN {} ({})".format(report.nodeid, report.when))
+
+
+def pytest_unconfigure(config):
+    statistics = getattr(config, "testrunner_flakes", None)
+    if statistics is not None and len(statistics.session) > 0:
+        statistics.save(config.getoption("flake_stats_file"))
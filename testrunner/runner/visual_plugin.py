@@ -0,0 +1,35 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+from testrunner.util.visual_checker import VisualChecker
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    if call.when != "call":
+        return
+    # Visual checks run in the background while the test goes on; their failures are reported with the test
+    failures = VisualChecker.collect(item.nodeid)
+    report = outcome.get_result()
+    if len(failures) > 0 and report.passed:
+        report.outcome = "failed"
+        report.longrepr = VisualChecker.describe(failures)
+    elif len(failures) > 0:
+        report.sections.append(("visual checks", VisualChecker.describe(failures)))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    VisualChecker.shutdown()
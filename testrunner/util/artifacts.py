@@ -0,0 +1,141 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import base64
+import gzip
+import json
+import os
+import os.path
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium.common.exceptions import WebDriverException
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+
+
+class ArtifactCollector:
+    """
+    Captures diagnostics of a failing test: screenshot, page source and browser console log. Only the driver calls
+    run on the test thread; decoding, compressing and writing the files happens in a background thread pool with a
+    bounded number of pending jobs and a disk quota for the artifacts directory. When either limit is reached new
+    artifacts are dropped instead of slowing the suite down.
+    """
+
+    def __init__(self, artifacts_config: dict = None):
+        artifacts_config = artifacts_config if artifacts_config is not None else (env.get("artifacts") or {})
+        self.enabled = bool(artifacts_config.get("enabled", False))
+        self.output_dir = artifacts_config.get("output_dir", os.path.join("log", "artifacts"))
+        self.capture = {name: bool(artifacts_config.get(name, True))
+                        for name in ("screenshot", "page_source", "browser_log")}
+        self.quota = int(float(artifacts_config.get("disk_quota_mb", 500)) * 1024 * 1024)
+        self.__pending = threading.BoundedSemaphore(int(artifacts_config.get("max_pending", 16)))
+        self.__executor = ThreadPoolExecutor(max_workers=int(artifacts_config.get("workers", 2)),
+                                             thread_name_prefix="artifacts") if self.enabled else None
+        self.__lock = threading.Lock()
+        self.__used = None
+        self.dropped = 0
+
+    @staticmethod
+    def __directory_size__(directory: str):
+        total = 0
+        for root, _, files in os.walk(directory):
+            for file_name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, file_name))
+                except OSError:
+                    pass
+        return total
+
+    def __drop__(self):
+        # Both the test thread and the writer threads drop artifacts
+        with self.__lock:
+            self.dropped += 1
+
+    def __reserve__(self, size: int):
+        with self.__lock:
+            if self.__used is None:
+                self.__used = ArtifactCollector.__directory_size__(self.output_dir)
+            if self.__used + size > self.quota:
+                self.dropped += 1
+                return False
+            self.__used += size
+            return True
+
+    def collect(self, driver, test_id: str):
+        """
+        Captures the artifacts of a driver and schedules them to be written. Returns immediately if the collector is
+        disabled or too many artifacts are pending
+        :param driver: WebDriver used by the failing test
+        :param test_id: pytest node id, used as the name of the artifact directory
+        :return: directory where the artifacts will be written, or None if they are not captured
+        """
+        if not self.enabled or driver is None:
+            return None
+        if not self.__pending.acquire(blocking=False):
+            self.__drop__()
+            logger.warning(__class__.__name__ + ": too many pending artifacts, skipping '{}'".format(test_id))
+            return None
+
+        raw = {}
+        try:
+            if self.capture['screenshot']:
+                raw['screenshot'] = driver.get_screenshot_as_base64()
+            if self.capture['page_source']:
+                raw['page_source'] = driver.page_source
+            if self.capture['browser_log']:
+                try:
+                    raw['browser_log'] = driver.get_log("browser")
+                except (WebDriverException, ValueError):
+                    # Not every driver exposes the browser console log
+                    pass
+        except WebDriverException:
+            logger.exception(__class__.__name__ + ": error capturing artifacts for '{}'".format(test_id))
+            if len(raw) == 0:
+                self.__pending.release()
+                return None
+
+        directory = os.path.join(self.output_dir, re.sub(r"[^\w.-]+", "_", test_id))
+        future = self.__executor.submit(self.__write__, directory, raw)
+        future.add_done_callback(lambda _: self.__pending.release())
+        return directory
+
+    def __write__(self, directory: str, raw: dict):
+        files = {}
+        if 'screenshot' in raw:
+            files['screenshot.png'] = base64.b64decode(raw['screenshot'])
+        if 'page_source' in raw:
+            files['page_source.html.gz'] = gzip.compress(raw['page_source'].encode("utf-8"), compresslevel=5)
+        if 'browser_log' in raw:
+            files['browser_log.json.gz'] = gzip.compress(json.dumps(raw['browser_log']).encode("utf-8"))
+
+        if not self.__reserve__(sum(len(content) for content in files.values())):
+            logger.warning(__class__.__name__ + ": disk quota exceeded, artifacts not written to '{}'".format(
+                directory))
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for file_name, content in files.items():
+                with open(os.path.join(directory, file_name), 'wb') as fd:
+                    fd.write(content)
+        except Exception:
+            logger.exception(__class__.__name__ + ": error writing artifacts to '{}'".format(directory))
+
+    def shutdown(self):
+        """
+        Waits until every pending artifact is written
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True)
@@ -0,0 +1,219 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import bisect
+import csv
+import json
+import os
+import os.path
+import threading
+import time
+from contextlib import contextmanager
+
+from config.configuration import env
+
+
+class PerformanceRecorder:
+    """
+    Collects timings of the runner: latency histogram and round-trip count per WebDriver command, and time spent
+    per phase (driver creation, navigation, pytest setup/call/teardown...) for every test.
+    Enabled by instrumentation.enabled in config.yaml; when disabled, every method is a no-op.
+    """
+
+    # Upper bounds, in milliseconds, of the latency histogram buckets
+    __buckets__ = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+    __background__ = "<background>"
+    __session__ = "<session>"
+
+    __lock__ = threading.Lock()
+    __enabled__ = None
+    __current_test__ = None
+    __commands__ = {}
+    __tests__ = {}
+
+    @staticmethod
+    def settings():
+        return env.get("instrumentation") or {}
+
+    @staticmethod
+    def enabled():
+        if PerformanceRecorder.__enabled__ is None:
+            PerformanceRecorder.__enabled__ = bool(PerformanceRecorder.settings().get("enabled", False))
+        return PerformanceRecorder.__enabled__
+
+    @staticmethod
+    def set_current_test(node_id: str = None):
+        PerformanceRecorder.__current_test__ = node_id
+
+    @staticmethod
+    def __test_entry__():
+        # Work done by other threads, like driver pre-warming, is not charged to the running test
+        if threading.current_thread() is not threading.main_thread():
+            node_id = PerformanceRecorder.__background__
+        else:
+            node_id = PerformanceRecorder.__current_test__ or PerformanceRecorder.__session__
+        entry = PerformanceRecorder.__tests__.get(node_id)
+        if entry is None:
+            entry = PerformanceRecorder.__tests__[node_id] = {'phases': {}, 'commands': {}, 'round_trips': 0}
+        return entry
+
+    @staticmethod
+    def record_phase(phase: str, duration: float):
+        if not PerformanceRecorder.enabled():
+            return
+        with PerformanceRecorder.__lock__:
+            phases = PerformanceRecorder.__test_entry__()['phases']
+            phases[phase] = phases.get(phase, 0.0) + duration
+
+    @staticmethod
+    def record_command(command: str, duration: float):
+        if not PerformanceRecorder.enabled():
+            return
+        milliseconds = duration * 1000
+        with PerformanceRecorder.__lock__:
+            stats = PerformanceRecorder.__commands__.get(command)
+            if stats is None:
+                stats = PerformanceRecorder.__commands__[command] = {
+                    'count': 0, 'total': 0.0, 'max': 0.0, 'histogram': [0] * (len(PerformanceRecorder.__buckets__) + 1)}
+            stats['count'] += 1
+            stats['total'] += milliseconds
+            stats['max'] = max(stats['max'], milliseconds)
+            stats['histogram'][bisect.bisect_left(PerformanceRecorder.__buckets__, milliseconds)] += 1
+
+            entry = PerformanceRecorder.__test_entry__()
+            entry['round_trips'] += 1
+            entry['commands'][command] = entry['commands'].get(command, 0) + 1
+
+    @staticmethod
+    @contextmanager
+    def measure(phase: str):
+        """
+        Context manager which adds the time spent in its block to a phase of the current test
+        """
+        if not PerformanceRecorder.enabled():
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            PerformanceRecorder.record_phase(phase, time.perf_counter() - start)
+
+    @staticmethod
+    def instrument_driver(driver):
+        """
+        Wraps WebDriver.execute of a driver instance, which every driver and element command goes through, to
+        record the latency of each command
+        """
+        if not PerformanceRecorder.enabled() or getattr(driver, "__instrumented__", False):
+            return driver
+        execute = driver.execute
+
+        def timed_execute(driver_command, params=None):
+            start = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                PerformanceRecorder.record_command(driver_command, time.perf_counter() - start)
+
+        driver.execute = timed_execute
+        driver.__instrumented__ = True
+        return driver
+
+    @staticmethod
+    def __percentile__(stats: dict, percentile: float):
+        # Approximated as the upper bound of the bucket where the percentile falls
+        target = stats['count'] * percentile
+        accumulated = 0
+        for index, count in enumerate(stats['histogram']):
+            accumulated += count
+            if accumulated >= target and count > 0:
+                return PerformanceRecorder.__buckets__[index] if index < len(PerformanceRecorder.__buckets__) \
+                    else stats['max']
+        return stats['max']
+
+    @staticmethod
+    def recorded():
+        """
+        :return: True if any WebDriver command was recorded; without them the report only repeats pytest durations
+        """
+        with PerformanceRecorder.__lock__:
+            return len(PerformanceRecorder.__commands__) > 0
+
+    @staticmethod
+    def command_summary():
+        """
+        :return: list of per-command statistics (milliseconds), slowest total time first
+        """
+        summary = []
+        for command, stats in PerformanceRecorder.__commands__.items():
+            summary.append({'command': command, 'count': stats['count'], 'total_ms': round(stats['total'], 3),
+                            'mean_ms': round(stats['total'] / stats['count'], 3), 'max_ms': round(stats['max'], 3),
+                            'p50_ms': PerformanceRecorder.__percentile__(stats, 0.5),
+                            'p95_ms': PerformanceRecorder.__percentile__(stats, 0.95),
+                            'histogram': dict(zip([str(bound) for bound in PerformanceRecorder.__buckets__] + ["inf"],
+                                                  stats['histogram']))})
+        return sorted(summary, key=lambda item: item['total_ms'], reverse=True)
+
+    @staticmethod
+    def test_summary():
+        """
+        :return: list of per-test phase breakdowns (seconds) and round trips, slowest first
+        """
+        summary = []
+        for node_id, entry in PerformanceRecorder.__tests__.items():
+            phases = {phase: round(duration, 6) for phase, duration in entry['phases'].items()}
+            total = sum(duration for phase, duration in phases.items() if phase in ("setup", "call", "teardown"))
+            summary.append({'test': node_id, 'total_s': round(total, 6), 'round_trips': entry['round_trips'],
+                            'phases': phases, 'commands': dict(entry['commands'])})
+        return sorted(summary, key=lambda item: item['total_s'], reverse=True)
+
+    @staticmethod
+    def write_report(report_dir: str = None, suffix: str = ""):
+        """
+        Writes performance{suffix}.json with the full report, and commands{suffix}.csv and tests{suffix}.csv
+        :return: path of the JSON report, or None if instrumentation is disabled
+        """
+        if not PerformanceRecorder.enabled():
+            return None
+        report_dir = report_dir or PerformanceRecorder.settings().get("report_dir", os.path.join("log", "performance"))
+        os.makedirs(report_dir, exist_ok=True)
+        commands = PerformanceRecorder.command_summary()
+        tests = PerformanceRecorder.test_summary()
+
+        json_path = os.path.join(report_dir, "performance{}.json".format(suffix))
+        with open(json_path, 'wt') as fd:
+            json.dump({'commands': commands, 'tests': tests}, fd, indent=2)
+
+        with open(os.path.join(report_dir, "commands{}.csv".format(suffix)), 'wt', newline='') as fd:
+            writer = csv.writer(fd)
+            writer.writerow(["command", "count", "total_ms", "mean_ms", "p50_ms", "p95_ms", "max_ms"])
+            for item in commands:
+                writer.writerow([item['command'], item['count'], item['total_ms'], item['mean_ms'], item['p50_ms'],
+                                 item['p95_ms'], item['max_ms']])
+
+        phase_names = sorted(set(phase for item in tests for phase in item['phases']))
+        with open(os.path.join(report_dir, "tests{}.csv".format(suffix)), 'wt', newline='') as fd:
+            writer = csv.writer(fd)
+            writer.writerow(["test", "total_s", "round_trips"] + phase_names)
+            for item in tests:
+                writer.writerow([item['test'], item['total_s'], item['round_trips']] +
+                                [item['phases'].get(phase, 0.0) for phase in phase_names])
+        return json_path
+
+    @staticmethod
+    def reset():
+        with PerformanceRecorder.__lock__:
+            PerformanceRecorder.__commands__ = {}
+            PerformanceRecorder.__tests__ = {}
+            PerformanceRecorder.__current_test__ = None
@@ -0,0 +1,130 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+import json
+import logging
+import logging.handlers
+import threading
+import time
+
+
+class LogContext:
+    """
+    Values attached to every log record by ContextFilter: the running test and the driver session it uses
+    """
+
+    test_id = None
+    session_id = None
+
+    @staticmethod
+    def set(**values):
+        for key, value in values.items():
+            setattr(LogContext, key, value)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds test_id, session_id and worker_id attributes to log records. It must run on the thread which logs, so with
+    queue logging it is attached to the QueueHandler
+    """
+
+    def __init__(self, worker_id: str = None):
+        super().__init__()
+        self.worker_id = worker_id
+
+    def filter(self, record):
+        if not hasattr(record, "test_id"):
+            record.test_id = LogContext.test_id
+            record.session_id = LogContext.session_id
+            record.worker_id = self.worker_id
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most max_repeats records with the same logger, level and message template per interval
+    seconds. The next record let through after a suppression reports how many similar records were dropped
+    """
+
+    def __init__(self, interval: float = 10, max_repeats: int = 5):
+        super().__init__()
+        self.interval = float(interval)
+        self.max_repeats = int(max_repeats)
+        self.__lock = threading.Lock()
+        self.__windows = {}
+
+    def filter(self, record):
+        # A record reaching several handlers or loggers sharing this filter is only counted once
+        decision = getattr(record, "rate_limit_passed", None)
+        if decision is not None:
+            return decision
+        record.rate_limit_passed = self.__decide__(record)
+        return record.rate_limit_passed
+
+    def __decide__(self, record):
+        key = (record.name, record.levelno, record.msg if isinstance(record.msg, str) else repr(record.msg))
+        now = time.monotonic()
+        with self.__lock:
+            window_start, count, suppressed = self.__windows.get(key, (now, 0, 0))
+            if now - window_start >= self.interval:
+                window_start, count = now, 0
+            if count >= self.max_repeats:
+                self.__windows[key] = (window_start, count, suppressed + 1)
+                return False
+            self.__windows[key] = (window_start, count + 1, 0)
+        if suppressed > 0:
+            record.msg = "{} (suppressed {} similar messages)".format(record.msg, suppressed)
+        return True
+
+
+class TracebackQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for a QueueListener of the same process. The base class formats the record with its own formatter
+    and drops the exception, so the handlers behind the listener can not format it their way. Here only the message
+    arguments are merged and the traceback is rendered to exc_text, which every formatter prints
+    """
+
+    __formatter__ = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # Arguments may be mutable objects, which could change before the listener thread formats the record
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks keep every frame of the stack alive until the record is written
+            record.exc_text = record.exc_text or TracebackQueueHandler.__formatter__.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as single line JSON objects, including the attributes added by ContextFilter
+    """
+
+    __fields__ = ("test_id", "session_id", "worker_id", "process", "threadName", "funcName")
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+                 'message': record.getMessage()}
+        for field in JsonFormatter.__fields__:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
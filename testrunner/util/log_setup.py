@@ -1,4 +1,4 @@
-# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org]
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
 #
 # Licensed under the Apache License, Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -12,31 +12,104 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
 import os
 import logging
 import logging.config
+import logging.handlers
+import queue
+import threading
 import yaml
 from config.configuration import env
+from testrunner.util.log_handlers import ContextFilter, RateLimitFilter, TracebackQueueHandler
 
-__log_cfg_path = env.get("log_config_path")
-__default_level = env.get("log_default_level")
-__env = env.get('environment')
+__lock = threading.Lock()
+__logger = None
+__listener = None
 
 
 def get_basic_logger(default_level=logging.INFO):
-    logging.basicConfig(default_level)
+    logging.basicConfig(level=default_level)
     logger = logging.getLogger(__name__)
     return logger
 
 
-def get_logger(path=__log_cfg_path, default_level=__default_level):
-    if os.path.exists(path):
+def __create_log_dirs(yaml_config):
+    # File handlers fail to open their files if the log directory does not exist yet
+    for handler in (yaml_config.get('handlers') or {}).values():
+        if 'filename' in handler:
+            os.makedirs(os.path.dirname(handler['filename']) or ".", exist_ok=True)
+
+
+def __per_worker_files(yaml_config, worker_id):
+    # Every parallel worker writes its own files, e.g. log/out.log becomes log/out-worker-1.log
+    for handler in (yaml_config.get('handlers') or {}).values():
+        if 'filename' in handler:
+            base, extension = os.path.splitext(handler['filename'])
+            handler['filename'] = "{}-worker-{}{}".format(base, worker_id, extension)
+
+
+def __apply_runner_options(runner_config, worker_id):
+    """
+    Attaches the context and rate limit filters and, if enabled, moves every handler behind a QueueHandler whose
+    QueueListener writes the records in a background thread
+    """
+    global __listener
+    filters = [ContextFilter(worker_id)]
+    if runner_config.get('rate_limit'):
+        filters.append(RateLimitFilter(**runner_config['rate_limit']))
+
+    loggers = [logging.getLogger()] + [logging.getLogger(name) for name in logging.root.manager.loggerDict
+                                       if isinstance(logging.root.manager.loggerDict[name], logging.Logger)]
+    handlers = []
+    for logger_i in loggers:
+        for handler in logger_i.handlers:
+            if handler not in handlers:
+                handlers.append(handler)
+
+    if not runner_config.get('queue', False):
+        for handler in handlers:
+            for log_filter in filters:
+                handler.addFilter(log_filter)
+        return
+
+    queue_handler = TracebackQueueHandler(queue.SimpleQueue())
+    for log_filter in filters:
+        queue_handler.addFilter(log_filter)
+    for logger_i in loggers:
+        if len(logger_i.handlers) > 0:
+            logger_i.handlers = [queue_handler]
+    __listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    __listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    Flushes pending records when queue logging is enabled
+    """
+    global __listener
+    if __listener is not None:
+        __listener.stop()
+        __listener = None
+
+
+def get_logger(path=None, default_level=None):
+    path = path or env.get("log_config_path")
+    default_level = default_level or env.get("log_default_level") or logging.INFO
+    if path is not None and os.path.exists(path):
         with open(path, 'rt') as fd:
             try:
                 yaml_config = yaml.safe_load(fd.read())
+                runner_config = yaml_config.pop('testrunner', None) or {}
+                worker_id = os.environ.get("TESTRUNNER_WORKER_ID")
+                if worker_id is not None and runner_config.get('per_worker_files', False):
+                    __per_worker_files(yaml_config, worker_id)
+                __create_log_dirs(yaml_config)
                 logging.config.dictConfig(yaml_config)
-                logger = logging.getLogger(__env)
-                logger.setLevel(__default_level)
+                __apply_runner_options(runner_config, worker_id)
+                logger = logging.getLogger(env.get('environment'))
+                logger.setLevel(default_level)
                 return logger
             except Exception as e:
                 logger = get_basic_logger(default_level)
@@ -45,4 +118,26 @@ def get_logger(path=__log_cfg_path, default_level=__default_level):
     else:
         return get_basic_logger()
 
-logger = get_logger()
+
+def get_shared_logger():
+    """
+    Returns the runner logger, configuring it on first use
+    """
+    global __logger
+    if __logger is None:
+        with __lock:
+            if __logger is None:
+                __logger = get_logger()
+    return __logger
+
+
+class LazyLogger:
+    """
+    Stand-in for the runner logger which configures logging the first time it is used instead of at import time
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_shared_logger(), name)
+
+
+logger = LazyLogger()
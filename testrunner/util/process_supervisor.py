@@ -0,0 +1,482 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import atexit
+import json
+import os
+import os.path
+import signal
+import threading
+import time
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+
+try:
+    import psutil
+except ImportError:
+    # Optional: without psutil, process trees and memory are read from /proc, so supervision only works on Linux
+    psutil = None
+
+
+class ProcessSupervisor:
+    """
+    Tracks the process tree (driver binary and browser) of every driver launched by this process:
+        - admit() delays new drivers until the host has free memory and CPU, so parallel runs don't thrash. Every
+          admission reserves room for one driver until register() or withdraw(), so concurrent launches are counted
+        - a monitor thread samples RSS and CPU of every tree, and kills drivers which exceed
+          max_driver_memory_mb or stay leased to a test longer than max_lease_seconds
+        - every tree is killed at exit and on SIGTERM/SIGINT; trees left behind by a crashed run are reaped by the
+          next one, using the state file each process keeps in state_dir. Every process of a tree is recorded with
+          its name and start time, and is only killed if both still match, so reused PIDs are never killed
+    Configured in the 'process_supervisor' section of config.yaml; when disabled, every method is a no-op.
+    """
+
+    __lock__ = threading.RLock()
+    __drivers__ = {}
+    __reserved__ = 0
+    __monitor__ = None
+    __stop__ = threading.Event()
+    __installed__ = False
+    __previous_handlers__ = {}
+    __page_size__ = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+    __clock_ticks__ = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    @staticmethod
+    def settings():
+        return env.get("process_supervisor") or {}
+
+    @staticmethod
+    def enabled():
+        return bool(ProcessSupervisor.settings().get("enabled", False)) and \
+            (psutil is not None or os.path.isdir("/proc"))
+
+    # Process information, from psutil when available or /proc otherwise
+
+    @staticmethod
+    def __children__(pid: int):
+        if psutil is not None:
+            try:
+                return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+            except psutil.Error:
+                return []
+        parents = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                stat = ProcessSupervisor.__stat__(int(entry))
+                if stat is not None:
+                    parents.setdefault(int(stat[1]), []).append(int(entry))
+        tree, pending = [], list(parents.get(pid, []))
+        while len(pending) > 0:
+            child = pending.pop()
+            tree.append(child)
+            pending.extend(parents.get(child, []))
+        return tree
+
+    @staticmethod
+    def __stat__(pid: int):
+        # Fields of /proc/<pid>/stat after the command name, which may contain spaces: state, ppid, ...
+        try:
+            with open("/proc/{}/stat".format(pid), 'rt') as fd:
+                content = fd.read()
+            return content[content.rindex(")") + 2:].split()
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def __usage__(pid: int):
+        """
+        :return: tuple with resident memory in bytes and CPU seconds used by a process, or None if it is gone
+        """
+        if psutil is not None:
+            try:
+                process = psutil.Process(pid)
+                cpu = process.cpu_times()
+                return process.memory_info().rss, cpu.user + cpu.system
+            except psutil.Error:
+                return None
+        stat = ProcessSupervisor.__stat__(pid)
+        if stat is None:
+            return None
+        # utime and stime are fields 14 and 15 of stat, rss field 24; stat here starts at field 3
+        cpu = (int(stat[11]) + int(stat[12])) / ProcessSupervisor.__clock_ticks__
+        return int(stat[21]) * ProcessSupervisor.__page_size__, cpu
+
+    @staticmethod
+    def __process_name__(pid: int):
+        try:
+            if psutil is not None:
+                return psutil.Process(pid).name()
+            with open("/proc/{}/comm".format(pid), 'rt') as fd:
+                return fd.read().strip()
+        except Exception:
+            return None
+
+    @staticmethod
+    def __identity__(pid: int):
+        """
+        :return: list with the name and start time of a process, which together tell it apart from a later process
+        reusing its PID, or None if it is gone
+        """
+        if psutil is not None:
+            try:
+                process = psutil.Process(pid)
+                return [process.name(), process.create_time()]
+            except psutil.Error:
+                return None
+        stat = ProcessSupervisor.__stat__(pid)
+        name = ProcessSupervisor.__process_name__(pid)
+        if stat is None or name is None:
+            return None
+        # starttime is field 22 of stat, in clock ticks since boot
+        return [name, int(stat[19])]
+
+    @staticmethod
+    def __member__(pid: int, known: dict = None):
+        # Tree member as [pid, name, start time]; identities already known are reused instead of read again
+        if known is not None and pid in known:
+            return known[pid]
+        identity = ProcessSupervisor.__identity__(pid)
+        return [pid] + identity if identity is not None else None
+
+    @staticmethod
+    def __available_memory__():
+        if psutil is not None:
+            return psutil.virtual_memory().available
+        try:
+            with open("/proc/meminfo", 'rt') as fd:
+                for line in fd:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    @staticmethod
+    def __load_per_cpu__():
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            return 0.0
+
+    @staticmethod
+    def __kill_tree__(pid: int):
+        # Children first, so the driver binary can not respawn or reparent them
+        for child in reversed(ProcessSupervisor.__children__(pid)):
+            ProcessSupervisor.__kill__(child)
+        ProcessSupervisor.__kill__(pid)
+
+    @staticmethod
+    def __kill__(pid: int):
+        try:
+            os.kill(pid, signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+        except OSError:
+            pass
+
+    @staticmethod
+    def __kill_member__(member):
+        # Recorded members are only killed if they are still the same process, not one which reused the PID
+        if not isinstance(member, list) or len(member) != 3:
+            return False
+        if ProcessSupervisor.__identity__(member[0]) != member[1:]:
+            return False
+        ProcessSupervisor.__kill__(member[0])
+        return True
+
+    # Driver tracking
+
+    @staticmethod
+    def __driver_pid__(driver):
+        process = getattr(getattr(driver, "service", None), "process", None)
+        return getattr(process, "pid", None)
+
+    @staticmethod
+    def admit():
+        """
+        Blocks until the host has room for one more driver: available memory above min_free_memory_mb plus the
+        memory of an average driver for every admitted driver not registered yet, load per CPU below
+        max_load_per_cpu, and fewer than max_drivers drivers. Only drivers which launch local processes need
+        admission. On return, room for the driver is reserved until register() or withdraw() is called.
+        Raises an exception if there is no room after admission_timeout seconds
+        """
+        if not ProcessSupervisor.enabled():
+            return
+        settings = ProcessSupervisor.settings()
+        deadline = time.monotonic() + float(settings.get("admission_timeout", 300))
+        max_drivers = int(settings.get("max_drivers", 0))
+        max_load = float(settings.get("max_load_per_cpu", 0))
+        waited = False
+        while True:
+            # Checked and reserved under the lock, so concurrent admissions see each other
+            with ProcessSupervisor.__lock__:
+                tracked = list(ProcessSupervisor.__drivers__.values())
+                reserved = ProcessSupervisor.__reserved__
+                sampled = [entry['rss'] for entry in tracked if entry['rss'] > 0]
+                expected = sum(sampled) / len(sampled) if len(sampled) > 0 \
+                    else float(settings.get("estimated_driver_memory_mb", 300)) * 1024 * 1024
+                available = ProcessSupervisor.__available_memory__()
+                load = ProcessSupervisor.__load_per_cpu__()
+                reasons = []
+                if max_drivers > 0 and len(tracked) + reserved >= max_drivers:
+                    reasons.append("{} drivers running, {} starting".format(len(tracked), reserved))
+                if available is not None and available - expected * (reserved + 1) < \
+                        float(settings.get("min_free_memory_mb", 0)) * 1024 * 1024:
+                    reasons.append("{} MB available, {} drivers starting".format(int(available / 1024 / 1024),
+                                                                                  reserved))
+                if max_load > 0 and load > max_load:
+                    reasons.append("load {:.2f} per CPU".format(load))
+                if len(reasons) == 0:
+                    ProcessSupervisor.__reserved__ += 1
+                    return
+            if time.monotonic() > deadline:
+                raise Exception("No resources to start a driver: " + ", ".join(reasons))
+            if not waited:
+                logger.info(__class__.__name__ + ": waiting for resources to start a driver ({})"
+                            .format(", ".join(reasons)))
+                waited = True
+            time.sleep(float(settings.get("sample_interval", 2)))
+
+    @staticmethod
+    def withdraw():
+        """
+        Releases the room reserved by admit() when the driver could not be launched
+        """
+        with ProcessSupervisor.__lock__:
+            ProcessSupervisor.__reserved__ = max(0, ProcessSupervisor.__reserved__ - 1)
+
+    @staticmethod
+    def register(driver):
+        """
+        Starts supervising the process tree of a driver launched by this process after admit(), releasing its
+        reservation. Drivers without a local process are not supervised
+        :param driver: WebDriver or AsyncWebDriver instance
+        """
+        ProcessSupervisor.withdraw()
+        pid = ProcessSupervisor.__driver_pid__(driver)
+        if pid is None or not ProcessSupervisor.enabled():
+            return
+        ProcessSupervisor.install()
+        member = ProcessSupervisor.__member__(pid)
+        with ProcessSupervisor.__lock__:
+            ProcessSupervisor.__drivers__[pid] = {
+                'name': member[1] if member is not None else None, 'started': time.monotonic(), 'leases': {},
+                'rss': 0, 'cpu_time': 0.0, 'cpu_percent': 0.0, 'sampled': None,
+                'tree': [member] if member is not None else []}
+            ProcessSupervisor.__save_state__()
+
+    @staticmethod
+    def lease(driver, test_id: str):
+        """
+        Records that a test is using a driver, so it is killed if the test runs longer than max_lease_seconds
+        """
+        pid = ProcessSupervisor.__driver_pid__(driver)
+        with ProcessSupervisor.__lock__:
+            if pid in ProcessSupervisor.__drivers__:
+                ProcessSupervisor.__drivers__[pid]['leases'][test_id] = time.monotonic()
+
+    @staticmethod
+    def release(driver, test_id: str):
+        pid = ProcessSupervisor.__driver_pid__(driver)
+        with ProcessSupervisor.__lock__:
+            if pid in ProcessSupervisor.__drivers__:
+                ProcessSupervisor.__drivers__[pid]['leases'].pop(test_id, None)
+
+    @staticmethod
+    def unregister(driver):
+        """
+        Stops supervising a driver, killing whatever is left of its process tree after quit(). Processes are only
+        killed if their name and start time still match the last sample
+        """
+        pid = ProcessSupervisor.__driver_pid__(driver)
+        with ProcessSupervisor.__lock__:
+            entry = ProcessSupervisor.__drivers__.pop(pid, None)
+            ProcessSupervisor.__save_state__()
+        if entry is not None:
+            for member in reversed(entry['tree']):
+                if member[0] != pid:
+                    ProcessSupervisor.__kill_member__(member)
+
+    @staticmethod
+    def tree_memory(pid: int):
+        """
+        :return: resident memory in bytes of a process and all its descendants, whether supervised or not
+        """
+        usages = [ProcessSupervisor.__usage__(member) for member in [pid] + ProcessSupervisor.__children__(pid)]
+        return sum(usage[0] for usage in usages if usage is not None)
+
+    @staticmethod
+    def metrics():
+        """
+        :return: RSS in bytes, CPU percentage and active leases of every supervised driver, by driver PID
+        """
+        with ProcessSupervisor.__lock__:
+            return {pid: {'rss': entry['rss'], 'cpu_percent': entry['cpu_percent'], 'processes': len(entry['tree']),
+                          'leases': list(entry['leases'].keys())}
+                    for pid, entry in ProcessSupervisor.__drivers__.items()}
+
+    # Monitoring
+
+    @staticmethod
+    def sample():
+        """
+        Samples every supervised tree and kills the ones over their limits. Called periodically by the monitor thread
+        """
+        settings = ProcessSupervisor.settings()
+        max_memory = float(settings.get("max_driver_memory_mb", 0)) * 1024 * 1024
+        max_lease = float(settings.get("max_lease_seconds", 0))
+        now = time.monotonic()
+        with ProcessSupervisor.__lock__:
+            pids = list(ProcessSupervisor.__drivers__.keys())
+
+        for pid in pids:
+            with ProcessSupervisor.__lock__:
+                entry = ProcessSupervisor.__drivers__.get(pid)
+                known = {member[0]: member for member in entry['tree']} if entry is not None else {}
+            tree = [member for member in (ProcessSupervisor.__member__(member_pid, known) for member_pid in
+                                          [pid] + ProcessSupervisor.__children__(pid)) if member is not None]
+            usages = [usage for usage in (ProcessSupervisor.__usage__(member[0]) for member in tree)
+                      if usage is not None]
+            with ProcessSupervisor.__lock__:
+                entry = ProcessSupervisor.__drivers__.get(pid)
+                if entry is None:
+                    continue
+                if len(usages) == 0:
+                    # The driver is gone without unregister(), e.g. it crashed
+                    ProcessSupervisor.__drivers__.pop(pid, None)
+                    continue
+                cpu_time = sum(usage[1] for usage in usages)
+                if entry['sampled'] is not None and now > entry['sampled']:
+                    entry['cpu_percent'] = 100.0 * (cpu_time - entry['cpu_time']) / (now - entry['sampled'])
+                entry.update(tree=tree, rss=sum(usage[0] for usage in usages), cpu_time=cpu_time, sampled=now)
+                oldest_lease = min(entry['leases'].values()) if len(entry['leases']) > 0 else None
+
+            reason = None
+            if max_memory > 0 and entry['rss'] > max_memory:
+                reason = "uses {} MB".format(int(entry['rss'] / 1024 / 1024))
+            elif max_lease > 0 and oldest_lease is not None and now - oldest_lease > max_lease:
+                reason = "leased for {}s by {}".format(int(now - oldest_lease), ", ".join(entry['leases'].keys()))
+            if reason is not None:
+                logger.warning(__class__.__name__ + ": killing driver {} ({}), it {}".format(
+                    pid, entry['name'], reason))
+                ProcessSupervisor.__kill_tree__(pid)
+                with ProcessSupervisor.__lock__:
+                    ProcessSupervisor.__drivers__.pop(pid, None)
+        with ProcessSupervisor.__lock__:
+            ProcessSupervisor.__save_state__()
+
+    @staticmethod
+    def __run_monitor__():
+        interval = float(ProcessSupervisor.settings().get("sample_interval", 2))
+        while not ProcessSupervisor.__stop__.wait(interval):
+            try:
+                ProcessSupervisor.sample()
+            except Exception:
+                logger.exception(__class__.__name__ + ": error sampling driver processes")
+
+    # Cleanup
+
+    @staticmethod
+    def __state_file__(pid: int = None):
+        state_dir = ProcessSupervisor.settings().get("state_dir", os.path.join(".cache", "supervisor"))
+        return os.path.join(state_dir, "{}.json".format(pid if pid is not None else os.getpid()))
+
+    @staticmethod
+    def __save_state__():
+        # Lets a later run reap the trees of this process if it dies without cleaning up
+        state = {str(pid): {'name': entry['name'], 'tree': entry['tree']}
+                 for pid, entry in ProcessSupervisor.__drivers__.items()}
+        path = ProcessSupervisor.__state_file__()
+        try:
+            if len(state) == 0:
+                if os.path.isfile(path):
+                    os.remove(path)
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wt') as fd:
+                json.dump(state, fd)
+        except OSError:
+            logger.exception(__class__.__name__ + ": error saving state to '{}'".format(path))
+
+    @staticmethod
+    def reap_orphans():
+        """
+        Kills the driver trees recorded by runs which are no longer alive. Processes whose name or start time changed
+        since they were recorded are left alone, as their PID was reused
+        """
+        state_dir = os.path.dirname(ProcessSupervisor.__state_file__())
+        if not os.path.isdir(state_dir):
+            return
+        for file_name in os.listdir(state_dir):
+            owner = file_name.split(".")[0]
+            if not owner.isdigit() or int(owner) == os.getpid() or ProcessSupervisor.__usage__(int(owner)) is not None:
+                continue
+            path = os.path.join(state_dir, file_name)
+            try:
+                with open(path, 'rt') as fd:
+                    state = json.load(fd)
+                for pid, entry in state.items():
+                    killed = [member[0] for member in reversed(entry['tree'])
+                              if ProcessSupervisor.__kill_member__(member)]
+                    if len(killed) > 0:
+                        logger.warning(__class__.__name__ + ": reaped processes {} of driver {} left by process {}"
+                                       .format(killed, pid, owner))
+                os.remove(path)
+            except Exception:
+                logger.exception(__class__.__name__ + ": error reaping processes from '{}'".format(path))
+
+    @staticmethod
+    def shutdown():
+        """
+        Stops monitoring and kills every supervised tree still alive
+        """
+        ProcessSupervisor.__stop__.set()
+        with ProcessSupervisor.__lock__:
+            pids = list(ProcessSupervisor.__drivers__.keys())
+            ProcessSupervisor.__drivers__.clear()
+            ProcessSupervisor.__save_state__()
+        for pid in pids:
+            ProcessSupervisor.__kill_tree__(pid)
+
+    @staticmethod
+    def __on_signal__(signum, frame):
+        ProcessSupervisor.shutdown()
+        previous = ProcessSupervisor.__previous_handlers__.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    @staticmethod
+    def install():
+        """
+        Reaps trees left by previous runs, and starts the monitor thread and the exit and signal handlers. Done on
+        the first register() at the latest, but signal handlers can only be installed from the main thread, so call
+        it from there before drivers are launched in other threads
+        """
+        if not ProcessSupervisor.enabled():
+            return
+        with ProcessSupervisor.__lock__:
+            if ProcessSupervisor.__installed__:
+                return
+            ProcessSupervisor.__installed__ = True
+        ProcessSupervisor.reap_orphans()
+        atexit.register(ProcessSupervisor.shutdown)
+        # Signal handlers can only be installed from the main thread, e.g. not by the driver pre-warmer
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                ProcessSupervisor.__previous_handlers__[signum] = signal.getsignal(signum)
+                signal.signal(signum, ProcessSupervisor.__on_signal__)
+        ProcessSupervisor.__monitor__ = threading.Thread(target=ProcessSupervisor.__run_monitor__,
+                                                         name="process-supervisor", daemon=True)
+        ProcessSupervisor.__monitor__.start()
@@ -0,0 +1,143 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import os.path
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from testrunner.util.log_setup import logger
+from config.configuration import env
+from testrunner.util.visual_diff import BaselineStore, VisualDiff
+
+
+class VisualMismatch(AssertionError):
+    """
+    Raised when a screenshot does not match its baseline
+    """
+    pass
+
+
+class VisualChecker:
+    """
+    Runs visual checks in a process pool, so decoding and diffing screenshots overlaps with the test instead of
+    adding to its duration. Checks are grouped by test id; the visual pytest plugin waits for the checks of a test
+    when its call phase ends and fails the test if any of them did not match.
+    Configured in the 'visual' section of config.yaml.
+    """
+
+    __lock__ = threading.Lock()
+    __executor__ = None
+    __pending__ = {}
+
+    @staticmethod
+    def settings():
+        return env.get("visual") or {}
+
+    @staticmethod
+    def __get_executor__():
+        with VisualChecker.__lock__:
+            if VisualChecker.__executor__ is None:
+                workers = int(VisualChecker.settings().get("workers", 0)) or None
+                VisualChecker.__executor__ = ProcessPoolExecutor(max_workers=workers)
+            return VisualChecker.__executor__
+
+    @staticmethod
+    def __run__(name: str, png: bytes, options: dict):
+        # Runs in a worker process: looks up the baseline, compares and writes the diff image
+        store = BaselineStore(options['baseline_dir'])
+        digest, baseline = store.get(name)
+        if baseline is None or options['update_baselines']:
+            store.put(name, png)
+            return {'name': name, 'match': True, 'reason': "baseline recorded", 'diff_path': None}
+
+        result = VisualDiff.compare(baseline, png, options['tolerance'], options['pixel_tolerance'],
+                                    options['ignore_regions'])
+        result['name'] = name
+        result['baseline'] = digest
+        result['diff_path'] = None
+        diff_png = result.pop('diff_png')
+        if not result['match']:
+            safe_name = "".join(char if char.isalnum() or char in "-_." else "_" for char in name)
+            result['diff_path'] = os.path.join(options['diff_dir'], safe_name + ".diff.png")
+            os.makedirs(options['diff_dir'], exist_ok=True)
+            with open(os.path.join(options['diff_dir'], safe_name + ".actual.png"), 'wb') as fd:
+                fd.write(png)
+            if diff_png is not None:
+                with open(result['diff_path'], 'wb') as fd:
+                    fd.write(diff_png)
+        return result
+
+    @staticmethod
+    def submit(test_id: str, name: str, png: bytes, tolerance: float = None, pixel_tolerance: int = None,
+               ignore_regions: list = None):
+        """
+        Schedules the comparison of a screenshot with the baseline of a check. The baseline is recorded if it does
+        not exist yet or visual.update_baselines is set
+        :param test_id: pytest node id of the running test, or None to wait for the result explicitly
+        :param name: check name, unique in the suite, used as baseline key
+        :param png: screenshot, PNG encoded
+        :param tolerance: fraction of pixels allowed to differ, visual.tolerance by default
+        :param pixel_tolerance: channel difference for pixels considered equal, visual.pixel_tolerance by default
+        :param ignore_regions: list of (x, y, width, height) in screenshot pixels left out of the comparison
+        :return: Future with the result of VisualDiff.compare, without image data and with 'diff_path'
+        """
+        settings = VisualChecker.settings()
+        options = {
+            'baseline_dir': settings.get("baseline_dir", os.path.join("test", "baselines")),
+            'diff_dir': settings.get("diff_dir", os.path.join("log", "visual")),
+            'update_baselines': bool(settings.get("update_baselines", False)),
+            'tolerance': float(tolerance if tolerance is not None else settings.get("tolerance", 0.0)),
+            'pixel_tolerance': int(pixel_tolerance if pixel_tolerance is not None
+                                   else settings.get("pixel_tolerance", 0)),
+            'ignore_regions': [tuple(region) for region in ignore_regions or []],
+        }
+        future = VisualChecker.__get_executor__().submit(VisualChecker.__run__, name, png, options)
+        if test_id is not None:
+            with VisualChecker.__lock__:
+                VisualChecker.__pending__.setdefault(test_id, []).append(future)
+        return future
+
+    @staticmethod
+    def collect(test_id: str):
+        """
+        Waits for the checks submitted by a test
+        :return: list of results of the checks which did not match
+        """
+        with VisualChecker.__lock__:
+            futures = VisualChecker.__pending__.pop(test_id, [])
+        failures = []
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.exception(__class__.__name__ + ": error running visual check")
+                result = {'name': "?", 'match': False, 'reason': "error: {}".format(e), 'diff_path': None}
+            if result['reason'] == "baseline recorded":
+                logger.info(__class__.__name__ + ": recorded baseline '{}'".format(result['name']))
+            if not result['match']:
+                failures.append(result)
+        return failures
+
+    @staticmethod
+    def describe(failures: list):
+        return "\n".join("Visual check '{}' failed: {}{}".format(
+            failure['name'], failure['reason'],
+            ", see {}".format(failure['diff_path']) if failure.get('diff_path') else "") for failure in failures)
+
+    @staticmethod
+    def shutdown():
+        with VisualChecker.__lock__:
+            executor, VisualChecker.__executor__ = VisualChecker.__executor__, None
+        if executor is not None:
+            executor.shutdown(wait=True)
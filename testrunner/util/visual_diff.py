@@ -0,0 +1,203 @@
+# Copyright [2021] [Daniel Garcia <contacto {at} danigarcia.org>]
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import io
+import os
+import os.path
+
+from PIL import Image, ImageChops
+
+try:
+    import numpy
+except ImportError:
+    # Optional: without NumPy, differences are computed with Pillow's ImageChops, slower but also done in C
+    numpy = None
+
+
+class VisualDiff:
+    """
+    Screenshot comparison. Every function takes and returns plain values so comparisons can run in a process pool:
+        1. identical PNG bytes pass without decoding
+        2. pixel identical images pass without building a mismatch mask
+        3. otherwise pixels are compared: a pixel differs when any channel differs by more than pixel_tolerance,
+           and the images match when the fraction of differing pixels, outside the ignore regions, is within
+           tolerance
+    """
+
+    __hash_size__ = 8
+
+    @staticmethod
+    def digest(data: bytes):
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def difference_hash(image: Image.Image):
+        """
+        :return: 64 bit perceptual hash, comparing the brightness of horizontally adjacent cells of a 9x8 thumbnail
+        """
+        size = VisualDiff.__hash_size__
+        pixels = image.convert("L").resize((size + 1, size), Image.BILINEAR).tobytes()
+        value = 0
+        for row in range(size):
+            for column in range(size):
+                left = pixels[row * (size + 1) + column]
+                value = (value << 1) | (1 if left > pixels[row * (size + 1) + column + 1] else 0)
+        return value
+
+    @staticmethod
+    def hash_distance(first: int, second: int):
+        return bin(first ^ second).count("1")
+
+    @staticmethod
+    def __mismatch_numpy__(baseline: Image.Image, actual: Image.Image, pixel_tolerance: int, ignore: list):
+        difference = numpy.abs(numpy.asarray(baseline, dtype=numpy.int16) - numpy.asarray(actual, dtype=numpy.int16))
+        mismatch = difference.max(axis=2) > pixel_tolerance
+        compared = numpy.ones(mismatch.shape, dtype=bool)
+        for left, top, right, bottom in ignore:
+            mismatch[top:bottom, left:right] = False
+            compared[top:bottom, left:right] = False
+        mask = Image.fromarray(mismatch.astype(numpy.uint8) * 255, "L")
+        return int(mismatch.sum()), int(compared.sum()), mask
+
+    @staticmethod
+    def __mismatch_pillow__(baseline: Image.Image, actual: Image.Image, pixel_tolerance: int, ignore: list):
+        bands = ImageChops.difference(baseline, actual).split()
+        mask = bands[0]
+        for band in bands[1:]:
+            mask = ImageChops.lighter(mask, band)
+        mask = mask.point(lambda value: 255 if value > pixel_tolerance else 0)
+        # Regions are painted on their own mask, so overlapping ones are only discounted once
+        ignored = Image.new("L", mask.size, 0)
+        for left, top, right, bottom in ignore:
+            ignored.paste(255, (left, top, right, bottom))
+            mask.paste(0, (left, top, right, bottom))
+        return mask.histogram()[255], mask.width * mask.height - ignored.histogram()[255], mask
+
+    @staticmethod
+    def __clip__(regions: list, width: int, height: int):
+        clipped = []
+        for x, y, region_width, region_height in regions or []:
+            left, top = max(0, int(x)), max(0, int(y))
+            right, bottom = min(width, int(x + region_width)), min(height, int(y + region_height))
+            if right > left and bottom > top:
+                clipped.append((left, top, right, bottom))
+        return clipped
+
+    @staticmethod
+    def __highlight__(actual: Image.Image, mask: Image.Image):
+        # Differing pixels in red over a faded copy of the actual screenshot
+        faded = Image.blend(actual, Image.new("RGB", actual.size, (255, 255, 255)), 0.7)
+        faded.paste((255, 0, 0), mask=mask)
+        output = io.BytesIO()
+        faded.save(output, format="PNG")
+        return output.getvalue()
+
+    @staticmethod
+    def compare(baseline_png: bytes, actual_png: bytes, tolerance: float = 0.0, pixel_tolerance: int = 0,
+                ignore_regions: list = None):
+        """
+        Compares two screenshots
+        :param baseline_png: expected image, PNG encoded
+        :param actual_png: captured image, PNG encoded
+        :param tolerance: fraction of compared pixels allowed to differ, from 0 to 1
+        :param pixel_tolerance: largest difference of a channel, from 0 to 255, for pixels considered equal
+        :param ignore_regions: list of (x, y, width, height) in image pixels left out of the comparison
+        :return: dictionary with 'match', 'reason', 'mismatch_ratio', 'mismatched_pixels', 'hash_distance' (dHash
+        bits, informative only) and 'diff_png' (PNG highlighting the differences, or None)
+        """
+        result = {'match': True, 'reason': "identical", 'mismatch_ratio': 0.0, 'mismatched_pixels': 0,
+                  'hash_distance': 0, 'diff_png': None}
+        if baseline_png == actual_png:
+            return result
+
+        baseline = Image.open(io.BytesIO(baseline_png)).convert("RGB")
+        actual = Image.open(io.BytesIO(actual_png)).convert("RGB")
+        if baseline.size != actual.size:
+            result.update(match=False, reason="size {}x{} differs from baseline {}x{}".format(
+                actual.width, actual.height, baseline.width, baseline.height), mismatch_ratio=1.0)
+            return result
+
+        # Pixel identical images, e.g. re-encoded screenshots, are skipped without building the mismatch mask
+        if ImageChops.difference(baseline, actual).getbbox() is None:
+            result['reason'] = "identical pixels"
+            return result
+
+        ignore = VisualDiff.__clip__(ignore_regions, actual.width, actual.height)
+        # Reported to help triage: a small distance means the layout is the same and only details changed
+        result['hash_distance'] = VisualDiff.hash_distance(VisualDiff.difference_hash(baseline),
+                                                           VisualDiff.difference_hash(actual))
+
+        compute = VisualDiff.__mismatch_numpy__ if numpy is not None else VisualDiff.__mismatch_pillow__
+        mismatched, compared, mask = compute(baseline, actual, int(pixel_tolerance), ignore)
+        ratio = mismatched / compared if compared > 0 else 0.0
+        result.update(mismatched_pixels=mismatched, mismatch_ratio=ratio, match=ratio <= tolerance,
+                      reason="{:.4%} of pixels differ".format(ratio))
+        if mismatched > 0:
+            result['diff_png'] = VisualDiff.__highlight__(actual, mask)
+        return result
+
+
+class BaselineStore:
+    """
+    Content-addressed store of baseline images. Images are saved once under objects/ named after their SHA-256,
+    and every check name has a ref file under refs/ with the digest of its current baseline, so identical baselines
+    share storage and updating a baseline is an atomic rename.
+    """
+
+    def __init__(self, baseline_dir: str):
+        self.baseline_dir = baseline_dir
+
+    def __object_path__(self, digest: str):
+        return os.path.join(self.baseline_dir, "objects", digest[:2], digest + ".png")
+
+    def __ref_path__(self, name: str):
+        safe_name = "".join(char if char.isalnum() or char in "-_./" else "_" for char in name).strip("/")
+        return os.path.join(self.baseline_dir, "refs", *safe_name.split("/")) + ".ref"
+
+    def get(self, name: str):
+        """
+        :return: tuple with the digest and PNG bytes of the baseline of a check, or (None, None) if there is none
+        """
+        ref_path = self.__ref_path__(name)
+        if not os.path.isfile(ref_path):
+            return None, None
+        with open(ref_path, 'rt') as fd:
+            digest = fd.read().strip()
+        object_path = self.__object_path__(digest)
+        if not os.path.isfile(object_path):
+            return None, None
+        with open(object_path, 'rb') as fd:
+            return digest, fd.read()
+
+    def put(self, name: str, png: bytes):
+        """
+        Stores an image as the baseline of a check
+        :return: digest of the image
+        """
+        digest = VisualDiff.digest(png)
+        object_path = self.__object_path__(digest)
+        if not os.path.isfile(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temporary_path = "{}.{}.tmp".format(object_path, os.getpid())
+            with open(temporary_path, 'wb') as fd:
+                fd.write(png)
+            os.replace(temporary_path, object_path)
+
+        ref_path = self.__ref_path__(name)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        temporary_path = "{}.{}.tmp".format(ref_path, os.getpid())
+        with open(temporary_path, 'wt') as fd:
+            fd.write(digest)
+        os.replace(temporary_path, ref_path)
+        return digest